@@ -0,0 +1,351 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import argparse
+import atexit
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+
+DEFAULT_AGENT_DB = os.environ.get("ADAM_AGENT_DB", "agents.db")
+STATUSES = ("active", "inactive")
+DELETE_CHUNK = 10_000  # rows per compaction transaction, so writers never wait long
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS agents (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    scopes TEXT NOT NULL,
+    status TEXT NOT NULL,
+    purpose TEXT NOT NULL,
+    created_ms INTEGER NOT NULL,
+    updated_ms INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS agents_owner ON agents(owner);
+CREATE TABLE IF NOT EXISTS audit (
+    id INTEGER PRIMARY KEY,
+    ts_ms INTEGER NOT NULL,
+    agent TEXT,
+    owner TEXT,
+    action TEXT NOT NULL,
+    message TEXT NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS audit_ts ON audit(ts_ms);
+CREATE INDEX IF NOT EXISTS audit_agent_ts ON audit(agent, ts_ms);
+CREATE INDEX IF NOT EXISTS audit_owner_ts ON audit(owner, ts_ms);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+@dataclass(frozen=True)
+class AuditPage:
+    events: List[Dict[str, Any]]  # newest first
+    next_cursor: Optional[str]  # pass as `before` for the next (older) page; None on the last page
+
+def _flush_at_exit(ref: "weakref.ref[AgentStore]") -> None:
+    store = ref()
+    if store is not None:
+        store.flush()
+
+class AgentStore:
+    """Agent registry and audit log in one SQLite file.
+
+    The database runs in WAL mode, so the UI, the API and its workers can read
+    while one of them writes. Audit events are buffered and written
+    `batch_size` at a time (or when the oldest is `flush_seconds` old, on any
+    read, or at interpreter exit), one transaction per batch. Registry changes are written at once,
+    together with the audit event that records them.
+
+    The log is paged newest first by keyset on `(ts_ms, id)`: a page costs the
+    same however deep into millions of events it starts. `compact` applies
+    retention in short transactions and returns the freed pages to the OS.
+    """
+
+    def __init__(self, path: str = DEFAULT_AGENT_DB, batch_size: int = 500, flush_seconds: float = 1.0):
+        self.path = path
+        self.batch_size = int(batch_size)
+        self.flush_seconds = float(flush_seconds)
+        self._pending: List[Tuple[int, Optional[str], str, str, Optional[str]]] = []
+        self._pending_since = 0.0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new database
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; a crash loses at most the last commits
+        self._db.executescript(_SCHEMA)
+        self._closed = False
+        # Stores cached for the life of a process (the UI's) are never closed explicitly.
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._db.close()
+
+    # Registry
+
+    def agents(self, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            if owner is None:
+                rows = self._db.execute("SELECT * FROM agents ORDER BY created_ms, name").fetchall()
+            else:
+                rows = self._db.execute("SELECT * FROM agents WHERE owner = ? ORDER BY created_ms, name", (owner,)).fetchall()
+        return [_agent(r) for r in rows]
+
+    def agent(self, name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM agents WHERE name = ?", (name,)).fetchone()
+        return _agent(row) if row is not None else None
+
+    def register(self, name: str, owner: str, scopes: Sequence[str] = (), purpose: str = "", status: str = "active") -> Dict[str, Any]:
+        """Add an agent, or replace its owner, scopes, purpose and status if it exists."""
+        name = name.strip()
+        if not name:
+            raise ValueError("Agent name is required.")
+        _check_status(status)
+        with self._lock, self._tx():
+            self._register(name, owner, scopes, purpose, status)
+        return self.agent(name)
+
+    def _register(self, name: str, owner: str, scopes: Sequence[str], purpose: str, status: str) -> None:
+        now = _now_ms()
+        existed = self._db.execute("SELECT 1 FROM agents WHERE name = ?", (name,)).fetchone() is not None
+        self._db.execute(
+            "INSERT INTO agents VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+            "owner = excluded.owner, scopes = excluded.scopes, status = excluded.status, purpose = excluded.purpose, updated_ms = excluded.updated_ms",
+            (name, owner, json.dumps(list(scopes)), status, purpose, now, now),
+        )
+        self._insert([(now, name, "updated" if existed else "registered", f"{'Updated' if existed else 'Registered'} agent '{name}' (owner={owner})", None)])
+
+    def set_status(self, name: str, status: str) -> None:
+        _check_status(status)
+        now = _now_ms()
+        with self._lock, self._tx():
+            if self._db.execute("UPDATE agents SET status = ?, updated_ms = ? WHERE name = ? AND status != ?", (status, now, name, status)).rowcount:
+                self._insert([(now, name, "status", f"Updated status for '{name}' -> {status}", None)])
+            elif self._db.execute("SELECT 1 FROM agents WHERE name = ?", (name,)).fetchone() is None:
+                raise KeyError(name)
+
+    def delete(self, name: str) -> None:
+        now = _now_ms()
+        with self._lock, self._tx():
+            self._insert([(now, name, "deleted", f"Deleted agent '{name}'", None)])  # first, while its owner is known
+            if not self._db.execute("DELETE FROM agents WHERE name = ?", (name,)).rowcount:
+                raise KeyError(name)  # rolls the event back
+
+    def seed(self, agents: Iterable[Dict[str, Any]], force: bool = False) -> bool:
+        """Register `agents` the first time a database is seeded; returns whether it did.
+
+        Seeding is recorded in the database, so deleting every agent afterwards
+        leaves the registry empty. A registry that already has agents counts as
+        seeded. `force` registers `agents` again regardless.
+        """
+        agents = [dict(a, name=a["name"].strip()) for a in agents]
+        for a in agents:
+            if not a["name"]:
+                raise ValueError("Agent name is required.")
+            _check_status(a.get("status", "active"))
+        with self._lock, self._tx():
+            seeded = self._db.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone() is not None
+            if not force and (seeded or self._db.execute("SELECT 1 FROM agents LIMIT 1").fetchone() is not None):
+                self._db.execute("INSERT OR IGNORE INTO meta VALUES ('seeded', ?)", (str(_now_ms()),))
+                return False
+            for a in agents:
+                self._register(a["name"], a["owner"], a.get("scopes", ()), a.get("purpose", ""), a.get("status", "active"))
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('seeded', ?)", (str(_now_ms()),))
+            self._insert([(_now_ms(), None, "seeded", "Seeded demo enterprise agents.", None)])
+        return True
+
+    # Audit log
+
+    def log(self, agent: Optional[str], action: str, message: str, detail: Optional[Dict[str, Any]] = None, ts: Optional[str] = None) -> None:
+        """Buffer one audit event; it is written with the next batch."""
+        self.log_many([{"agent": agent, "action": action, "message": message, "detail": detail, "ts": ts}])
+
+    def log_many(self, events: Iterable[Dict[str, Any]]) -> int:
+        """Buffer events (dicts with action, message and optionally agent, detail, ts); returns how many."""
+        rows = [_event_row(e) for e in events]
+        with self._lock:
+            if not self._pending and rows:
+                self._pending_since = time.monotonic()
+                # Written within `flush_seconds` even if nothing else is logged or read.
+                timer = threading.Timer(self.flush_seconds, self.flush)
+                timer.daemon = True
+                timer.start()
+            self._pending.extend(rows)
+            if len(self._pending) >= self.batch_size or time.monotonic() - self._pending_since >= self.flush_seconds:
+                self._flush()
+        return len(rows)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending and not self._closed:
+            with self._tx():
+                self._insert(self._pending)
+            self._pending = []
+
+    def _insert(self, rows: List[Tuple[int, Optional[str], str, str, Optional[str]]]) -> None:
+        # Events record the agent's owner at the time, so the log can be filtered by owner through an index.
+        self._db.executemany(
+            "INSERT INTO audit (ts_ms, agent, owner, action, message, detail) "
+            "VALUES (?1, ?2, (SELECT owner FROM agents WHERE name = ?2), ?3, ?4, ?5)",
+            rows,
+        )
+
+    def audit(self, limit: int = 50, before: Optional[str] = None, agent: Optional[str] = None, owner: Optional[str] = None) -> AuditPage:
+        """One page of events, newest first, older than the `before` cursor of the previous page."""
+        where, args = [], []
+        if before:
+            try:
+                ts, rowid = (int(v) for v in before.split(":"))
+            except ValueError:
+                raise ValueError(f"Invalid cursor {before!r}")
+            where.append("(ts_ms, id) < (?, ?)")
+            args += [ts, rowid]
+        if agent is not None:
+            where.append("agent = ?")
+            args.append(agent)
+        if owner is not None:
+            where.append("owner = ?")
+            args.append(owner)
+        sql = "SELECT * FROM audit" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY ts_ms DESC, id DESC LIMIT ?"
+        with self._lock:
+            self._flush()
+            rows = self._db.execute(sql, (*args, int(limit) + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return AuditPage(
+            events=[_event(r) for r in rows],
+            next_cursor=f"{rows[-1]['ts_ms']}:{rows[-1]['id']}" if more else None,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._flush()
+            n, oldest, newest = self._db.execute("SELECT COUNT(*), MIN(ts_ms), MAX(ts_ms) FROM audit").fetchone()
+            agents = self._db.execute("SELECT COUNT(*) FROM agents").fetchone()[0]
+        return {"agents": agents, "audit_events": n, "oldest": _iso(oldest) if oldest else None, "newest": _iso(newest) if newest else None, "bytes": os.path.getsize(self.path)}
+
+    def compact(self, max_age_days: Optional[float] = None, max_events: Optional[int] = None) -> int:
+        """Delete events older than `max_age_days` and beyond the newest `max_events`; returns how many.
+
+        Deletes run in chunks of `DELETE_CHUNK` rows so concurrent writers only
+        ever wait for one chunk. The WAL is then checkpointed and freed pages
+        are returned to the filesystem.
+        """
+        self.flush()
+        bounds: List[Tuple[int, int]] = []  # delete events strictly before the latest of these (ts_ms, id)
+        if max_age_days is not None:
+            bounds.append((_now_ms() - int(max_age_days * 86_400_000), 0))
+        if max_events is not None:
+            with self._lock:
+                row = self._db.execute("SELECT ts_ms, id FROM audit ORDER BY ts_ms DESC, id DESC LIMIT 1 OFFSET ?", (max(int(max_events) - 1, 0),)).fetchone()
+            if max_events <= 0:
+                bounds.append((sys.maxsize, 0))
+            elif row is not None:
+                bounds.append((row[0], row[1]))
+        if not bounds:
+            return 0
+        cutoff = max(bounds)
+        removed = 0
+        while True:
+            with self._lock, self._tx():
+                n = self._db.execute(
+                    "DELETE FROM audit WHERE id IN (SELECT id FROM audit WHERE (ts_ms, id) < (?, ?) ORDER BY ts_ms LIMIT ?)",
+                    (*cutoff, DELETE_CHUNK),
+                ).rowcount
+            removed += n
+            if n < DELETE_CHUNK:
+                break
+        with self._lock:
+            self._db.executescript("PRAGMA incremental_vacuum;")  # runs to completion; execute() would free one page
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    @contextmanager
+    def _tx(self):
+        self._db.execute("BEGIN IMMEDIATE")  # take the write lock up front rather than fail mid-transaction
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+def _iso(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _parse_ms(ts: Optional[str]) -> int:
+    if ts is None:
+        return _now_ms()
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+def _check_status(status: str) -> None:
+    if status not in STATUSES:
+        raise ValueError(f"Unknown status {status!r}; expected one of {STATUSES}.")
+
+def _event_row(e: Dict[str, Any]) -> Tuple[int, Optional[str], str, str, Optional[str]]:
+    if not e.get("action") or e.get("message") is None:
+        raise ValueError("Audit events need an action and a message.")
+    detail = e.get("detail")
+    return (_parse_ms(e.get("ts")), e.get("agent"), str(e["action"]), str(e["message"]), json.dumps(detail) if detail is not None else None)
+
+def _agent(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "name": row["name"],
+        "owner": row["owner"],
+        "scopes": json.loads(row["scopes"]),
+        "status": row["status"],
+        "purpose": row["purpose"],
+        "created": _iso(row["created_ms"]),
+        "updated": _iso(row["updated_ms"]),
+    }
+
+def _event(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "ts": _iso(row["ts_ms"]),
+        "agent": row["agent"],
+        "owner": row["owner"],
+        "action": row["action"],
+        "message": row["message"],
+        "detail": json.loads(row["detail"]) if row["detail"] is not None else None,
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or compact the agent registry and audit log.")
+    ap.add_argument("--db", default=DEFAULT_AGENT_DB)
+    ap.add_argument("--max-age-days", type=float, default=None, help="Delete audit events older than this.")
+    ap.add_argument("--max-events", type=int, default=None, help="Keep at most this many of the newest audit events.")
+    args = ap.parse_args()
+
+    store = AgentStore(args.db)
+    if args.max_age_days is not None or args.max_events is not None:
+        print(f"removed {store.compact(args.max_age_days, args.max_events):,} audit events")
+    print(json.dumps(store.stats(), indent=2))
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, Any, List
+import threading
+import numpy as np
+import pandas as pd
+
+from .config import Ontology
+from .graph import compile_graph
+
+NS_PER_DAY = 24 * 3600 * 10**9
+
+@dataclass(frozen=True)
+class AnomalyReport:
+    """What one `AnomalyDetector.update` call saw."""
+    rows: int
+    anomalies: List[Dict[str, Any]] = field(default_factory=list)
+    correlated: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.anomalies)
+
+class AnomalyDetector:
+    """Streaming per-control excursion detector over the ontology's metrics.
+
+    Every row updates all controls at once in O(1) state per control. The
+    state is an EWMA mean and variance of the metric on its bad side (negated
+    for lower-is-worse) and a streaming estimate of its `quantile`. The
+    quantile uses stochastic approximation: it steps up by `tau` and down by
+    `1 - tau`, scaled by the EWMA deviation.
+
+    After `warmup` rows, a reading is flagged when its z-score reaches
+    `z_threshold` and it is also above the tracked quantile, which keeps
+    heavy-tailed metrics from alerting on every spike. Only the onset of an
+    excursion is reported; it ends once the z-score falls below half the
+    threshold. Readings enter the mean clipped to `clip_sigma` deviations and
+    stay out of the variance while an excursion lasts, so a slow drift keeps
+    standing out instead of becoming the new normal.
+
+    An anomaly on an edge's destination is correlated with that edge when
+    its source was flagged within `delay_days + slack_days`. That covers
+    both simultaneous excursions and ones that follow the propagation delay.
+    """
+
+    def __init__(
+        self,
+        ontology: Ontology,
+        alpha: float = 0.01,
+        z_threshold: float = 3.5,
+        quantile: float = 0.99,
+        warmup: int = 60,
+        clip_sigma: float = 3.0,
+        quantile_rate: float = 0.2,
+        slack_days: float = 1.0,
+    ):
+        self.graph = compile_graph(ontology)
+        self.alpha = float(alpha)
+        self.z_threshold = float(z_threshold)
+        self.tau = float(quantile)
+        self.warmup = int(warmup)
+        self.clip_sigma = float(clip_sigma)
+        self.quantile_rate = float(quantile_rate)
+        self._sign = np.where(np.array(self.graph.directions) == "lower_is_worse", -1.0, 1.0)
+        self._window = ((self.graph.delay_days + float(slack_days)) * NS_PER_DAY).astype(np.int64)
+
+        c = len(self.graph.controls)
+        self._n = np.zeros(c, dtype=np.int64)
+        self._mean = np.zeros(c)
+        self._var = np.zeros(c)
+        self._q = np.zeros(c)
+        self._active = np.zeros(c, dtype=bool)  # currently in an excursion
+        self._last_flag = np.full(c, np.iinfo(np.int64).min // 2)  # ns of each control's last excursion onset
+        self._lock = threading.Lock()
+
+    def state(self) -> Dict[str, Dict[str, float]]:
+        """Current baseline per control, in the metric's own units."""
+        sd = np.sqrt(self._var)
+        return {
+            cid: {"mean": float(self._sign[j] * self._mean[j]), "std": float(sd[j]), "quantile": float(self._sign[j] * self._q[j]), "rows": int(self._n[j])}
+            for j, cid in enumerate(self.graph.controls)
+        }
+
+    def update(self, rows: pd.DataFrame | List[Dict[str, Any]]) -> AnomalyReport:
+        if not isinstance(rows, pd.DataFrame):
+            rows = pd.DataFrame(list(rows))
+        if not len(rows):
+            return AnomalyReport(rows=0)
+        stamps = pd.DatetimeIndex(pd.to_datetime(rows["timestamp"], utc=True)).asi8
+        values = rows[self.graph.metrics].to_numpy(dtype=float)
+        order = np.argsort(stamps, kind="stable")
+        with self._lock:
+            return self._consume(stamps[order], values[order])
+
+    def _consume(self, stamps: np.ndarray, values: np.ndarray) -> AnomalyReport:
+        controls, metrics = self.graph.controls, self.graph.metrics
+        src, dst = self.graph.src, self.graph.dst
+        anomalies: List[Dict[str, Any]] = []
+        correlated: List[Dict[str, Any]] = []
+        a, tau = self.alpha, self.tau
+
+        for t, raw in zip(stamps, values):
+            x = self._sign * raw
+            seen = ~np.isnan(x)
+            first = seen & (self._n == 0)
+            self._mean[first] = x[first]
+            self._q[first] = x[first]
+
+            sd = np.sqrt(self._var)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z = (x - self._mean) / np.where(sd > 0, sd, np.nan)
+            zz = np.nan_to_num(z, nan=np.inf)
+            flag = seen & (self._n >= self.warmup) & (zz >= self.z_threshold) & (x > self._q)
+            onset = flag & ~self._active
+            # An excursion lasts until the reading falls back below half the threshold.
+            self._active = np.where(seen, flag | (self._active & (zz >= 0.5 * self.z_threshold)), self._active)
+            if onset.any():
+                flag = onset
+                hits = np.flatnonzero(flag)
+                self._last_flag[hits] = t
+                ts = pd.Timestamp(int(t), tz="UTC").isoformat()
+                for j in hits:
+                    anomalies.append({
+                        "timestamp": ts, "control": controls[j], "metric": metrics[j],
+                        "value": float(raw[j]), "zscore": float(z[j]) if np.isfinite(z[j]) else None,
+                        "baseline": float(self._sign[j] * self._mean[j]),
+                    })
+                linked = flag[dst] & (t - self._last_flag[src] <= self._window)
+                for e in np.flatnonzero(linked):
+                    correlated.append({
+                        "src": controls[src[e]], "dst": controls[dst[e]],
+                        "src_time": pd.Timestamp(int(self._last_flag[src[e]]), tz="UTC").isoformat(),
+                        "dst_time": ts,
+                        "lag_days": float((t - self._last_flag[src[e]]) / NS_PER_DAY),
+                        "delay_days": int(self.graph.delay_days[e]),
+                    })
+
+            upd = seen & ~first
+            warm = upd & (self._n >= self.warmup)
+            xc = np.where(warm, np.clip(x, self._mean - self.clip_sigma * sd, self._mean + self.clip_sigma * sd), x)
+            diff = np.where(upd, xc - self._mean, 0.0)
+            self._mean += a * diff
+            calm = upd & ~self._active  # excursions move the level but do not widen the band
+            self._var = np.where(calm, (1.0 - a) * (self._var + a * diff * diff), self._var)
+            step = self.quantile_rate * np.where(sd > 0, sd, np.abs(diff))
+            self._q = np.where(upd, self._q + step * np.where(x > self._q, tau, tau - 1.0), self._q)
+            self._n += seen
+
+        return AnomalyReport(rows=len(stamps), anomalies=anomalies, correlated=correlated)
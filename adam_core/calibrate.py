@@ -0,0 +1,261 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, Any, List, Sequence
+import argparse
+import hashlib
+import json
+import os
+import pandas as pd
+import numpy as np
+
+from .config import Ontology, load_ontology
+from .eri import compute_eri_batch, impact_vector
+from .replay import replay_inputs
+
+DEFAULT_THRESHOLDS = np.round(np.arange(0.50, 1.0, 0.01), 2)
+
+@dataclass(frozen=True)
+class EriCache:
+    """Per-day ERI inputs for a whole dataset, computed once and swept many times."""
+    as_of: np.ndarray  # (N,) datetime64[ns] UTC
+    controls: List[str]
+    probabilities: np.ndarray  # (N, C)
+    time_to_failure_days: np.ndarray  # (N,), NaN when no SLA degrade is predicted
+    incident_active: np.ndarray  # (N,) bool, incident flag at the as-of row
+
+    def save(self, path: str, key: str = "") -> None:
+        """Write the cache as .npz; `key` (see `cache_key`) is stored to detect a stale file on load."""
+        np.savez_compressed(
+            path,
+            key=np.array(key),
+            as_of=self.as_of.astype("datetime64[ns]").astype(np.int64),
+            controls=np.array(self.controls),
+            probabilities=self.probabilities,
+            time_to_failure_days=self.time_to_failure_days,
+            incident_active=self.incident_active,
+        )
+
+    @staticmethod
+    def load(path: str, key: str | None = None) -> "EriCache":
+        """Read a saved cache; raises ValueError if `key` is given and the file was saved with another."""
+        with np.load(path) as z:
+            if key is not None and ("key" not in z.files or str(z["key"]) != key):
+                raise ValueError(f"{path} was built from other inputs.")
+            return EriCache(
+                as_of=z["as_of"].astype("datetime64[ns]"),
+                controls=[str(c) for c in z["controls"]],
+                probabilities=z["probabilities"],
+                time_to_failure_days=z["time_to_failure_days"],
+                incident_active=z["incident_active"].astype(bool),
+            )
+
+def cache_key(csv_path: str, ontology_path: str, horizon_days: int) -> str:
+    """Identifies the inputs of a saved cache: the CSV (path, mtime, size), the ontology's contents and the horizon."""
+    st = os.stat(csv_path)
+    with open(ontology_path, "rb") as f:
+        ontology = hashlib.sha1(f.read()).hexdigest()
+    return json.dumps([os.path.abspath(csv_path), st.st_mtime_ns, st.st_size, ontology, int(horizon_days)])
+
+@dataclass(frozen=True)
+class CalibrationReport:
+    incidents: List[str]
+    lookback_days: int
+    current_threshold: float
+    recommended: Dict[str, Any] | None
+    points: List[Dict[str, Any]]
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    return df.sort_values("timestamp", kind="mergesort")
+
+def incidents_from_flags(df: pd.DataFrame, column: str = "incident_flag", cooldown_days: float = 7.0) -> List[pd.Timestamp]:
+    """Incident onsets: rows where `column` turns on after at least `cooldown_days` off."""
+    if column not in df.columns:
+        return []
+    df = _prepare(df)
+    flagged = df.loc[df[column].fillna(0).astype(float) > 0, "timestamp"]
+
+    onsets: List[pd.Timestamp] = []
+    last = None
+    for ts in flagged:
+        if last is None or (ts - last) > pd.Timedelta(days=cooldown_days):
+            onsets.append(ts)
+        last = ts
+    return onsets
+
+def build_eri_cache(df: pd.DataFrame, ontology: Ontology, horizon_days: int | None = None, flag_column: str = "incident_flag") -> EriCache:
+    """Replay every calendar day of `df` once and cache what ERI needs."""
+    df = _prepare(df)
+    if df.empty:
+        raise ValueError("No data to calibrate on.")
+
+    horizon = int(horizon_days or ontology.forecast_horizon_days)
+    days = pd.date_range(df["timestamp"].iloc[0].floor("D"), df["timestamp"].iloc[-1].floor("D"), freq="1D", tz="UTC")
+    inputs = replay_inputs(df, ontology, days, horizon, summaries=False)
+    if not inputs.as_of:
+        raise ValueError("Not enough data for a daily replay.")
+
+    as_of = pd.DatetimeIndex(inputs.as_of).tz_convert("UTC").tz_localize(None).to_numpy(dtype="datetime64[ns]")
+    if flag_column in df.columns:
+        flags = df.set_index("timestamp")[flag_column].fillna(0).astype(float)
+        flags = flags[~flags.index.duplicated(keep="last")]
+        active = flags.reindex(pd.DatetimeIndex(inputs.as_of)).to_numpy() > 0
+    else:
+        active = np.zeros(len(as_of), dtype=bool)
+
+    return EriCache(
+        as_of=as_of,
+        controls=inputs.controls,
+        probabilities=inputs.probabilities,
+        time_to_failure_days=inputs.time_to_failure_days,
+        incident_active=active,
+    )
+
+def sweep_thresholds(cache: EriCache, incidents: Sequence[pd.Timestamp], thresholds: Sequence[float], impact_weights: Dict[str, float], lookback_days: int = 30) -> List[Dict[str, Any]]:
+    """Lead time and false-positive rate for every threshold, from cached ERI inputs only.
+
+    A warning counts for an incident if the ERI crosses the threshold within
+    `lookback_days` before its onset. Negative days are as-of points outside every
+    pre-incident window whose incident flag is off; the false-positive rate is the
+    share of those days at or above the threshold.
+    """
+    thr = np.asarray(thresholds, dtype=float)
+    eri = compute_eri_batch(cache.probabilities, impact_vector(impact_weights, cache.controls), cache.time_to_failure_days).eri
+    alarms = eri[None, :] >= thr[:, None]  # (T, N)
+
+    t = cache.as_of
+    lookback = np.timedelta64(int(lookback_days), "D")
+    onsets = [pd.Timestamp(i).tz_convert("UTC").tz_localize(None).to_datetime64() for i in incidents]
+
+    positive = np.zeros(len(t), dtype=bool)
+    leads = np.full((len(thr), len(onsets)), np.nan)
+    for j, onset in enumerate(onsets):
+        window = (t >= onset - lookback) & (t <= onset)
+        positive |= window
+        hit = alarms & window[None, :]
+        any_hit = hit.any(axis=1)
+        first = hit.argmax(axis=1)
+        lead = (onset - t[first]) / np.timedelta64(1, "s") / (3600 * 24)
+        leads[:, j] = np.where(any_hit, lead, np.nan)
+
+    negative = ~positive & ~cache.incident_active
+    n_neg = int(negative.sum())
+    false_alarms = (alarms & negative[None, :]).sum(axis=1)
+
+    points: List[Dict[str, Any]] = []
+    for i, th in enumerate(thr):
+        row = leads[i]
+        detected = int(np.count_nonzero(~np.isnan(row)))
+        points.append({
+            "threshold": float(th),
+            "incidents": len(onsets),
+            "detected": detected,
+            "mean_lead_time_days": float(np.nanmean(row)) if detected else None,
+            "median_lead_time_days": float(np.nanmedian(row)) if detected else None,
+            "false_alarm_days": int(false_alarms[i]),
+            "negative_days": n_neg,
+            "false_positive_rate": float(false_alarms[i] / n_neg) if n_neg else 0.0,
+        })
+    return points
+
+def recommend(points: Sequence[Dict[str, Any]], max_false_positive_rate: float = 0.05) -> Dict[str, Any] | None:
+    """Most detections, then longest mean lead, then highest threshold, within the FPR budget."""
+    ok = [p for p in points if p["false_positive_rate"] <= max_false_positive_rate and p["detected"] > 0]
+    if not ok:
+        return None
+    return max(ok, key=lambda p: (p["detected"], p["mean_lead_time_days"] or 0.0, p["threshold"]))
+
+def calibrate(
+    df: pd.DataFrame,
+    ontology: Ontology,
+    incidents: Sequence[str] | None = None,
+    thresholds: Sequence[float] | None = None,
+    weight_sets: Sequence[Dict[str, float]] | None = None,
+    lookback_days: int = 30,
+    horizon_days: int | None = None,
+    max_false_positive_rate: float = 0.05,
+    cache: EriCache | None = None,
+) -> CalibrationReport:
+    """Sweep `eri_warning` (and optionally impact weights) over one cached replay.
+
+    Incidents default to onsets of `incident_flag`. Each weight set is merged over
+    the ontology's impact weights; the baseline weights are always evaluated.
+    """
+    if cache is None:
+        cache = build_eri_cache(df, ontology, horizon_days=horizon_days)
+    onsets = [pd.to_datetime(i, utc=True) for i in incidents] if incidents else incidents_from_flags(df)
+    if not onsets:
+        raise ValueError("No labeled incidents to calibrate against.")
+    grid = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+
+    candidates = [dict(ontology.impact_weights)] + [{**ontology.impact_weights, **w} for w in (weight_sets or [])]
+    points: List[Dict[str, Any]] = []
+    for wi, weights in enumerate(candidates):
+        for p in sweep_thresholds(cache, onsets, grid, weights, lookback_days=lookback_days):
+            p["weight_set"] = wi
+            p["impact_weights"] = weights
+            points.append(p)
+
+    return CalibrationReport(
+        incidents=[str(o.isoformat()) for o in onsets],
+        lookback_days=int(lookback_days),
+        current_threshold=float(ontology.eri_warning),
+        recommended=recommend(points, max_false_positive_rate),
+        points=points,
+    )
+
+def main():
+    ap = argparse.ArgumentParser(description="Calibrate the eri_warning threshold against labeled incidents.")
+    ap.add_argument("--csv", default="data/arcadian_cloud_systems_timeseries.csv")
+    ap.add_argument("--ontology", default="config/ontology.yaml")
+    ap.add_argument("--incident", action="append", default=None, help="ISO8601 incident onset; repeatable. Defaults to incident_flag onsets.")
+    ap.add_argument("--lookback-days", type=int, default=30)
+    ap.add_argument("--horizon-days", type=int, default=None)
+    ap.add_argument("--max-fpr", type=float, default=0.05)
+    ap.add_argument("--weights", default=None, help="JSON file with a list of impact-weight overrides to sweep.")
+    ap.add_argument("--cache", default=None, help="Path to an .npz ERI cache; created if missing.")
+    ap.add_argument("--out", default=None, help="Write the full JSON report here.")
+    args = ap.parse_args()
+
+    ont = load_ontology(args.ontology)
+    df = pd.read_csv(args.csv)
+
+    cache = None
+    if args.cache:
+        key = cache_key(args.csv, args.ontology, args.horizon_days or ont.forecast_horizon_days)
+        try:
+            cache = EriCache.load(args.cache, key=key)
+        except (FileNotFoundError, ValueError):  # missing, or built from another CSV, ontology or horizon
+            cache = build_eri_cache(df, ont, horizon_days=args.horizon_days)
+            cache.save(args.cache, key=key)
+
+    weight_sets = None
+    if args.weights:
+        with open(args.weights, "r", encoding="utf-8") as f:
+            weight_sets = json.load(f)
+
+    report = calibrate(
+        df, ont,
+        incidents=args.incident,
+        weight_sets=weight_sets,
+        lookback_days=args.lookback_days,
+        horizon_days=args.horizon_days,
+        max_false_positive_rate=args.max_fpr,
+        cache=cache,
+    )
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report.__dict__, f, indent=2)
+
+    print("Incidents:", ", ".join(report.incidents))
+    print(f"{'set':>3} {'threshold':>9} {'detected':>8} {'lead_days':>9} {'fpr':>6}")
+    for p in report.points:
+        lead = "-" if p["mean_lead_time_days"] is None else f"{p['mean_lead_time_days']:.2f}"
+        print(f"{p['weight_set']:>3} {p['threshold']:>9.2f} {p['detected']:>4}/{p['incidents']:<3} {lead:>9} {p['false_positive_rate']:>6.3f}")
+    print("Current threshold:", report.current_threshold)
+    print("Recommended:", json.dumps(report.recommended))
+
+if __name__ == "__main__":
+    main()
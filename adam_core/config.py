@@ -3,6 +3,9 @@ from dataclasses import dataclass
 from typing import Dict, List, Any
 import yaml
 
+# libyaml's parser when PyYAML was built with it; same result, several times faster.
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 @dataclass(frozen=True)
 class ControlStateThresholds:
     direction: str  # "higher_is_worse" or "lower_is_worse"
@@ -35,7 +38,7 @@ class Ontology:
 
 def load_ontology(path: str) -> Ontology:
     with open(path, "r", encoding="utf-8") as f:
-        raw = yaml.safe_load(f)
+        raw = yaml.load(f, Loader=_Loader)
 
     controls: Dict[str, Control] = {}
     for c in raw["controls"]:
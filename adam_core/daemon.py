@@ -0,0 +1,307 @@
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from io import BytesIO
+from typing import Dict, Any, List
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import signal
+import threading
+import time
+import numpy as np
+import pandas as pd
+import yaml
+
+from .anomaly import AnomalyDetector
+from .config import Ontology, load_ontology
+from .eri import compute_eri
+from .forecaster import Forecaster
+from .simulator import ForecastResult
+
+DEFAULT_SNAPSHOT_DIR = os.environ.get("ADAM_SNAPSHOT_DIR", "snapshots")
+_TENANT_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+log = logging.getLogger("adam.daemon")
+
+class SnapshotStore:
+    """One small JSON file per tenant, replaced atomically so readers never see partial writes."""
+
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+
+    def path(self, tenant: str) -> str:
+        if not _TENANT_RE.match(tenant):
+            raise ValueError(f"Invalid tenant id: {tenant!r}")
+        return os.path.join(self.root, f"{tenant}.json")
+
+    def write(self, tenant: str, snapshot: Dict[str, Any]) -> None:
+        path = self.path(tenant)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def read_bytes(self, tenant: str) -> bytes | None:
+        try:
+            with open(self.path(tenant), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def read(self, tenant: str) -> Dict[str, Any] | None:
+        raw = self.read_bytes(tenant)
+        return json.loads(raw) if raw is not None else None
+
+class CsvTail:
+    """Reads only complete lines appended to a CSV since the previous read."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offset = 0
+        self._inode = None
+        self._header = b""
+
+    def read(self) -> tuple[pd.DataFrame, bool]:
+        """Return (new rows, reset). `reset` means the file was replaced or truncated."""
+        st = os.stat(self.path)
+        reset = self._inode is not None and (st.st_ino != self._inode or st.st_size < self._offset)
+        if reset or self._inode is None:
+            self._offset, self._header = 0, b""
+        self._inode = st.st_ino
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        cut = chunk.rfind(b"\n")
+        if cut < 0:
+            return pd.DataFrame(), reset
+        data = chunk[:cut + 1]
+        self._offset += cut + 1
+
+        if not self._header:
+            nl = data.find(b"\n")
+            self._header, data = data[:nl + 1], data[nl + 1:]
+        if not data.strip():
+            return pd.DataFrame(), reset
+        return pd.read_csv(BytesIO(self._header + data)), reset
+
+@dataclass
+class Tenant:
+    id: str
+    csv_path: str
+    ontology: Ontology
+    horizon_days: int | None = None
+    forecaster: Forecaster | None = None
+    detector: AnomalyDetector | None = None
+    tail: CsvTail | None = None
+    last_p0: np.ndarray | None = None  # starting pressures of the last forecast
+    forecast_at: float = 0.0  # monotonic time of the last forecast
+    forecast: ForecastResult | None = None  # the last forecast
+
+    def refresh(self, max_age_seconds: float | None = None) -> Dict[str, Any] | None:
+        """Ingest appended rows; re-forecast only if something changed.
+
+        A forecast runs when the stream (re)starts, when the anomaly detector
+        flags an excursion in the new rows, when the newest row's starting
+        pressures differ from the last forecast's, or when the last forecast
+        is older than `max_age_seconds`. Returns the compact snapshot, or None
+        when nothing changed.
+        """
+        started = time.perf_counter()
+        if self.tail is None:
+            self.tail = CsvTail(self.csv_path)
+        rows, reset = self.tail.read()
+        trigger = None
+        if self.forecaster is None or reset:
+            self.forecaster = Forecaster(self.ontology, horizon_days=self.horizon_days)
+            self.detector = AnomalyDetector(self.ontology)
+            self.last_p0 = None
+            trigger = "start"
+        report = self.detector.update(rows)
+        self.forecaster.append(rows)
+        p0 = self.forecaster.latest_pressures
+
+        if trigger is None:
+            if report.changed:
+                trigger = "anomaly"
+            elif p0 is not None and (self.last_p0 is None or not np.array_equal(p0, self.last_p0)):
+                trigger = "pressure_change"
+            elif max_age_seconds is not None and time.monotonic() - self.forecast_at >= max_age_seconds:
+                trigger = "max_age"
+        if trigger is None:
+            return None
+
+        fr = self.forecast = self.forecaster.update([])
+        self.last_p0, self.forecast_at = p0, time.monotonic()
+        probs = fr.series[0].probabilities if fr.series else {}
+        eri = compute_eri(probs, self.ontology.impact_weights, fr.summary.get("time_to_failure_days"))
+        return {
+            "tenant": self.id,
+            "as_of": fr.start,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "trigger": trigger,
+            "horizon_days": fr.horizon_days,
+            "eri": eri.eri,
+            "eri_warning": self.ontology.eri_warning,
+            "warning": eri.eri >= self.ontology.eri_warning,
+            "time_to_failure_days": fr.summary.get("time_to_failure_days"),
+            "predicted_first_sla_degrade_or_fail": fr.summary.get("predicted_first_sla_degrade_or_fail"),
+            "top_choke_point": fr.summary.get("top_choke_point"),
+            "top_driver": eri.top_driver,
+            "anomalies": report.anomalies[-10:],
+            "correlated_anomalies": report.correlated[-10:],
+            "rows": len(self.forecaster),
+            "compute_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        }
+
+@dataclass(frozen=True)
+class DaemonConfig:
+    tenants: List[Dict[str, Any]]
+    snapshot_dir: str = DEFAULT_SNAPSHOT_DIR
+    workers: int = 4
+    interval_minutes: float = 15.0  # longest a snapshot goes without a forecast
+    jitter_seconds: float = 30.0
+    poll_seconds: float = 60.0  # how often each tenant's feed is checked for changes
+    export_dir: str | None = None  # also append every forecast here as partitioned Parquet (see export.py)
+    export_publish_minutes: float = 60.0  # how often open Parquet files are closed and made visible
+
+def load_daemon_config(path: str) -> DaemonConfig:
+    with open(path, "r", encoding="utf-8") as f:
+        raw = yaml.safe_load(f) or {}
+    return DaemonConfig(
+        tenants=list(raw.get("tenants", [])),
+        snapshot_dir=str(raw.get("snapshot_dir", DEFAULT_SNAPSHOT_DIR)),
+        workers=int(raw.get("workers", 4)),
+        interval_minutes=float(raw.get("interval_minutes", 15.0)),
+        jitter_seconds=float(raw.get("jitter_seconds", 30.0)),
+        poll_seconds=float(raw.get("poll_seconds", 60.0)),
+        export_dir=raw.get("export_dir"),
+        export_publish_minutes=float(raw.get("export_publish_minutes", 60.0)),
+    )
+
+class ForecastDaemon:
+    """Polls every tenant's feed over a bounded thread pool and re-forecasts on change.
+
+    Each poll only tails the CSV and feeds the anomaly detector; a forecast
+    runs when `Tenant.refresh` sees a reason to, or after `interval_minutes`
+    at the latest. Polls are spread by random jitter. A tenant whose previous
+    poll is still in flight skips the tick instead of queueing a second one,
+    and no more than `workers` polls are ever outstanding: due tenants beyond
+    that wait for a free slot rather than piling up in the executor queue.
+
+    With `export_dir`, every forecast is also appended to a `ParquetExporter`,
+    whose files are published every `export_publish_minutes` and on exit.
+    """
+
+    def __init__(self, config: DaemonConfig, store: SnapshotStore | None = None):
+        self.config = config
+        self.store = store or SnapshotStore(config.snapshot_dir)
+        ontologies: Dict[str, Ontology] = {}
+        self.tenants: Dict[str, Tenant] = {}
+        for t in config.tenants:
+            ont_path = t.get("ontology", "config/ontology.yaml")
+            if ont_path not in ontologies:
+                ontologies[ont_path] = load_ontology(ont_path)
+            self.store.path(t["id"])  # validate the id up front
+            self.tenants[t["id"]] = Tenant(id=t["id"], csv_path=t["csv_path"], ontology=ontologies[ont_path], horizon_days=t.get("horizon_days"))
+        self._stop = threading.Event()
+        self._slots = threading.BoundedSemaphore(max(1, config.workers))
+        self._inflight: Dict[str, Future] = {}
+        self.stats = {"runs": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+        self.exporter = None
+        if config.export_dir:
+            from .export import ParquetExporter  # pyarrow loads only when exporting
+
+            self.exporter = ParquetExporter(config.export_dir)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run_one(self, tenant: Tenant, max_age_seconds: float | None = None) -> None:
+        try:
+            snapshot = tenant.refresh(max_age_seconds)
+            if snapshot is None:
+                self.stats["unchanged"] += 1
+                return
+            self.store.write(tenant.id, snapshot)
+            if self.exporter is not None:
+                self.exporter.write_forecast(tenant.id, tenant.forecast, tenant.forecaster.graph.controls)
+            self.stats["runs"] += 1
+        except Exception:
+            self.stats["failed"] += 1
+            log.exception("forecast failed for tenant %s", tenant.id)
+        finally:
+            self._slots.release()
+
+    def run_once(self) -> None:
+        """Forecast every tenant once, using the pool, and wait for all of them."""
+        with ThreadPoolExecutor(max_workers=max(1, self.config.workers)) as pool:
+            for tenant in self.tenants.values():
+                self._slots.acquire()
+                pool.submit(self._run_one, tenant, 0.0)
+        self._publish()
+
+    def _publish(self) -> None:
+        """Close the exporter's open files so readers see every forecast so far."""
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def run_forever(self) -> None:
+        max_age = self.config.interval_minutes * 60.0
+        interval = self.config.poll_seconds
+        jitter = min(self.config.jitter_seconds, interval / 2.0)
+        now = time.monotonic()
+        due = {tid: now + random.uniform(0.0, jitter) for tid in self.tenants}
+        published = now
+
+        with ThreadPoolExecutor(max_workers=max(1, self.config.workers)) as pool:
+            while not self._stop.is_set():
+                if time.monotonic() - published >= self.config.export_publish_minutes * 60.0:
+                    self._publish()
+                    published = time.monotonic()
+                tid = min(due, key=due.get) if due else None
+                if tid is None:
+                    self._stop.wait(interval)
+                    continue
+                delay = due[tid] - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                    continue
+
+                running = self._inflight.get(tid)
+                if running is not None and not running.done():
+                    self.stats["skipped"] += 1
+                    log.warning("tenant %s still running; skipping this tick", tid)
+                elif not self._slots.acquire(timeout=1.0):
+                    continue  # pool saturated: keep the tenant due and retry
+                else:
+                    self._inflight[tid] = pool.submit(self._run_one, self.tenants[tid], max_age)
+                due[tid] += interval + random.uniform(-jitter, jitter)
+                due[tid] = max(due[tid], time.monotonic())
+        self._publish()
+
+def main():
+    ap = argparse.ArgumentParser(description="Continuously re-forecast tenants and write result snapshots.")
+    ap.add_argument("--config", default="config/tenants.yaml")
+    ap.add_argument("--once", action="store_true", help="Forecast every tenant once and exit.")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    daemon = ForecastDaemon(load_daemon_config(args.config))
+    if args.once:
+        daemon.run_once()
+    else:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: daemon.stop())
+        log.info("polling %d tenants every %.0fs; forecasting on change or every %.1f min", len(daemon.tenants), daemon.config.poll_seconds, daemon.config.interval_minutes)
+        daemon.run_forever()
+    log.info("runs=%d unchanged=%d skipped=%d failed=%d", daemon.stats["runs"], daemon.stats["unchanged"], daemon.stats["skipped"], daemon.stats["failed"])
+
+if __name__ == "__main__":
+    main()
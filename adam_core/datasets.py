@@ -0,0 +1,169 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Any, List
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+
+DEFAULT_DATASET_DIR = os.environ.get("ADAM_DATASET_DIR", "datasets")
+COPY_CHUNK_BYTES = 1 << 20
+PARSE_CHUNK_ROWS = 200_000
+_ID_RE = re.compile(r"^[0-9a-f]{16,64}$")
+
+@dataclass(frozen=True)
+class Dataset:
+    """A parsed upload: UTC timestamps plus one float column per numeric field."""
+    id: str
+    stamps: np.ndarray  # (N,) int64 ns since epoch, UTC, in file order
+    columns: Dict[str, np.ndarray]  # name -> (N,) float64
+
+    def __len__(self) -> int:
+        return len(self.stamps)
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.columns, copy=False)  # columns stay views of the (possibly mapped) arrays
+        df.insert(0, "timestamp", pd.to_datetime(self.stamps, utc=True))
+        return df
+
+class DatasetStore:
+    """Content-addressed store of uploaded CSVs, kept only in pre-parsed columnar form.
+
+    The id is the first 16 hex digits of the upload's SHA-256, so uploading the
+    same bytes again only costs the hash: nothing is parsed or written twice.
+    Each dataset is a directory of `.npy` arrays and one `.json` with metadata.
+    Datasets never change once stored, so loads memory-map the arrays and
+    every process shares the same pages. Recently used datasets stay mapped.
+    """
+
+    def __init__(self, root: str = DEFAULT_DATASET_DIR, keep_loaded: int = 4):
+        self.root = root
+        self.keep_loaded = int(keep_loaded)
+        self._loaded: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, dataset_id: str, ext: str) -> str:
+        if not _ID_RE.match(dataset_id):
+            raise ValueError(f"Invalid dataset id: {dataset_id!r}")
+        return os.path.join(self.root, f"{dataset_id}.{ext}")
+
+    def exists(self, dataset_id: str) -> bool:
+        return os.path.exists(self._path(dataset_id, "json"))
+
+    def meta(self, dataset_id: str) -> Dict[str, Any] | None:
+        try:
+            with open(self._path(dataset_id, "json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put_stream(self, src: BinaryIO, filename: str | None = None) -> tuple[Dict[str, Any], bool]:
+        """Copy `src` to disk in chunks while hashing it, then parse it once.
+
+        Returns (metadata, deduplicated); `deduplicated` means the same bytes were
+        already stored and the upload was discarded after hashing.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f".upload.{os.getpid()}.{threading.get_ident()}.tmp")
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp, "wb") as out:
+                while True:
+                    chunk = src.read(COPY_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            dataset_id = h.hexdigest()[:16]
+            existing = self.meta(dataset_id)
+            if existing is not None:
+                return existing, True
+            stamps, columns = parse_csv(tmp)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        meta = {
+            "dataset_id": dataset_id,
+            "sha256": h.hexdigest(),
+            "filename": filename,
+            "bytes": size,
+            "rows": int(len(stamps)),
+            "columns": list(columns),
+            "start": pd.Timestamp(int(stamps.min()), tz="UTC").isoformat() if len(stamps) else None,
+            "end": pd.Timestamp(int(stamps.max()), tz="UTC").isoformat() if len(stamps) else None,
+            "uploaded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        # Arrays first, metadata last: a dataset exists once its .json does.
+        arrays = self._path(dataset_id, "arrays")
+        tmp = f"{arrays}.tmp.{os.getpid()}.{threading.get_ident()}"
+        os.makedirs(tmp, exist_ok=True)
+        np.save(os.path.join(tmp, "timestamp.npy"), stamps)
+        for i, v in enumerate(columns.values()):
+            np.save(os.path.join(tmp, f"c_{i}.npy"), v)
+        try:
+            os.rename(tmp, arrays)
+        except OSError:
+            if not os.path.isdir(arrays):
+                raise
+            # A concurrent upload of the same bytes got there first; its arrays are identical.
+            shutil.rmtree(tmp, ignore_errors=True)
+            existing = self.meta(dataset_id)
+            if existing is not None:
+                return existing, True
+        meta_path = self._path(dataset_id, "json")
+        meta_tmp = f"{meta_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp, meta_path)
+        return meta, False
+
+    def load(self, dataset_id: str) -> Dataset:
+        with self._lock:
+            ds = self._loaded.get(dataset_id)
+            if ds is not None:
+                self._loaded.move_to_end(dataset_id)
+                return ds
+        meta = self.meta(dataset_id)
+        if meta is None:
+            raise KeyError(f"Unknown dataset: {dataset_id}")
+        arrays = self._path(dataset_id, "arrays")
+        ds = Dataset(
+            id=dataset_id,
+            stamps=np.load(os.path.join(arrays, "timestamp.npy"), mmap_mode="r"),
+            columns={name: np.load(os.path.join(arrays, f"c_{i}.npy"), mmap_mode="r") for i, name in enumerate(meta["columns"])},
+        )
+        with self._lock:
+            self._loaded[dataset_id] = ds
+            while len(self._loaded) > self.keep_loaded:
+                self._loaded.popitem(last=False)
+        return ds
+
+def parse_csv(path: str, chunk_rows: int = PARSE_CHUNK_ROWS) -> tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Parse a CSV chunk by chunk into UTC ns timestamps and float columns.
+
+    Columns that are numeric in the first chunk are kept; other columns are
+    dropped. A later non-numeric value becomes NaN.
+    """
+    stamps: List[np.ndarray] = []
+    parts: Dict[str, List[np.ndarray]] = {}
+    for chunk in pd.read_csv(path, chunksize=chunk_rows):
+        if "timestamp" not in chunk.columns:
+            raise ValueError("CSV must have a 'timestamp' column.")
+        if not parts:
+            numeric = [c for c in chunk.columns if c != "timestamp" and pd.api.types.is_numeric_dtype(chunk[c])]
+            parts = {c: [] for c in numeric}
+        stamps.append(pd.DatetimeIndex(pd.to_datetime(chunk["timestamp"], utc=True)).asi8)
+        for c, acc in parts.items():
+            acc.append(pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype=float))
+    if not stamps:
+        raise ValueError("CSV has no rows.")
+    return np.concatenate(stamps), {c: np.concatenate(acc) for c, acc in parts.items()}
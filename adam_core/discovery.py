@@ -0,0 +1,151 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+import argparse
+import os
+import numpy as np
+import pandas as pd
+import yaml
+
+from .config import Ontology, load_ontology
+from .graph import compile_graph
+from .resample import resample
+from .simulator import initial_pressures
+
+def badness_matrix(df: pd.DataFrame, ontology: Ontology, diff: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """(C, N) z-scored series where up is always worse, and the (N, C) pressures they came from.
+
+    Rows are first put on the `step_hours` grid; missing readings add no badness.
+    With `diff`, step-to-step changes are
+    correlated instead of levels, so shared trends do not look like propagation.
+    """
+    graph = compile_graph(ontology)
+    values = resample(df, ontology).columns(graph.metrics)
+    # Gaps carry the last reading forward; zero-filling would read as the worst value on lower-is-worse metrics.
+    held = pd.DataFrame(values).ffill().to_numpy()
+    pressures = initial_pressures(np.nan_to_num(held), graph, ontology)
+    pressures[np.isnan(held)] = 0.0  # before a metric's first reading
+    sign = np.where(np.array(graph.directions) == "lower_is_worse", -1.0, 1.0)
+    x = values * sign
+    if diff:
+        x = np.diff(x, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x = (x - np.nanmean(x, axis=0)) / np.nanstd(x, axis=0)
+    return np.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0).T, pressures
+
+def lagged_correlations(x: np.ndarray, max_lag: int, block: int = 32, workers: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Best positive lag, its correlation and the zero-lag correlation for every ordered pair.
+
+    One real FFT per series, then for each block of sources the products with
+    every target's spectrum are inverted at once, so all lags for all pairs in
+    the block cost one batched irfft. Blocks run on a thread pool and are reduced
+    as they finish, so memory stays at O(block * C * n).
+    """
+    c, n = x.shape
+    max_lag = max(1, min(int(max_lag), n - 1))
+    nfft = 1 << int(np.ceil(np.log2(n + max_lag)))
+    spec = np.fft.rfft(x, n=nfft, axis=1)
+    overlap = (n - np.arange(max_lag + 1)).astype(float)  # terms summed at each lag
+
+    best_lag = np.zeros((c, c), dtype=np.int64)
+    best_corr = np.zeros((c, c))
+    zero_corr = np.zeros((c, c))
+
+    def run(lo: int) -> None:
+        hi = min(c, lo + block)
+        # sum_t x_i(t) x_j(t + L) for L = 0..max_lag
+        cc = np.fft.irfft(np.conj(spec[lo:hi, None, :]) * spec[None, :, :], n=nfft, axis=2)[..., : max_lag + 1] / overlap
+        zero_corr[lo:hi] = cc[..., 0]
+        lag = cc[..., 1:].argmax(axis=2)
+        best_lag[lo:hi] = lag + 1
+        best_corr[lo:hi] = np.take_along_axis(cc[..., 1:], lag[..., None], axis=2)[..., 0]
+
+    n_workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    with ThreadPoolExecutor(max_workers=max(1, n_workers)) as pool:
+        list(pool.map(run, range(0, c, block)))
+    return best_lag, best_corr, zero_corr
+
+def discover(
+    df: pd.DataFrame,
+    ontology: Ontology,
+    max_lag_days: float = 14.0,
+    min_corr: float = 0.3,
+    max_parents: int = 3,
+    diff: bool = True,
+    workers: int | None = None,
+) -> List[Dict[str, Any]]:
+    """Propose `propagation_graph` edges from lagged cross-correlation of the history.
+
+    Edge i -> j is proposed when i's worsening leads j's at some lag of 1 step or
+    more, and that correlation is at least `min_corr`. It must also beat the
+    same-step correlation and the best j -> i correlation. At most
+    `max_parents` proposals are kept per target, strongest first.
+
+    `delay_days` is the best lag rounded to whole days (at least 1).
+    `amplification` is a proxy: the least-squares slope of the target's pressure
+    on the source's pressure (correlation x std ratio), clipped to 0.1..3.0.
+    """
+    graph = compile_graph(ontology)
+    step_hours = int(ontology.step_hours)
+    x, pressures = badness_matrix(df, ontology, diff=diff)
+    max_lag = int(max_lag_days * 24 // step_hours)
+    best_lag, best_corr, zero_corr = lagged_correlations(x, max_lag, workers=workers)
+
+    ok = (best_corr >= min_corr) & (best_corr > zero_corr) & (best_corr > best_corr.T)
+    np.fill_diagonal(ok, False)
+    std = pressures.std(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = best_corr * std[None, :] / std[:, None]
+    slope = np.clip(np.where(np.isfinite(slope), slope, 1.0), 0.1, 3.0)
+
+    existing = set(graph.edges)
+    out: List[Dict[str, Any]] = []
+    for j in range(len(graph.controls)):
+        parents = np.flatnonzero(ok[:, j])
+        parents = parents[np.argsort(-best_corr[parents, j], kind="stable")][:max_parents]
+        for i in parents:
+            out.append({
+                "src": graph.controls[i],
+                "dst": graph.controls[j],
+                "delay_days": max(1, int(round(best_lag[i, j] * step_hours / 24))),
+                "amplification": round(float(slope[i, j]), 2),
+                "correlation": round(float(best_corr[i, j]), 4),
+                "lag_steps": int(best_lag[i, j]),
+                "existing": (graph.controls[i], graph.controls[j]) in existing,
+            })
+    out.sort(key=lambda e: e["correlation"], reverse=True)
+    return out
+
+def to_ontology_fragment(proposals: List[Dict[str, Any]]) -> str:
+    """`propagation_graph` YAML for the proposals, loadable as-is."""
+    edges = [{k: e[k] for k in ("src", "dst", "delay_days", "amplification")} for e in proposals]
+    return yaml.safe_dump({"propagation_graph": edges}, sort_keys=False)
+
+def main():
+    ap = argparse.ArgumentParser(description="Propose propagation_graph edges from lagged cross-correlations in history.")
+    ap.add_argument("--csv", default="data/arcadian_cloud_systems_timeseries.csv")
+    ap.add_argument("--ontology", default="config/ontology.yaml")
+    ap.add_argument("--max-lag-days", type=float, default=14.0)
+    ap.add_argument("--min-corr", type=float, default=0.3)
+    ap.add_argument("--max-parents", type=int, default=3)
+    ap.add_argument("--levels", action="store_true", help="Correlate levels instead of step-to-step changes.")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default=None, help="Write the YAML fragment here instead of stdout.")
+    args = ap.parse_args()
+
+    proposals = discover(
+        pd.read_csv(args.csv), load_ontology(args.ontology),
+        max_lag_days=args.max_lag_days, min_corr=args.min_corr, max_parents=args.max_parents,
+        diff=not args.levels, workers=args.workers,
+    )
+    for e in proposals:
+        print(f"{e['src']} -> {e['dst']}: corr={e['correlation']:.3f} lag={e['lag_steps']} steps ({e['delay_days']}d) amp~{e['amplification']}{' (existing)' if e['existing'] else ''}")
+    fragment = to_ontology_fragment(proposals)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(fragment)
+    else:
+        print(fragment)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+from typing import List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+METHODS = ("lttb", "minmax")
+MINMAX_RATIO = 4  # MinMaxLTTB: candidates pre-selected per output point before LTTB runs
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Sorted indices of the min and max of `n_out // 2` equal-count buckets of `y`.
+
+    Every bucket keeps its extremes, so a spike survives however narrow it is.
+    NaNs are never selected unless a bucket holds nothing else.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    k = -(-n // max(n_out // 2, 1))  # rows per bucket
+    rows = -(-n // k)
+    pad = rows * k - n
+    nan = np.isnan(y)
+    hi = np.pad(np.where(nan, -np.inf, y), (0, pad), constant_values=-np.inf).reshape(rows, k)
+    lo = np.pad(np.where(nan, np.inf, y), (0, pad), constant_values=np.inf).reshape(rows, k)
+    base = np.arange(rows) * k
+    idx = np.concatenate([base + hi.argmax(axis=1), base + lo.argmin(axis=1)])
+    return np.unique(np.minimum(idx, n - 1))
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Sorted indices of `n_out` points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are kept. Each of the `n_out - 2` buckets between
+    them contributes the point forming the largest triangle with the point kept
+    from the previous bucket and the mean of the next one. Bucket statistics and
+    triangle areas are computed for all buckets at once; only the chain of kept
+    points is walked bucket by bucket. `x` must be increasing and `y` finite.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    m = len(x)
+    if m <= n_out or m < 3:
+        return np.arange(m)
+    if n_out < 3:
+        return np.array([0, m - 1])[:max(n_out, 0)]
+    edges = np.linspace(1, m - 1, n_out - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sizes = ends - starts
+    # (B, K) candidate indices; short buckets repeat their last point, which argmax never prefers.
+    idx = np.minimum(starts[:, None] + np.arange(sizes.max()), (ends - 1)[:, None])
+    px, py = x[idx], y[idx]
+    cx = np.r_[np.add.reduceat(x[1:m - 1], starts[1:] - 1) / sizes[1:], x[-1]]
+    cy = np.r_[np.add.reduceat(y[1:m - 1], starts[1:] - 1) / sizes[1:], y[-1]]
+    out = np.empty(len(starts), dtype=np.int64)
+    ax, ay = x[0], y[0]
+    for b in range(len(starts)):
+        j = np.abs((px[b] - ax) * (cy[b] - ay) - (cx[b] - ax) * (py[b] - ay)).argmax()
+        out[b] = idx[b, j]
+        ax, ay = px[b, j], py[b, j]
+    return np.r_[0, out, m - 1]
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int, method: str = "lttb") -> np.ndarray:
+    """Sorted indices of at most `max_points` points of `(x, y)` that keep its shape and spikes.
+
+    "lttb" is MinMaxLTTB: min-max pre-selects `MINMAX_RATIO` candidates per
+    output point, then LTTB picks among them, so the cost stays linear in the
+    input. "minmax" keeps each bucket's extremes and suits step-like series.
+    Buckets hold equal numbers of rows, which for regularly sampled data means
+    equal widths. Non-finite values are skipped, not selected.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}; expected one of {METHODS}.")
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(y)
+    if not finite.all():
+        keep = np.flatnonzero(finite)
+        return keep[downsample(x[keep], y[keep], max_points, method)]
+    if len(y) <= max_points:
+        return np.arange(len(y))
+    if method == "minmax":
+        return minmax(y, max_points)
+    if len(y) > MINMAX_RATIO * max_points:
+        inner = 1 + minmax(y[1:-1], MINMAX_RATIO * max_points)
+        cand = np.r_[0, inner, len(y) - 1]
+        return cand[lttb(x[cand], y[cand], max_points)]
+    return lttb(x, y, max_points)
+
+def downsample_frame(df: pd.DataFrame, max_points: int, columns: Optional[Sequence[str]] = None, on: Optional[str] = None, method: str = "lttb") -> pd.DataFrame:
+    """At most `max_points` rows of `df`, ordered by `on` (default: the index), for plotting `columns`.
+
+    Each column picks its own `max_points // len(columns)` points and the rows
+    picked by any column are returned whole, so every series keeps its spikes
+    and all of them share one x axis without gaps. A series needs at least 3
+    points (its ends and one between), so `max_points` below `3 * len(columns)`
+    is a ValueError.
+    """
+    columns: List[str] = list(df.columns.drop(on) if on is not None else df.columns) if columns is None else list(columns)
+    if len(df) <= max_points or not columns:
+        return df
+    if max_points < 3 * len(columns):
+        raise ValueError(f"max_points must be at least 3 per series: {3 * len(columns)} for {len(columns)} columns.")
+    x = _as_float(df[on] if on is not None else df.index)
+    per = max_points // len(columns)
+    picked = np.unique(np.concatenate([downsample(x, df[c].to_numpy(dtype=np.float64, na_value=np.nan), per, method) for c in columns]))
+    return df.iloc[picked]
+
+def _as_float(x) -> np.ndarray:
+    """x positions as float64, relative to the first so nanosecond timestamps keep their precision."""
+    if isinstance(x, (pd.Series, pd.Index)) and pd.api.types.is_datetime64_any_dtype(x.dtype):
+        x = pd.DatetimeIndex(x).asi8
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype("datetime64[ns]").view(np.int64)
+    if not len(x):
+        return x.astype(np.float64)
+    return (x - x[0]).astype(np.float64)
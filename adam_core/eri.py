@@ -1,7 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict
-import math
+from typing import Dict, Sequence
+import numpy as np
 
 @dataclass(frozen=True)
 class ERIResult:
@@ -10,21 +10,45 @@ class ERIResult:
     top_driver: str
     time_to_failure_days: float | None
 
-def compute_eri(probabilities: Dict[str, float], impact_weights: Dict[str, float], time_to_failure_days: float | None) -> ERIResult:
-    components = {}
-    total = 0.0
-    for ctrl, p in probabilities.items():
-        w = float(impact_weights.get(ctrl, 1.0))
-        comp = float(p) * w
-        components[ctrl] = comp
-        total += comp
+@dataclass(frozen=True)
+class ERIBatch:
+    eri: np.ndarray  # (K,)
+    top_driver: np.ndarray  # (K,) column index into the probability matrix, -1 if there are no controls
+    components: np.ndarray  # (K, C)
+
+def impact_vector(impact_weights: Dict[str, float], controls: Sequence[str]) -> np.ndarray:
+    """Impact weights aligned to `controls`; unknown controls weigh 1.0."""
+    return np.array([float(impact_weights.get(c, 1.0)) for c in controls], dtype=float)
+
+def compute_eri_batch(probabilities: np.ndarray, impact_weights: np.ndarray, time_to_failure_days: np.ndarray | None = None) -> ERIBatch:
+    """Vectorized ERI over a (K, C) probability matrix.
 
-    eri = 1.0 - math.exp(-total)
+    `time_to_failure_days` is a (K,) vector where NaN means "no predicted failure".
+    """
+    p = np.asarray(probabilities, dtype=float)
+    if p.ndim == 1:
+        p = p[None, :]
+    k, c = p.shape
+
+    components = p * np.asarray(impact_weights, dtype=float)[None, :]
+    total = components.sum(axis=1)
+    eri = 1.0 - np.exp(-total)
 
     if time_to_failure_days is not None:
-        t = max(0.0, float(time_to_failure_days))
-        time_boost = 1.0 / (1.0 + (t / 14.0))
-        eri = min(1.0, eri * (0.8 + 0.4 * time_boost))
+        t = np.broadcast_to(np.asarray(time_to_failure_days, dtype=float), (k,))
+        known = ~np.isnan(t)
+        time_boost = 1.0 / (1.0 + (np.maximum(0.0, np.where(known, t, 0.0)) / 14.0))
+        eri = np.where(known, np.minimum(1.0, eri * (0.8 + 0.4 * time_boost)), eri)
+
+    top = components.argmax(axis=1) if c else np.full(k, -1, dtype=np.intp)
+    return ERIBatch(eri=eri, top_driver=top, components=components)
+
+def compute_eri(probabilities: Dict[str, float], impact_weights: Dict[str, float], time_to_failure_days: float | None) -> ERIResult:
+    controls = list(probabilities.keys())
+    p = np.array([float(v) for v in probabilities.values()], dtype=float)
+    ttf = np.nan if time_to_failure_days is None else float(time_to_failure_days)
+    batch = compute_eri_batch(p[None, :], impact_vector(impact_weights, controls), np.array([ttf]))
 
-    top = max(components.items(), key=lambda kv: kv[1])[0] if components else "unknown"
-    return ERIResult(eri=float(eri), components=components, top_driver=top, time_to_failure_days=time_to_failure_days)
+    components = {ctrl: float(v) for ctrl, v in zip(controls, batch.components[0])}
+    top = controls[int(batch.top_driver[0])] if controls else "unknown"
+    return ERIResult(eri=float(batch.eri[0]), components=components, top_driver=top, time_to_failure_days=time_to_failure_days)
@@ -0,0 +1,315 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import argparse
+import os
+import re
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+try:  # optional: only the export subsystem needs it
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - exercised only without pyarrow installed
+    pa = pq = None
+
+from .calibrate import EriCache
+from .config import Ontology
+from .eri import compute_eri_batch, impact_vector
+from .replay import ReplayResult
+from .simulator import ForecastResult
+from .states import STATE_ORDER
+
+KINDS = ("forecast", "replay", "eri_history")
+ROW_GROUP_ROWS = 256_000
+MAX_BUFFERED_GROUPS = 4  # rows held across all partitions before everything is flushed, in row groups
+MAX_OPEN_WRITERS = 64
+_TENANT_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+def _schemas() -> Dict[str, "pa.Schema"]:
+    ts = pa.timestamp("ms", tz="UTC")
+    label = pa.dictionary(pa.int16(), pa.string())
+    return {
+        # One row per forecast step and control.
+        "forecast": pa.schema([
+            ("run_start", ts),
+            ("horizon_days", pa.int16()),
+            ("timestamp", ts),
+            ("step", pa.int32()),
+            ("control", label),
+            ("pressure", pa.float32()),
+            ("probability", pa.float32()),
+            ("state", pa.dictionary(pa.int8(), pa.string())),
+        ]),
+        # One row per replayed as-of day; `incident_time` identifies the replay.
+        "replay": pa.schema([
+            ("incident_time", ts),
+            ("as_of", ts),
+            ("eri", pa.float32()),
+            ("top_driver", label),
+            ("time_to_failure_days", pa.float32()),
+            ("predicted_first_sla_degrade_or_fail", ts),
+            ("top_choke_point", label),
+        ]),
+        # One row per day of history.
+        "eri_history": pa.schema([
+            ("as_of", ts),
+            ("eri", pa.float32()),
+            ("top_driver", label),
+            ("time_to_failure_days", pa.float32()),
+            ("incident_active", pa.bool_()),
+        ]),
+    }
+
+class ParquetExporter:
+    """Writes forecasts, replays and daily ERI history under `root` as Hive-partitioned Parquet.
+
+    Files land in `<root>/<kind>/tenant=<id>/date=<YYYY-MM-DD>/part-*.parquet`,
+    where the date is the forecast's start or the row's as-of day. Control ids,
+    states and drivers are dictionary-encoded and measurements are float32.
+
+    Rows are buffered per partition and written as a row group every
+    `row_group_rows` rows to a file that stays open for the exporter's
+    lifetime, so a backfill over years produces one file per partition
+    rather than one per run. A file is written under a dot-prefixed name,
+    which readers skip, and renamed into place when closed. When more than
+    `max_open` files are open, the least recently written is closed; later
+    rows for its partition go to a new part file. Use as a context manager,
+    or call `close()`; a long-running writer calls `close()` now and then to
+    publish what it has written, and later rows go to new part files.
+    Methods are safe to call from several threads.
+    """
+
+    def __init__(self, root: str, row_group_rows: int = ROW_GROUP_ROWS, max_open: int = MAX_OPEN_WRITERS, compression: str = "zstd"):
+        if pa is None:
+            raise ImportError("Parquet export needs pyarrow: pip install pyarrow")
+        self.root = root
+        self.row_group_rows = int(row_group_rows)
+        self.max_open = int(max_open)
+        self.compression = compression
+        self.schemas = _schemas()
+        self.stats = {"rows": 0, "row_groups": 0, "files": 0}
+        # Unique per exporter, so short-lived exporters in one process never reuse a file name.
+        self._session = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._buffers: Dict[Tuple[str, str, str], List["pa.Table"]] = {}
+        self._buffered: Dict[Tuple[str, str, str], int] = {}
+        self._buffered_total = 0
+        self._writers: "OrderedDict[Tuple[str, str, str], Tuple[pq.ParquetWriter, str, str]]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __enter__(self) -> "ParquetExporter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write_forecast(self, tenant: str, fr: ForecastResult, controls: Sequence[str]) -> int:
+        """Add a forecast's series; `controls` is `compile_graph(ontology).controls`. Returns rows added."""
+        if not fr.series:
+            return 0
+        steps, c = len(fr.series), len(controls)
+        if fr.arrays is not None:
+            pressures, probabilities, states = fr.arrays["pressures"], fr.arrays["probabilities"], fr.arrays["states"]
+        else:
+            pressures = np.array([[p.pressures[cid] for cid in controls] for p in fr.series])
+            probabilities = np.array([[p.probabilities[cid] for cid in controls] for p in fr.series])
+            states = np.array([[STATE_ORDER.index(p.predicted_states[cid]) for cid in controls] for p in fr.series], dtype=np.int8)
+        stamps = pd.DatetimeIndex([p.timestamp for p in fr.series])
+        start = pd.Timestamp(fr.start)
+        start = start.tz_localize("UTC") if start.tz is None else start.tz_convert("UTC")
+        table = pa.Table.from_arrays([
+            _stamps(np.full(steps * c, start.tz_localize(None).to_datetime64())),
+            pa.array(np.full(steps * c, fr.horizon_days, dtype=np.int16)),
+            _stamps(stamps.repeat(c)),
+            pa.array(np.repeat(np.arange(1, steps + 1, dtype=np.int32), c)),
+            _labels(np.tile(np.arange(c, dtype=np.int16), steps), controls),
+            pa.array(np.asarray(pressures, dtype=np.float32).ravel()),
+            pa.array(np.asarray(probabilities, dtype=np.float32).ravel()),
+            pa.DictionaryArray.from_arrays(pa.array(np.asarray(states, dtype=np.int8).ravel()), pa.array(STATE_ORDER)),
+        ], schema=self.schemas["forecast"])
+        self._add("forecast", tenant, start.strftime("%Y-%m-%d"), table)
+        return table.num_rows
+
+    def write_replay(self, tenant: str, rr: ReplayResult) -> int:
+        """Add a replay's `eri_series`, partitioned by each point's as-of day. Returns rows added."""
+        if not rr.eri_series:
+            return 0
+        s = pd.DataFrame(rr.eri_series)
+        as_of = pd.to_datetime(s["as_of"], utc=True)
+        table = pa.Table.from_arrays([
+            _stamps([rr.incident_time] * len(s)),
+            _stamps(as_of),
+            pa.array(s["eri"].to_numpy(dtype=np.float32)),
+            _encode(s["top_driver"]),
+            pa.array(s["time_to_failure_days"].to_numpy(dtype=np.float32, na_value=np.nan), from_pandas=True),
+            _stamps(pd.to_datetime(s["predicted_first_sla_degrade_or_fail"], utc=True)),
+            _encode(s["top_choke_point"]),
+        ], schema=self.schemas["replay"])
+        return self._add_by_day("replay", tenant, as_of, table)
+
+    def write_eri_history(self, tenant: str, cache: EriCache, ontology: Ontology) -> int:
+        """Add one ERI row per cached day, scored with the ontology's impact weights. Returns rows added."""
+        if not len(cache.as_of):
+            return 0
+        batch = compute_eri_batch(cache.probabilities, impact_vector(ontology.impact_weights, cache.controls), cache.time_to_failure_days)
+        top = np.asarray(batch.top_driver)
+        names = list(cache.controls) + ["unknown"]
+        as_of = pd.DatetimeIndex(cache.as_of).tz_localize("UTC")
+        table = pa.Table.from_arrays([
+            _stamps(as_of),
+            pa.array(np.asarray(batch.eri, dtype=np.float32)),
+            _labels(np.where(top >= 0, top, len(names) - 1).astype(np.int16), names),
+            pa.array(np.asarray(cache.time_to_failure_days, dtype=np.float32), from_pandas=True),
+            pa.array(np.asarray(cache.incident_active, dtype=bool)),
+        ], schema=self.schemas["eri_history"])
+        return self._add_by_day("eri_history", tenant, as_of, table)
+
+    def _add_by_day(self, kind: str, tenant: str, stamps, table: "pa.Table") -> int:
+        days = pd.DatetimeIndex(stamps).strftime("%Y-%m-%d").to_numpy()
+        order = np.argsort(days, kind="stable")
+        days = days[order]
+        table = table.take(pa.array(order))
+        cuts = np.flatnonzero(np.r_[True, days[1:] != days[:-1], True])
+        for a, b in zip(cuts[:-1], cuts[1:]):
+            self._add(kind, tenant, days[a], table.slice(a, b - a))
+        return table.num_rows
+
+    def _add(self, kind: str, tenant: str, date: str, table: "pa.Table") -> None:
+        if not _TENANT_RE.match(tenant):
+            raise ValueError(f"Invalid tenant id: {tenant!r}")
+        with self._lock:
+            self._add_locked((kind, tenant, date), table)
+
+    def _add_locked(self, key: Tuple[str, str, str], table: "pa.Table") -> None:
+        self._buffers.setdefault(key, []).append(table)
+        self._buffered[key] = self._buffered.get(key, 0) + table.num_rows
+        self._buffered_total += table.num_rows
+        self.stats["rows"] += table.num_rows
+        if self._buffered[key] >= self.row_group_rows:
+            self._flush(key)
+        elif self._buffered_total >= MAX_BUFFERED_GROUPS * self.row_group_rows:
+            self.flush()  # many small partitions: bound memory with smaller row groups
+
+    def _flush(self, key: Tuple[str, str, str]) -> None:
+        tables = self._buffers.pop(key, None)
+        self._buffered_total -= self._buffered.pop(key, 0)
+        if not tables:
+            return
+        # Per-batch dictionaries differ; unify them so the row group has one dictionary per column.
+        table = pa.concat_tables(tables).unify_dictionaries().combine_chunks()
+        writer = self._writers.get(key)
+        if writer is None:
+            writer = self._open(key)
+        self._writers.move_to_end(key)
+        writer[0].write_table(table, row_group_size=max(len(table), 1))
+        self.stats["row_groups"] += 1
+        while len(self._writers) > self.max_open:
+            self._close_writer(next(iter(self._writers)))
+
+    def _open(self, key: Tuple[str, str, str]) -> Tuple["pq.ParquetWriter", str, str]:
+        kind, tenant, date = key
+        folder = os.path.join(self.root, kind, f"tenant={tenant}", f"date={date}")
+        os.makedirs(folder, exist_ok=True)
+        self.stats["files"] += 1
+        name = f"part-{self._session}-{self.stats['files']:05d}.parquet"
+        tmp, final = os.path.join(folder, f".{name}"), os.path.join(folder, name)
+        writer = pq.ParquetWriter(tmp, self.schemas[kind], compression=self.compression, use_dictionary=True)
+        self._writers[key] = (writer, tmp, final)
+        return self._writers[key]
+
+    def _close_writer(self, key: Tuple[str, str, str]) -> None:
+        writer, tmp, final = self._writers.pop(key)
+        writer.close()
+        os.replace(tmp, final)
+
+    def flush(self) -> None:
+        """Write every buffered partition as a row group (files stay open for more)."""
+        with self._lock:
+            for key in list(self._buffers):
+                self._flush(key)
+
+    def close(self) -> None:
+        """Flush buffers and close every file, making them visible to readers."""
+        with self._lock:
+            self.flush()
+            for key in list(self._writers):
+                self._close_writer(key)
+
+def _stamps(values) -> "pa.Array":
+    """UTC millisecond timestamps (naive input is taken as UTC); NaT becomes null."""
+    idx = pd.DatetimeIndex(values)
+    idx = idx.tz_localize("UTC") if idx.tz is None else idx.tz_convert("UTC")
+    return pa.array(idx.as_unit("ms").asi8, pa.int64(), mask=np.asarray(idx.isna())).cast(pa.timestamp("ms", tz="UTC"))
+
+def _labels(codes: np.ndarray, names: Sequence[str]) -> "pa.DictionaryArray":
+    return pa.DictionaryArray.from_arrays(pa.array(codes.astype(np.int16)), pa.array(list(names), pa.string()))
+
+def _encode(values: pd.Series) -> "pa.DictionaryArray":
+    codes, uniques = pd.factorize(values)  # None/NaN -> -1 -> null
+    return pa.DictionaryArray.from_arrays(pa.array(codes.astype(np.int16), mask=codes < 0), pa.array([str(u) for u in uniques], pa.string()))
+
+def backfill(df: pd.DataFrame, ontology: Ontology, exporter: ParquetExporter, tenant: str, forecast_days: Optional[int] = None, replays: bool = True, eri_history: bool = True, lookback_days: int = 30) -> Dict[str, Any]:
+    """Export a history: a forecast as of each of the last `forecast_days` days (all days if None),
+    a replay before every incident onset, and the daily ERI history. Returns rows written per kind."""
+    from .calibrate import build_eri_cache, incidents_from_flags
+    from .graph import compile_graph
+    from .replay import backtest_replay
+    from .simulator import forecast_from_pressures, initial_pressures
+
+    df = df.copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    df = df.sort_values("timestamp", kind="mergesort")
+    graph = compile_graph(ontology)
+    controls = graph.controls
+    rows = {kind: 0 for kind in KINDS}
+
+    if forecast_days != 0:
+        days = pd.date_range(df["timestamp"].iloc[0].ceil("D"), df["timestamp"].iloc[-1].floor("D"), freq="1D")
+        days = days[-forecast_days:] if forecast_days else days
+        # Like `forecast(df, start_time=day)` per day, from one pass over the sorted frame:
+        # each day starts from the last row stamped exactly at midnight.
+        stamps = pd.DatetimeIndex(df["timestamp"]).asi8
+        idx = np.searchsorted(stamps, days.asi8, side="right") - 1
+        found = (idx >= 0) & (stamps[np.maximum(idx, 0)] == days.asi8)
+        p0 = initial_pressures(df[graph.metrics].to_numpy(dtype=float)[idx[found]], graph, ontology)
+        for k, day in enumerate(days[found]):
+            fr = forecast_from_pressures(p0[k], day, ontology, graph, explain=False)
+            rows["forecast"] += exporter.write_forecast(tenant, fr, controls)
+    if replays:
+        for onset in incidents_from_flags(df):
+            try:
+                rr = backtest_replay(df, ontology, incident_time=onset.isoformat(), lookback_days=lookback_days, horizon_days=ontology.forecast_horizon_days)
+            except ValueError:
+                continue  # the onset has no history before it
+            rows["replay"] += exporter.write_replay(tenant, rr)
+    if eri_history:
+        rows["eri_history"] += exporter.write_eri_history(tenant, build_eri_cache(df, ontology), ontology)
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser(description="Backfill forecasts, replays and ERI history for a tenant as partitioned Parquet.")
+    ap.add_argument("--csv", default="data/arcadian_cloud_systems_timeseries.csv")
+    ap.add_argument("--ontology", default="config/ontology.yaml")
+    ap.add_argument("--tenant", default="default")
+    ap.add_argument("--out", default="export")
+    ap.add_argument("--forecast-days", type=int, default=None, help="Forecast as of each of the last N days (default: every day; 0 to skip).")
+    ap.add_argument("--no-replays", action="store_true")
+    ap.add_argument("--no-eri-history", action="store_true")
+    ap.add_argument("--row-group-rows", type=int, default=ROW_GROUP_ROWS)
+    args = ap.parse_args()
+
+    from .config import load_ontology
+
+    started = time.perf_counter()
+    with ParquetExporter(args.out, row_group_rows=args.row_group_rows) as exporter:
+        rows = backfill(
+            pd.read_csv(args.csv), load_ontology(args.ontology), exporter, args.tenant,
+            forecast_days=args.forecast_days, replays=not args.no_replays, eri_history=not args.no_eri_history,
+        )
+    print(f"{rows} -> {args.out} ({exporter.stats['files']} files, {exporter.stats['row_groups']} row groups) in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+from typing import Any, Dict, List
+import threading
+import pandas as pd
+import numpy as np
+
+from .config import Ontology
+from .graph import compile_graph
+from .simulator import ForecastResult, forecast_from_pressures, initial_pressures
+
+class Forecaster:
+    """Stateful forecaster that keeps parsed history and classified pressures.
+
+    `update(rows)` parses and classifies only the new rows, then re-simulates the
+    horizon from the latest row. The result is identical to calling `forecast`
+    on every row seen so far: history is kept in stable timestamp order, so ties
+    resolve to the last row received, as they do in `forecast`.
+    """
+
+    def __init__(self, ontology: Ontology, df: pd.DataFrame | None = None, horizon_days: int | None = None):
+        self.ontology = ontology
+        self.graph = compile_graph(ontology)
+        self.horizon_days = int(horizon_days or ontology.forecast_horizon_days)
+        c = len(self.graph.controls)
+        self._stamps = np.empty(0, dtype=np.int64)  # ns since epoch, UTC
+        self._values = np.empty((0, c))  # metric values, columns in graph.metrics order
+        self._pressures = np.empty((0, c))
+        self._result: ForecastResult | None = None
+        self._lock = threading.Lock()
+        if df is not None:
+            self.update(df)
+
+    def __len__(self) -> int:
+        return len(self._stamps)
+
+    @property
+    def last_timestamp(self) -> pd.Timestamp | None:
+        return pd.Timestamp(int(self._stamps[-1]), tz="UTC") if len(self._stamps) else None
+
+    def _parse(self, rows: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        stamps = pd.DatetimeIndex(pd.to_datetime(rows["timestamp"], utc=True)).asi8
+        values = rows[self.graph.metrics].to_numpy(dtype=float)
+        return stamps, values
+
+    @property
+    def latest_pressures(self) -> np.ndarray | None:
+        """Starting pressures the next `update` would forecast from."""
+        return self._pressures[-1].copy() if len(self._pressures) else None
+
+    def update(self, rows: pd.DataFrame | List[Dict[str, Any]]) -> ForecastResult:
+        """Append rows and return the forecast from the newest row."""
+        with self._lock:
+            self._append(rows)
+            if not len(self._stamps):
+                raise ValueError("No data to forecast from.")
+            if self._result is None:
+                self._result = self._simulate(len(self._stamps) - 1, self.horizon_days)
+            return self._result
+
+    def append(self, rows: pd.DataFrame | List[Dict[str, Any]]) -> None:
+        """Append rows without forecasting; the next `update` or `forecast` re-simulates."""
+        with self._lock:
+            self._append(rows)
+
+    def _append(self, rows: pd.DataFrame | List[Dict[str, Any]]) -> None:
+        if not isinstance(rows, pd.DataFrame):
+            rows = pd.DataFrame(list(rows))
+        if not len(rows):
+            return
+        stamps, values = self._parse(rows)
+        pressures = initial_pressures(values, self.graph, self.ontology)
+        in_order = bool(np.all(np.diff(stamps) >= 0)) and (not len(self._stamps) or stamps[0] >= self._stamps[-1])
+
+        self._stamps = np.concatenate([self._stamps, stamps])
+        self._values = np.concatenate([self._values, values])
+        self._pressures = np.concatenate([self._pressures, pressures])
+        if not in_order:
+            order = np.argsort(self._stamps, kind="stable")
+            self._stamps = self._stamps[order]
+            self._values = self._values[order]
+            self._pressures = self._pressures[order]
+        self._result = None
+
+    def forecast(self, start_time: str | None = None, horizon_days: int | None = None) -> ForecastResult:
+        """Forecast from any point in the held history without re-parsing it."""
+        with self._lock:
+            if not len(self._stamps):
+                raise ValueError("No data to forecast from.")
+            horizon = int(horizon_days or self.horizon_days)
+            if start_time is None:
+                if horizon == self.horizon_days and self._result is not None:
+                    return self._result
+                return self._simulate(len(self._stamps) - 1, horizon)
+
+            t0 = pd.to_datetime(start_time, utc=True).value
+            i = int(np.searchsorted(self._stamps, t0, side="right")) - 1
+            if i < 0:
+                raise ValueError("start_time is earlier than any available data.")
+            if self._stamps[i] != t0:
+                raise ValueError("start_time does not match a row timestamp.")
+            return self._simulate(i, horizon)
+
+    def _simulate(self, i: int, horizon_days: int) -> ForecastResult:
+        t0 = pd.Timestamp(int(self._stamps[i]), tz="UTC")
+        return forecast_from_pressures(self._pressures[i], t0, self.ontology, self.graph, horizon_days)
+
+    def frame(self) -> pd.DataFrame:
+        """The held history as a DataFrame with parsed timestamps."""
+        df = pd.DataFrame(self._values, columns=self.graph.metrics)
+        df.insert(0, "timestamp", pd.to_datetime(self._stamps, utc=True))
+        return df
@@ -1,14 +1,167 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List, Dict
-import networkx as nx
-from .config import Edge
+from functools import cached_property
+from typing import TYPE_CHECKING, List, Dict, Tuple, Sequence, Any
+import numpy as np
+from .config import Edge, Ontology
+
+if TYPE_CHECKING:
+    import networkx as nx
 
 @dataclass(frozen=True)
 class PropagationGraph:
-    graph: nx.DiGraph
+    graph: "nx.DiGraph"
+
+@dataclass(frozen=True)
+class CompiledGraph:
+    """Index arrays for the simulator; edges keep `PropagationGraph` iteration order."""
+    controls: List[str]
+    metrics: List[str]
+    directions: List[str]
+    edges: List[Tuple[str, str]]
+    src: np.ndarray  # (E,) control index
+    dst: np.ndarray  # (E,) control index
+    delay_days: np.ndarray  # (E,) int
+    amplification: np.ndarray  # (E,) float
+
+    def index(self, control_id: str) -> int:
+        return self.controls.index(control_id)
+
+    @cached_property
+    def paths(self) -> "PathIndex":
+        return build_path_index(self)
+
+    def subgraph(self, keep: np.ndarray) -> tuple["CompiledGraph", np.ndarray]:
+        """Graph restricted to the controls in `keep` (sorted indices) and the edge mask used.
+
+        `keep` must be closed under "upstream of", so no kept edge loses its source.
+        """
+        pos = np.full(len(self.controls), -1, dtype=np.intp)
+        pos[keep] = np.arange(len(keep))
+        mask = pos[self.dst] >= 0
+        sub = CompiledGraph(
+            controls=[self.controls[i] for i in keep],
+            metrics=[self.metrics[i] for i in keep],
+            directions=[self.directions[i] for i in keep],
+            edges=[e for e, m in zip(self.edges, mask) if m],
+            src=pos[self.src[mask]],
+            dst=pos[self.dst[mask]],
+            delay_days=self.delay_days[mask],
+            amplification=self.amplification[mask],
+        )
+        return sub, mask
+
+    @cached_property
+    def components(self) -> List[np.ndarray]:
+        """Weakly connected components as sorted control-index arrays, largest first."""
+        labels = np.arange(len(self.controls))
+        while True:
+            low = np.minimum(labels[self.src], labels[self.dst])
+            nxt = labels.copy()
+            np.minimum.at(nxt, self.src, low)
+            np.minimum.at(nxt, self.dst, low)
+            nxt = nxt[nxt]  # pointer jumping
+            if np.array_equal(nxt, labels):
+                break
+            labels = nxt
+        _, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse, kind="stable")
+        comps = np.split(order, np.cumsum(counts)[:-1])
+        return sorted(comps, key=len, reverse=True)
+
+    def shards(self, n: int) -> List[tuple[np.ndarray, "CompiledGraph", np.ndarray]]:
+        """Up to `n` balanced unions of whole components as (controls, subgraph, edge mask).
+
+        Components are assigned largest first to the lightest shard (controls + edges),
+        so shards share no edges and can be simulated independently.
+        """
+        cache = self.__dict__.setdefault("_shards", {})
+        comps = self.components
+        n = max(1, min(int(n), len(comps)))
+        if n not in cache:
+            edges_per_control = np.bincount(self.dst, minlength=len(self.controls))
+            load = np.zeros(n)
+            members: List[List[np.ndarray]] = [[] for _ in range(n)]
+            for comp in comps:
+                i = int(load.argmin())
+                members[i].append(comp)
+                load[i] += len(comp) + edges_per_control[comp].sum()
+            out = []
+            for parts in members:
+                keep = np.sort(np.concatenate(parts))
+                sub, mask = self.subgraph(keep)
+                out.append((keep, sub, mask))
+            cache[n] = out
+        return cache[n]
+
+@dataclass(frozen=True)
+class PathIndex:
+    """All-pairs path facts for a compiled graph, stored densely for O(1) lookups.
+
+    - reach: (C, ceil(C / 8)) packed bits; bit (i, j) is set if j is reachable from i
+      by at least one edge
+    - min_delay_days: (C, C) smallest cumulative `delay_days` over paths, inf if unreachable
+    - max_amplification: (C, C) largest product of `amplification` over paths, 0 if
+      unreachable. Exact (the best simple path) unless a path can pass through a loop whose
+      product exceeds 1: repeating that loop grows without bound, so such pairs are inf.
+    """
+    controls: List[str]
+    reach: np.ndarray
+    min_delay_days: np.ndarray
+    max_amplification: np.ndarray
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """The index arrays by field name; `PathIndex(controls, **arrays)` rebuilds it."""
+        return {"reach": self.reach, "min_delay_days": self.min_delay_days, "max_amplification": self.max_amplification}
+
+    @cached_property
+    def _pos(self) -> Dict[str, int]:
+        return {c: i for i, c in enumerate(self.controls)}
+
+    def reachable(self, src: str, dst: str) -> bool:
+        i, j = self._pos[src], self._pos[dst]
+        return bool((self.reach[i, j >> 3] >> (7 - (j & 7))) & 1)
+
+    def lookup(self, src: str, dst: str) -> Dict[str, Any]:
+        i, j = self._pos[src], self._pos[dst]
+        ok = self.reachable(src, dst)
+        return {
+            "src": src,
+            "dst": dst,
+            "reachable": ok,
+            "min_delay_days": round(float(self.min_delay_days[i, j]), 6) if ok else None,
+            "max_amplification": round(float(self.max_amplification[i, j]), 6) if ok and np.isfinite(self.max_amplification[i, j]) else None,
+            "amplifying_loop": ok and not np.isfinite(self.max_amplification[i, j]),
+        }
+
+    def upstream_mask(self, targets: Sequence[int]) -> np.ndarray:
+        """(C,) bool: controls that can reach any of `targets`, plus the targets."""
+        mask = np.zeros(len(self.controls), dtype=bool)
+        for j in targets:
+            mask |= ((self.reach[:, j >> 3] >> (7 - (j & 7))) & 1).astype(bool)
+        mask[list(targets)] = True
+        return mask
+
+    def upstream(self, dst: str, within_days: float | None = None) -> List[Dict[str, Any]]:
+        j = self._pos[dst]
+        idx = np.flatnonzero(self.upstream_mask([j]))
+        idx = idx[(idx != j) & (self.min_delay_days[idx, j] < np.inf)]
+        if within_days is not None:
+            idx = idx[self.min_delay_days[idx, j] <= within_days]
+        idx = idx[np.argsort(self.min_delay_days[idx, j], kind="stable")]
+        return [self.lookup(self.controls[i], dst) for i in idx]
+
+    def downstream(self, src: str, within_days: float | None = None) -> List[Dict[str, Any]]:
+        i = self._pos[src]
+        idx = np.flatnonzero(np.unpackbits(self.reach[i], count=len(self.controls)))
+        if within_days is not None:
+            idx = idx[self.min_delay_days[i, idx] <= within_days]
+        idx = idx[np.argsort(self.min_delay_days[i, idx], kind="stable")]
+        return [self.lookup(src, self.controls[j]) for j in idx]
 
 def build_graph(edges: List[Edge]) -> PropagationGraph:
+    import networkx as nx  # only for callers that want the DiGraph; compiling does not need it
+
     g = nx.DiGraph()
     for e in edges:
         g.add_edge(e.src, e.dst, delay_days=int(e.delay_days), amplification=float(e.amplification))
@@ -19,3 +172,84 @@ def edge_list(pg: PropagationGraph) -> List[Dict]:
     for u, v, d in pg.graph.edges(data=True):
         out.append({"src": u, "dst": v, "delay_days": d["delay_days"], "amplification": d["amplification"]})
     return out
+
+_COMPILED: Dict[int, Tuple[Ontology, CompiledGraph]] = {}
+_COMPILED_MAX = 32
+
+def compile_graph(ontology: Ontology) -> CompiledGraph:
+    """Compile once per ontology object; later calls return the same `CompiledGraph`."""
+    hit = _COMPILED.get(id(ontology))
+    if hit is not None and hit[0] is ontology:
+        return hit[1]
+    compiled = _compile(ontology)
+    if len(_COMPILED) >= _COMPILED_MAX:
+        _COMPILED.pop(next(iter(_COMPILED)))
+    _COMPILED[id(ontology)] = (ontology, compiled)
+    return compiled
+
+def ordered_edges(edges: List[Edge]) -> List[Dict]:
+    """`edge_list(build_graph(edges))` without networkx.
+
+    A DiGraph iterates edges grouped by source, sources in the order nodes were
+    first seen (as source or destination), and each source's edges in insertion
+    order. A repeated (src, dst) keeps its first position and its last attributes.
+    """
+    adj: Dict[str, Dict[str, Edge]] = {}
+    for e in edges:
+        adj.setdefault(e.src, {})
+        adj.setdefault(e.dst, {})
+        adj[e.src][e.dst] = e
+    return [
+        {"src": u, "dst": v, "delay_days": int(e.delay_days), "amplification": float(e.amplification)}
+        for u, out in adj.items()
+        for v, e in out.items()
+    ]
+
+def _compile(ontology: Ontology) -> CompiledGraph:
+    controls = list(ontology.controls.keys())
+    pos = {cid: i for i, cid in enumerate(controls)}
+    edges = ordered_edges(ontology.edges)
+    for e in edges:
+        for node in (e["src"], e["dst"]):
+            if node not in pos:
+                raise ValueError(f"propagation_graph references unknown control: {node}")
+
+    return CompiledGraph(
+        controls=controls,
+        metrics=[ontology.controls[c].metric for c in controls],
+        directions=[ontology.controls[c].thresholds.direction for c in controls],
+        edges=[(e["src"], e["dst"]) for e in edges],
+        src=np.array([pos[e["src"]] for e in edges], dtype=np.intp),
+        dst=np.array([pos[e["dst"]] for e in edges], dtype=np.intp),
+        delay_days=np.array([e["delay_days"] for e in edges], dtype=np.int64),
+        amplification=np.array([e["amplification"] for e in edges], dtype=float),
+    )
+
+def build_path_index(graph: CompiledGraph) -> PathIndex:
+    """Min-plus (delay) and max-times (amplification) closures via vectorized Floyd-Warshall."""
+    c = len(graph.controls)
+    delay = np.full((c, c), np.inf)
+    log_amp = np.full((c, c), -np.inf)  # products in log space cannot overflow around cycles
+    with np.errstate(divide="ignore"):
+        for u, v, d, a in zip(graph.src, graph.dst, graph.delay_days, np.log(graph.amplification)):
+            delay[u, v] = min(delay[u, v], float(d))
+            log_amp[u, v] = max(log_amp[u, v], float(a))
+
+    for k in range(c):
+        np.minimum(delay, delay[:, k, None] + delay[None, k, :], out=delay)
+        np.maximum(log_amp, log_amp[:, k, None] + log_amp[None, k, :], out=log_amp)
+
+    reach = delay < np.inf
+    # Controls on a loop with product > 1; without them, max-times Floyd-Warshall is exact.
+    loops = np.flatnonzero(np.diag(log_amp) > 0)
+    if len(loops):
+        through = reach[:, loops].astype(np.int64) @ reach[loops, :].astype(np.int64)
+        log_amp[through > 0] = np.inf
+    with np.errstate(over="ignore"):
+        amp = np.exp(log_amp).astype(np.float32)
+    return PathIndex(
+        controls=list(graph.controls),
+        reach=np.packbits(reach, axis=1),
+        min_delay_days=delay.astype(np.float32),
+        max_amplification=np.where(reach, amp, np.float32(0.0)),
+    )
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from typing import Callable, Dict
+import importlib.util
+import os
+import numpy as np
+
+# Optional: Numba compiles the step loops below to machine code. It is imported on
+# first use, not here, so it does not slow down importing the engine.
+AVAILABLE = importlib.util.find_spec("numba") is not None
+# The simulator uses the compiled kernels when Numba is installed, unless ADAM_JIT=0.
+JIT = AVAILABLE and os.environ.get("ADAM_JIT", "1") != "0"
+
+def propagate_py(history, src, dst, amp, lag, noise, hi, keep, gain):
+    """Fill `history[1:]` in place, one scalar at a time, exactly like the dense NumPy engine.
+
+    `amp` and `lag` are (K, E), `hi` is (K, C), `noise` is (steps, C) and `keep`
+    is `1 - DECAY_PER_STEP`. Edge arrivals are read from `history[s - lag]`, the
+    pressure history doubling as every edge's delay ring buffer. Arrivals are
+    summed per destination in edge order and every expression is evaluated
+    in the NumPy engine's order, so both give the same history bit for bit.
+    """
+    steps = history.shape[0] - 1
+    k = history.shape[1]
+    c = history.shape[2]
+    incoming = np.zeros(c)
+    for s in range(steps):
+        for r in range(k):
+            incoming[:] = 0.0
+            for j in range(len(src)):
+                at = s - lag[r, j]
+                if at >= 0:
+                    incoming[dst[j]] += history[at, r, src[j]] * amp[r, j]
+            for i in range(c):
+                p = history[s, r, i] * keep + incoming[i] * gain + noise[s, i]
+                if p < 0.0:
+                    p = 0.0
+                if p > hi[r, i]:
+                    p = hi[r, i]
+                history[s + 1, r, i] = p
+
+def probabilities_py(history, window):
+    """(steps, K, C) rolling failure probabilities of a pressure history, like `_estimate_probabilities`."""
+    total = history.shape[0]
+    k = history.shape[1]
+    c = history.shape[2]
+    steps = max(total - 1, 0)
+    out = np.empty((steps, k, c))
+    for s in range(steps):
+        count = 0
+        for lag in range(1, window):
+            if s + 1 - lag >= 0:
+                count += 1
+        for r in range(k):
+            for i in range(c):
+                cur = history[s + 1, r, i]
+                if count + 1 < 3:
+                    p = cur
+                else:
+                    prev = 0.0
+                    for lag in range(1, window):
+                        if s + 1 - lag >= 0:
+                            prev += history[s + 1 - lag, r, i]
+                    trend = cur - prev / count
+                    if trend < 0.0:
+                        trend = 0.0
+                    p = 0.65 * cur + 0.35 * trend * 1.2
+                if p < 0.0:
+                    p = 0.0
+                if p > 1.0:
+                    p = 1.0
+                out[s, r, i] = p
+    return out
+
+_COMPILED: Dict[str, Callable] = {}
+
+def _compiled(fn: Callable) -> Callable:
+    kernel = _COMPILED.get(fn.__name__)
+    if kernel is None:
+        import numba
+
+        # cache=True keeps the machine code next to this file, so only the first process ever compiles.
+        kernel = _COMPILED[fn.__name__] = numba.njit(cache=True, nogil=True)(fn)
+    return kernel
+
+def propagate(history, src, dst, amp, lag, noise, hi, keep, gain) -> None:
+    """`propagate_py`, compiled."""
+    _compiled(propagate_py)(history, src, dst, amp, lag, noise, hi, keep, gain)
+
+def probabilities(history, window) -> np.ndarray:
+    """`probabilities_py`, compiled."""
+    return _compiled(probabilities_py)(history, window)
@@ -2,10 +2,12 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Any, List
 import pandas as pd
+import numpy as np
 
 from .config import Ontology
-from .simulator import forecast
-from .eri import compute_eri
+from .simulator import initial_pressures, simulate_cached, sla_index, summarize_run
+from .graph import compile_graph
+from .eri import compute_eri_batch, impact_vector
 
 @dataclass(frozen=True)
 class ReplayResult:
@@ -17,10 +19,123 @@ class ReplayResult:
     eri_series: List[Dict[str, Any]]
     narrative: Dict[str, Any]
 
-def backtest_replay(df: pd.DataFrame, ontology: Ontology, incident_time: str, lookback_days: int = 30, horizon_days: int = 14) -> ReplayResult:
+@dataclass(frozen=True)
+class ReplayInputs:
+    as_of: List[pd.Timestamp]
+    controls: List[str]
+    probabilities: np.ndarray  # (N, C) first-step probabilities per as-of point
+    time_to_failure_days: np.ndarray  # (N,), NaN when no SLA degrade is predicted
+    summaries: List[Dict[str, Any]]
+
+def replay_inputs(df: pd.DataFrame, ontology: Ontology, days: pd.DatetimeIndex, horizon_days: int, summaries: bool = True) -> ReplayInputs:
+    """Forecast every as-of day in one batched simulation and keep only what ERI needs.
+
+    `df` must already have parsed, sorted timestamps. Each day's as-of point is
+    the last row at or before that day's midnight; days with no data are skipped.
+    Without `summaries`, only controls upstream of the SLA control are simulated
+    past the first step and `summaries` is left empty.
+    """
+    graph = compile_graph(ontology)
+    stamps = pd.DatetimeIndex(df["timestamp"]).asi8
+    idx = np.searchsorted(stamps, pd.DatetimeIndex(days).asi8, side="right") - 1
+    idx = idx[idx >= 0]
+
+    as_of = [df["timestamp"].iloc[i] for i in idx]
+    p0 = initial_pressures(df[graph.metrics].to_numpy(dtype=float)[idx], graph, ontology)
+
+    step_hours = int(ontology.step_hours)
+    steps = int((int(horizon_days) * 24) / step_hours)
+    sla = sla_index(graph)
+    outputs = None if summaries else [sla] if sla is not None else []
+    batch = simulate_cached(p0, graph, steps, step_hours, outputs=outputs)
+
+    return ReplayInputs(
+        as_of=as_of,
+        controls=list(graph.controls),
+        probabilities=batch.first_probabilities(),
+        time_to_failure_days=batch.time_to_failure_days(sla),
+        summaries=[summarize_run(batch, k, graph, t0) for k, t0 in enumerate(as_of)] if summaries else [],
+    )
+
+def _eri_points(inputs: ReplayInputs, ontology: Ontology, refined: bool | None = None) -> List[Dict[str, Any]]:
+    """One ERI point per as-of time; `refined`, when given, is recorded on every point."""
+    batch = compute_eri_batch(inputs.probabilities, impact_vector(ontology.impact_weights, inputs.controls), inputs.time_to_failure_days)
+    points = []
+    for i, t0 in enumerate(inputs.as_of):
+        top = int(batch.top_driver[i])
+        summary = inputs.summaries[i] if inputs.summaries else {}
+        ttf = inputs.time_to_failure_days[i]
+        point = {
+            "as_of": t0.isoformat(),
+            "eri": float(batch.eri[i]),
+            "top_driver": inputs.controls[top] if top >= 0 else "unknown",
+            "time_to_failure_days": summary.get("time_to_failure_days") if summary else None if np.isnan(ttf) else float(ttf),
+            "predicted_first_sla_degrade_or_fail": summary.get("predicted_first_sla_degrade_or_fail"),
+            "top_choke_point": summary.get("top_choke_point"),
+        }
+        if refined is not None:
+            point["refined"] = refined
+        points.append(point)
+    return points
+
+def _sustained_start(points: List[Dict[str, Any]], threshold: float, sustain: int) -> int | None:
+    """Index of the first point that starts `sustain` consecutive points at or above `threshold`."""
+    run = 0
+    for i, pt in enumerate(points):
+        run = run + 1 if pt["eri"] >= threshold else 0
+        if run >= sustain:
+            return i - run + 1
+    return None
+
+def _refine_times(window: pd.DataFrame, lo: pd.Timestamp, hi: pd.Timestamp, step_hours: int) -> pd.DatetimeIndex:
+    """As-of times every `step_hours` strictly between two coarse points, one per distinct data row."""
+    stamps = pd.DatetimeIndex(window["timestamp"]).asi8
+    grid = pd.date_range(lo, hi, freq=pd.Timedelta(hours=step_hours), inclusive="neither")
+    idx = np.unique(np.searchsorted(stamps, grid.asi8, side="right") - 1)
+    lo_row = np.searchsorted(stamps, lo.value, side="right") - 1
+    hi_row = np.searchsorted(stamps, hi.value, side="right") - 1
+    return pd.DatetimeIndex(window["timestamp"].iloc[idx[(idx > lo_row) & (idx < hi_row)]])
+
+def _refined_warning(coarse: List[Dict[str, Any]], refined: List[Dict[str, Any]], threshold: float) -> str:
+    """Earliest as-of from which every refined point up to the coarse crossing `coarse[-1]` stays at or above `threshold`."""
+    warning = coarse[-1]["as_of"]
+    for pt in reversed(refined):
+        if pt["eri"] < threshold:
+            break
+        warning = pt["as_of"]
+    return warning
+
+def backtest_replay(
+    df: pd.DataFrame,
+    ontology: Ontology,
+    incident_time: str,
+    lookback_days: int = 30,
+    horizon_days: int = 14,
+    refine: bool = False,
+    first_warning_only: bool = False,
+    sustain: int = 1,
+    chunk_days: int = 7,
+) -> ReplayResult:
+    """Replay the days before a known incident and report when ERI first crossed the warning threshold.
+
+    The window is scanned once per calendar day. The first warning is the start
+    of the first run of `sustain` consecutive daily points at or above
+    `ontology.eri_warning`. With `refine`, the day before every upward crossing
+    is re-scanned every `ontology.step_hours`, so the first warning and lead
+    time are precise to the step instead of the day, and every point in
+    `eri_series` carries `refined`; crossings that start and end between two
+    daily points are not looked for.
+
+    With `first_warning_only`, days are scanned `chunk_days` at a time and the
+    scan stops at the first sustained crossing, which is then refined. Only the
+    upstream SLA path is simulated past the first step, so `eri_series` is left
+    empty and the narrative reports how many as-of points were simulated.
+    """
+    if sustain < 1 or chunk_days < 1:
+        raise ValueError("sustain and chunk_days must be at least 1.")
     df = df.copy()
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
-    df = df.sort_values("timestamp")
+    df = df.sort_values("timestamp", kind="mergesort")
     incident_ts = pd.to_datetime(incident_time, utc=True)
 
     start_ts = incident_ts - pd.Timedelta(days=lookback_days)
@@ -29,33 +144,43 @@ def backtest_replay(df: pd.DataFrame, ontology: Ontology, incident_time: str, lo
         raise ValueError("No data in the requested replay window.")
 
     days = pd.date_range(window["timestamp"].iloc[0].floor("D"), incident_ts.floor("D"), freq="1D", tz="UTC")
+    threshold = ontology.eri_warning
+    step_hours = int(ontology.step_hours)
+    summaries = not first_warning_only
 
-    eri_series: List[Dict[str, Any]] = []
-    first_warning = None
+    chunk = chunk_days if first_warning_only else len(days)
+    coarse: List[Dict[str, Any]] = []
+    first = None
+    for lo in range(0, len(days), chunk):
+        coarse += _eri_points(replay_inputs(window, ontology, days[lo:lo + chunk], horizon_days, summaries), ontology, False if refine else None)
+        first = _sustained_start(coarse, threshold, sustain)
+        if first is not None and first_warning_only:
+            break
+    simulated = len(coarse)
 
-    for day in days:
-        sub = window[window["timestamp"] <= day].copy()
-        if sub.empty:
-            continue
-        t0 = sub["timestamp"].iloc[-1].isoformat()
-        fr = forecast(sub, ontology, start_time=t0, horizon_days=horizon_days)
-
-        probs = fr.series[0].probabilities if fr.series else {}
-        ttf = fr.summary.get("time_to_failure_days")
-        eri = compute_eri(probs, ontology.impact_weights, ttf)
-
-        eri_point = {
-            "as_of": t0,
-            "eri": eri.eri,
-            "top_driver": eri.top_driver,
-            "time_to_failure_days": eri.time_to_failure_days,
-            "predicted_first_sla_degrade_or_fail": fr.summary.get("predicted_first_sla_degrade_or_fail"),
-            "top_choke_point": fr.summary.get("top_choke_point"),
-        }
-        eri_series.append(eri_point)
+    # Coarse points where ERI rises to the threshold, each refined back to the daily point before it.
+    if first_warning_only:
+        crossings = [first] if first is not None and first > 0 else []
+    else:
+        crossings = [i for i in range(1, len(coarse)) if coarse[i]["eri"] >= threshold > coarse[i - 1]["eri"]]
+    refined: Dict[int, List[Dict[str, Any]]] = {}
+    if refine or first_warning_only:
+        brackets = [_refine_times(window, pd.Timestamp(coarse[i - 1]["as_of"]), pd.Timestamp(coarse[i]["as_of"]), step_hours) for i in crossings]
+        times = pd.DatetimeIndex([t for b in brackets for t in b])
+        points = _eri_points(replay_inputs(window, ontology, times, horizon_days, summaries), ontology, True) if len(times) else []
+        simulated += len(points)
+        for i, b in zip(crossings, brackets):
+            refined[i], points = points[:len(b)], points[len(b):]
 
-        if first_warning is None and eri.eri >= ontology.eri_warning:
-            first_warning = pd.to_datetime(t0, utc=True)
+    first_warning = None
+    if first is not None:
+        first_warning = pd.to_datetime(_refined_warning(coarse[: first + 1], refined.get(first, []), threshold), utc=True)
+
+    eri_series: List[Dict[str, Any]] = []
+    if not first_warning_only:
+        for i, pt in enumerate(coarse):
+            eri_series += refined.get(i, [])
+            eri_series.append(pt)
 
     lead_time = None
     if first_warning is not None:
@@ -63,8 +188,10 @@ def backtest_replay(df: pd.DataFrame, ontology: Ontology, incident_time: str, lo
 
     narrative = {
         "what_this_proves": "Adam can raise an escalation warning before a known incident using only control-health vitals.",
-        "eri_warning_threshold": ontology.eri_warning,
+        "eri_warning_threshold": threshold,
         "lead_time_days": lead_time,
+        "resolution_hours": step_hours if refine or first_warning_only else 24,
+        "as_of_points_simulated": simulated,
     }
 
     return ReplayResult(
@@ -0,0 +1,225 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+from .config import Ontology, load_ontology
+
+AGGREGATIONS = ("worst", "mean", "p95")
+DEFAULT_CHUNK_ROWS = 500_000
+
+@dataclass(frozen=True)
+class Resampled:
+    """Metric values on a regular `step_hours` grid.
+
+    Bucket `t` holds rows in `(t - step, t]`, so data already on the grid keeps its
+    timestamps and a bucket never contains readings from after its label.
+    """
+    stamps: np.ndarray  # (N,) int64 ns since epoch, UTC, bucket end
+    metrics: List[str]
+    values: np.ndarray  # (N, M) NaN where missing beyond the fill tolerance
+    counts: np.ndarray  # (N,) raw rows per bucket; 0 for forward-filled buckets
+    late_rows: int = 0  # rows that arrived after their bucket was emitted and were dropped
+
+    def __len__(self) -> int:
+        return len(self.stamps)
+
+    def columns(self, metrics: Sequence[str]) -> np.ndarray:
+        """(N, len(metrics)) values in the given order, e.g. `graph.metrics` for `initial_pressures`."""
+        pos = {m: i for i, m in enumerate(self.metrics)}
+        return self.values[:, [pos[m] for m in metrics]]
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.values, columns=self.metrics)
+        df.insert(0, "timestamp", pd.to_datetime(self.stamps, utc=True))
+        return df
+
+    @staticmethod
+    def concat(parts: Sequence["Resampled"], metrics: List[str]) -> "Resampled":
+        if not parts:
+            return Resampled(np.empty(0, dtype=np.int64), metrics, np.empty((0, len(metrics))), np.empty(0, dtype=np.int64))
+        return Resampled(
+            stamps=np.concatenate([p.stamps for p in parts]),
+            metrics=metrics,
+            values=np.concatenate([p.values for p in parts]),
+            counts=np.concatenate([p.counts for p in parts]),
+            late_rows=sum(p.late_rows for p in parts),
+        )
+
+def metric_directions(ontology: Ontology) -> Dict[str, str]:
+    """Metric -> direction of the first control that reads it."""
+    out: Dict[str, str] = {}
+    for c in ontology.controls.values():
+        out.setdefault(c.metric, c.thresholds.direction)
+    return out
+
+def _aggregate(buckets: np.ndarray, values: np.ndarray, how: List[str], worse_high: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Aggregate rows sorted by bucket; returns (bucket ids, (G, M) values, (G,) row counts)."""
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)]
+    out = np.full((len(starts), values.shape[1]), np.nan)
+    group = np.cumsum(np.r_[False, buckets[1:] != buckets[:-1]])
+    if len(starts) <= np.iinfo(np.int16).max:
+        group = group.astype(np.int16)  # stable sort of int16 is a radix sort
+    for j, agg in enumerate(how):
+        col = values[:, j]
+        valid = ~np.isnan(col)
+        n = np.add.reduceat(valid, starts)
+        if agg == "mean":
+            out[:, j] = np.add.reduceat(np.where(valid, col, 0.0), starts) / np.where(n > 0, n, 1)
+        elif agg == "worst":
+            reduce = np.fmax if worse_high[j] else np.fmin
+            out[:, j] = reduce.reduceat(col, starts)
+        else:
+            # p95 on the bad side (p5 for lower-is-worse), linear interpolation like np.percentile.
+            q = 0.95 if worse_high[j] else 0.05
+            order = np.argsort(col)  # NaN last; the stable group sort keeps it last within each bucket
+            s = col[order[np.argsort(group[order], kind="stable")]]
+            pos = q * np.maximum(n - 1, 0)
+            lo = starts + np.floor(pos).astype(np.int64)
+            hi = np.minimum(lo + 1, starts + np.maximum(n - 1, 0))
+            out[:, j] = s[lo] + (s[hi] - s[lo]) * (pos - np.floor(pos))
+        out[n == 0, j] = np.nan
+    return buckets[starts], out, ends - starts
+
+class Resampler:
+    """Streams irregular rows into `step_hours` buckets in constant memory.
+
+    `push` aggregates each chunk and returns every bucket that can no longer
+    change; the newest, still-open bucket is carried to the next chunk. Rows
+    must be roughly time-ordered: rows for a bucket that was already emitted
+    are dropped and counted in `late_rows`. Empty buckets and missing metrics
+    are forward-filled from the last value seen within `max_gap_hours`.
+
+    `how` is one of `AGGREGATIONS` or a per-metric mapping: "worst" keeps the
+    worst reading for the control's direction, "p95" the 95th percentile on
+    the bad side.
+    """
+
+    def __init__(self, ontology: Ontology, step_hours: int | None = None, how: str | Dict[str, str] = "worst", max_gap_hours: float | None = None):
+        directions = metric_directions(ontology)
+        self.metrics = list(directions)
+        self.step_ns = int(step_hours or ontology.step_hours) * 3600 * 10**9
+        per = how if isinstance(how, dict) else {}
+        self.how = [per.get(m, "worst" if isinstance(how, dict) else how) for m in self.metrics]
+        for agg in self.how:
+            if agg not in AGGREGATIONS:
+                raise ValueError(f"Unknown aggregation: {agg}")
+        self.worse_high = np.array([directions[m] == "higher_is_worse" for m in self.metrics])
+        gap = 2 * int(step_hours or ontology.step_hours) if max_gap_hours is None else max_gap_hours
+        self.max_gap_steps = int(float(gap) * 3600 * 10**9 // self.step_ns)
+
+        self._lock = threading.Lock()
+        self._open: tuple[np.ndarray, np.ndarray] | None = None  # raw rows of the newest bucket
+        self._emitted: int | None = None  # last emitted bucket id
+        self._last = np.full(len(self.metrics), np.nan)  # last observed value per metric
+        self._last_at = np.full(len(self.metrics), np.iinfo(np.int64).min // 2)  # its bucket id
+
+    def _parse(self, chunk: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        missing = [m for m in self.metrics if m not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required metrics in data: {missing}")
+        stamps = pd.DatetimeIndex(pd.to_datetime(chunk["timestamp"], utc=True)).asi8
+        buckets = -((-stamps) // self.step_ns)  # ceil: (t - step, t] -> t
+        return buckets, chunk[self.metrics].to_numpy(dtype=float)
+
+    def _none(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(self.metrics))), np.empty(0, dtype=np.int64)
+
+    def push(self, chunk: pd.DataFrame) -> Resampled:
+        with self._lock:
+            return self._push(chunk)
+
+    def _push(self, chunk: pd.DataFrame) -> Resampled:
+        buckets, values = self._parse(chunk) if len(chunk) else self._none()[:2]
+        late = buckets <= self._emitted if self._emitted is not None else np.zeros(len(buckets), dtype=bool)
+        if late.any():
+            buckets, values = buckets[~late], values[~late]
+        if self._open is not None:
+            buckets = np.concatenate([self._open[0], buckets])
+            values = np.concatenate([self._open[1], values])
+        if not len(buckets):
+            self._open = None
+            return self._emit(*self._none(), int(late.sum()))
+
+        order = np.argsort(buckets, kind="stable")
+        buckets, values = buckets[order], values[order]
+        newest = buckets[-1]
+        tail = buckets == newest
+        self._open = (buckets[tail], values[tail])
+        ids, agg, counts = _aggregate(buckets[~tail], values[~tail], self.how, self.worse_high) if (~tail).any() else self._none()
+        return self._emit(ids, agg, counts, int(late.sum()))
+
+    def flush(self) -> Resampled:
+        """Emit the open bucket; call once the input is exhausted."""
+        with self._lock:
+            if self._open is None:
+                return self._emit(*self._none(), 0)
+            ids, agg, counts = _aggregate(*self._open, self.how, self.worse_high)
+            self._open = None
+            return self._emit(ids, agg, counts, 0)
+
+    def _emit(self, ids: np.ndarray, agg: np.ndarray, counts: np.ndarray, late: int) -> Resampled:
+        if not len(ids):
+            return Resampled(ids * self.step_ns, self.metrics, agg, counts, late)
+        # A contiguous grid from just after the previous emit, so empty buckets
+        # within the fill tolerance become explicit rows.
+        start = int(ids[0]) if self._emitted is None else max(self._emitted + 1, int(ids[0]) - self.max_gap_steps)
+        grid = np.arange(start, int(ids[-1]) + 1)
+        vals = np.full((len(grid), len(self.metrics)), np.nan)
+        cnt = np.zeros(len(grid), dtype=np.int64)
+        vals[ids - start] = agg
+        cnt[ids - start] = counts
+
+        # Forward-fill each metric from its last observed value, here or in an earlier emit.
+        seen = ~np.isnan(vals)
+        at = np.maximum.accumulate(np.where(seen, np.arange(len(grid))[:, None], -1), axis=0)
+        cols = np.arange(len(self.metrics))
+        filled = np.where(at >= 0, vals[np.maximum(at, 0), cols], self._last)
+        age = grid[:, None] - np.where(at >= 0, start + at, self._last_at)
+        vals = np.where(seen | (age > self.max_gap_steps), vals, filled)
+
+        if seen.any():
+            last = at[-1]
+            self._last = np.where(last >= 0, vals[np.maximum(last, 0), cols], self._last)
+            self._last_at = np.where(last >= 0, start + last, self._last_at)
+        self._emitted = int(grid[-1])
+        keep = (cnt > 0) | (~np.isnan(vals)).any(axis=1)
+        return Resampled(
+            stamps=grid[keep] * self.step_ns,
+            metrics=self.metrics,
+            values=vals[keep],
+            counts=cnt[keep],
+            late_rows=late,
+        )
+
+def resample(df: pd.DataFrame, ontology: Ontology, step_hours: int | None = None, how: str | Dict[str, str] = "worst", max_gap_hours: float | None = None) -> Resampled:
+    r = Resampler(ontology, step_hours=step_hours, how=how, max_gap_hours=max_gap_hours)
+    return Resampled.concat([r.push(df), r.flush()], r.metrics)
+
+def resample_csv(path: str, ontology: Ontology, step_hours: int | None = None, how: str | Dict[str, str] = "worst", max_gap_hours: float | None = None, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Resampled:
+    """Resample a CSV of any length, reading `chunk_rows` rows at a time."""
+    r = Resampler(ontology, step_hours=step_hours, how=how, max_gap_hours=max_gap_hours)
+    parts = [r.push(chunk) for chunk in pd.read_csv(path, usecols=["timestamp", *r.metrics], chunksize=chunk_rows)]
+    parts.append(r.flush())
+    return Resampled.concat(parts, r.metrics)
+
+def main():
+    ap = argparse.ArgumentParser(description="Resample irregular metric rows onto the ontology's step_hours grid.")
+    ap.add_argument("csv_path")
+    ap.add_argument("out_path")
+    ap.add_argument("--ontology", default="config/ontology.yaml")
+    ap.add_argument("--how", default="worst", choices=AGGREGATIONS)
+    ap.add_argument("--max-gap-hours", type=float, default=None)
+    ap.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = ap.parse_args()
+
+    res = resample_csv(args.csv_path, load_ontology(args.ontology), how=args.how, max_gap_hours=args.max_gap_hours, chunk_rows=args.chunk_rows)
+    res.to_frame().to_csv(args.out_path, index=False)
+    print(f"{len(res)} buckets written to {args.out_path} ({res.late_rows} late rows dropped)")
+
+if __name__ == "__main__":
+    main()
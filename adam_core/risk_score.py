@@ -0,0 +1,148 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Tuple
+import argparse
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+BAND_NAMES = ("Low", "Moderate", "High", "Critical")
+BAND_THRESHOLDS = np.array([40, 60, 80])  # a score at or above threshold i is in band i + 1
+TIMELINE_CACHE_SIZE = 8
+
+@dataclass(frozen=True)
+class RiskTimeline:
+    """Overall Company Risk Score (0-100) for every row of a history.
+
+    Each numeric signal is normalized once for the whole history: a column
+    whose values all lie in 0..1 is read as a probability and scaled to 0..100,
+    any other column is taken as already on the 0..100 scale. A row's score is
+    the mean of its available normalized signals, rounded and clipped.
+    """
+    stamps: np.ndarray  # (N,) datetime64[ns] UTC; NaT where the history has no timestamps
+    signals: List[str]
+    scaled: np.ndarray  # (M,) bool, per signal: treated as 0..1 and multiplied by 100
+    scores: np.ndarray  # (N,) int8, 0..100
+    bands: np.ndarray  # (N,) int8 index into BAND_NAMES
+    raw_mean: np.ndarray  # (N,) mean of the unnormalized signals; NaN where a row has none
+    counts: np.ndarray  # (N,) signals present per row
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def latest(self) -> Tuple[int, str, float]:
+        """(score, label, raw_mean) of the newest row, as `state.compute_company_risk_score` reports it."""
+        if not len(self):
+            return 0, "No Data", 0.0
+        if not self.counts[-1]:
+            return 0, "No Numeric Signals", 0.0
+        return int(self.scores[-1]), BAND_NAMES[self.bands[-1]], float(self.raw_mean[-1])
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "timestamp": pd.to_datetime(self.stamps, utc=True),
+            "score": self.scores,
+            "band": pd.Categorical.from_codes(self.bands, BAND_NAMES, ordered=True),
+        })
+
+    def rollup(self, freq: str = "D") -> pd.DataFrame:
+        """Per-period mean, max and last score, worst band and row count, e.g. `freq="W"` for weekly.
+
+        Periods are calendar days/weeks in UTC; periods without rows are left out.
+        """
+        if np.isnat(self.stamps).all():
+            raise ValueError("A rollup needs a 'timestamp' column.")
+        ok = ~np.isnat(self.stamps)
+        period = pd.DatetimeIndex(self.stamps[ok]).to_period(freq)
+        codes, uniques = pd.factorize(period, sort=True)
+        scores, bands = self.scores[ok].astype(np.int64), self.bands[ok]
+        n = np.bincount(codes, minlength=len(uniques))
+        last = np.zeros(len(uniques), dtype=np.int64)
+        np.maximum.at(last, codes, np.arange(len(codes)))
+        worst = np.zeros(len(uniques), dtype=np.int8)
+        np.maximum.at(worst, codes, bands)
+        peak = np.zeros(len(uniques), dtype=np.int64)
+        np.maximum.at(peak, codes, scores)
+        return pd.DataFrame({
+            "period_start": uniques.to_timestamp().tz_localize("UTC"),
+            "score_mean": np.bincount(codes, weights=scores, minlength=len(uniques)) / n,
+            "score_max": peak,
+            "score_last": scores[last],
+            "worst_band": pd.Categorical.from_codes(worst, BAND_NAMES, ordered=True),
+            "rows": n,
+        })
+
+def signal_columns(df: pd.DataFrame) -> List[str]:
+    """Numeric columns that are risk signals (everything numeric but timestamp-like columns)."""
+    if df is None or df.empty:
+        return []
+    return [c for c in df.select_dtypes(include="number").columns if str(c).lower() not in {"timestamp", "time", "date"}]
+
+def severity_bands(scores: np.ndarray) -> np.ndarray:
+    """int8 band codes for 0..100 scores: 0 Low, 1 Moderate, 2 High, 3 Critical."""
+    return np.searchsorted(BAND_THRESHOLDS, np.asarray(scores), side="right").astype(np.int8)
+
+def fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of the columns a timeline reads; equal frames share one cached timeline."""
+    cols = signal_columns(df) + (["timestamp"] if "timestamp" in df.columns else [])
+    h = hashlib.sha1(repr((cols, [str(df[c].dtype) for c in cols])).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df[cols], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def risk_timeline(df: pd.DataFrame) -> RiskTimeline:
+    """Score every row of `df` in one pass (see `RiskTimeline`)."""
+    signals = signal_columns(df)
+    n = 0 if df is None else len(df)
+    values = df[signals].to_numpy(dtype=np.float64, na_value=np.nan) if signals else np.empty((n, 0))
+    present = ~np.isnan(values)
+    lo = np.where(present, values, np.inf).min(axis=0, initial=np.inf)
+    hi = np.where(present, values, -np.inf).max(axis=0, initial=-np.inf)
+    scaled = present.any(axis=0) & (lo >= 0.0) & (hi <= 1.0)
+    counts = present.sum(axis=1)
+    filled = np.where(present, values, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        raw_mean = filled.sum(axis=1) / counts
+        norm_mean = (filled * np.where(scaled, 100.0, 1.0)).sum(axis=1) / counts
+    scores = np.clip(np.rint(np.nan_to_num(norm_mean)), 0, 100).astype(np.int8)
+    if df is not None and "timestamp" in df.columns:
+        stamps = pd.to_datetime(df["timestamp"], utc=True, errors="coerce").dt.tz_localize(None).to_numpy(dtype="datetime64[ns]")
+    else:
+        stamps = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+    return RiskTimeline(stamps, signals, scaled, scores, severity_bands(scores), raw_mean, counts)
+
+_TIMELINES: "OrderedDict[str, RiskTimeline]" = OrderedDict()
+_TIMELINES_LOCK = threading.Lock()
+
+def cached_risk_timeline(df: pd.DataFrame) -> RiskTimeline:
+    """`risk_timeline`, computed once per dataset fingerprint (hashing is far cheaper than a full rescore)."""
+    key = fingerprint(df)
+    with _TIMELINES_LOCK:
+        hit = _TIMELINES.get(key)
+        if hit is not None:
+            _TIMELINES.move_to_end(key)
+            return hit
+    timeline = risk_timeline(df)
+    with _TIMELINES_LOCK:
+        _TIMELINES[key] = timeline
+        while len(_TIMELINES) > TIMELINE_CACHE_SIZE:
+            _TIMELINES.popitem(last=False)
+    return timeline
+
+def main():
+    ap = argparse.ArgumentParser(description="Overall Company Risk Score over a history, rolled up per day or week.")
+    ap.add_argument("--csv", default="data/arcadian_cloud_systems_timeseries.csv")
+    ap.add_argument("--freq", default="W", help="Pandas period alias: D (daily), W (weekly), M (monthly).")
+    ap.add_argument("--out", default=None, help="Write the rollup to this CSV instead of printing it.")
+    args = ap.parse_args()
+
+    rollup = risk_timeline(pd.read_csv(args.csv)).rollup(args.freq)
+    if args.out:
+        rollup.to_csv(args.out, index=False)
+        print(f"wrote {len(rollup)} periods to {args.out}")
+    else:
+        print(rollup.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Dict, Any, List, Sequence, Tuple, Iterator
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pandas as pd
+import numpy as np
+import yaml
+
+from .config import Ontology, load_ontology
+from .graph import CompiledGraph, compile_graph
+from .simulator import initial_pressures, simulate_batch, delay_steps, step_noise, sla_index
+from .calibrate import EriCache, incidents_from_flags, sweep_thresholds
+
+@dataclass(frozen=True)
+class SearchContext:
+    """Everything a worker needs to score candidates; parsed and classified once."""
+    graph: CompiledGraph
+    impact_weights: Dict[str, float]
+    as_of: np.ndarray  # (N,) datetime64[ns]
+    p0: np.ndarray  # (N, C) starting pressures per as-of day
+    incident_active: np.ndarray  # (N,) bool
+    incidents: List[pd.Timestamp]
+    threshold: float
+    lookback_days: int
+    steps: int
+    step_hours: int
+    false_positive_penalty: float
+
+    @property
+    def outputs(self) -> List[int]:
+        """Scores only read the SLA control, so the simulator can prune everything not upstream of it."""
+        sla = sla_index(self.graph)
+        return [sla] if sla is not None else []
+
+    def fingerprint(self) -> str:
+        h = hashlib.sha1()
+        for arr in (self.as_of.astype(np.int64), self.p0, self.incident_active):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(json.dumps([
+            self.graph.controls, self.graph.edges, sorted(self.impact_weights.items()),
+            [str(i) for i in self.incidents], self.threshold, self.lookback_days,
+            self.steps, self.step_hours, self.false_positive_penalty,
+        ]).encode())
+        return h.hexdigest()[:16]
+
+@dataclass(frozen=True)
+class SearchResult:
+    baseline: Dict[str, Any]
+    best: Dict[str, Any]
+    evaluated: int
+    resumed: int
+    stopped_early: bool
+    top: List[Dict[str, Any]]
+
+def build_context(
+    df: pd.DataFrame,
+    ontology: Ontology,
+    incidents: Sequence[str] | None = None,
+    lookback_days: int = 30,
+    horizon_days: int | None = None,
+    threshold: float | None = None,
+    false_positive_penalty: float = 30.0,
+) -> SearchContext:
+    df = df.copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    df = df.sort_values("timestamp", kind="mergesort")
+    if df.empty:
+        raise ValueError("No data to search against.")
+
+    onsets = [pd.to_datetime(i, utc=True) for i in incidents] if incidents else incidents_from_flags(df)
+    if not onsets:
+        raise ValueError("No labeled incidents to fit against.")
+
+    graph = compile_graph(ontology)
+    days = pd.date_range(df["timestamp"].iloc[0].floor("D"), df["timestamp"].iloc[-1].floor("D"), freq="1D", tz="UTC")
+    stamps = pd.DatetimeIndex(df["timestamp"]).asi8
+    idx = np.searchsorted(stamps, days.asi8, side="right") - 1
+    idx = idx[idx >= 0]
+
+    flags = df["incident_flag"].fillna(0).to_numpy(dtype=float) > 0 if "incident_flag" in df.columns else np.zeros(len(df), dtype=bool)
+    step_hours = int(ontology.step_hours)
+    horizon = int(horizon_days or ontology.forecast_horizon_days)
+
+    return SearchContext(
+        graph=graph,
+        impact_weights=dict(ontology.impact_weights),
+        as_of=stamps[idx].astype("datetime64[ns]"),
+        p0=initial_pressures(df[graph.metrics].to_numpy(dtype=float)[idx], graph, ontology),
+        incident_active=flags[idx],
+        incidents=onsets,
+        threshold=float(ontology.eri_warning if threshold is None else threshold),
+        lookback_days=int(lookback_days),
+        steps=int((horizon * 24) / step_hours),
+        step_hours=step_hours,
+        false_positive_penalty=float(false_positive_penalty),
+    )
+
+def grid_candidates(graph: CompiledGraph, spec: Sequence[Dict[str, Any]], max_candidates: int | None = None, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """(N, E) delay-day and amplification matrices for the cartesian grid in `spec`.
+
+    Each spec entry names an edge (`src`, `dst`) and lists candidate `delay_days`
+    and/or `amplification` values; unlisted edges and fields keep the ontology's
+    value; delays must be whole days. Candidates are shuffled (so early stopping is not biased by grid order)
+    and, if the grid is larger than `max_candidates`, sampled without replacement.
+    The ontology's own parameters are always candidate 0.
+    """
+    axes: List[List[Tuple[int, str, float]]] = []
+    for entry in spec:
+        key = (entry["src"], entry["dst"])
+        if key not in graph.edges:
+            raise ValueError(f"Unknown propagation edge: {key[0]} -> {key[1]}")
+        e = graph.edges.index(key)
+        for field in ("delay_days", "amplification"):
+            if field in entry:
+                values = list(dict.fromkeys(float(v) for v in entry[field]))  # repeated values would repeat candidates
+                if field == "delay_days" and any(not v.is_integer() for v in values):
+                    raise ValueError(f"delay_days must be whole days: {key[0]} -> {key[1]} {entry[field]}")
+                axes.append([(e, field, v) for v in values])
+
+    sizes = [len(a) for a in axes]
+    total = int(np.prod(sizes)) if axes else 1
+    rng = np.random.default_rng(seed)
+    n = total if max_candidates is None else min(total, int(max_candidates))
+    picks = rng.choice(total, size=n, replace=False) if total else np.zeros(0, dtype=np.int64)
+
+    delays = np.tile(graph.delay_days.astype(float), (n + 1, 1))
+    amps = np.tile(graph.amplification, (n + 1, 1))
+    for row, flat in enumerate(picks, start=1):
+        choice = np.unravel_index(int(flat), sizes) if axes else ()
+        for axis, i in zip(axes, choice):
+            e, field, v = axis[i]
+            (delays if field == "delay_days" else amps)[row, e] = v
+    return delays.astype(np.int64), amps
+
+def evaluate_candidates(ctx: SearchContext, delays: np.ndarray, amps: np.ndarray) -> List[Dict[str, Any]]:
+    """Score B candidates as one (B * days)-wide simulation."""
+    b = len(delays)
+    n, c = ctx.p0.shape
+    batch = simulate_batch(
+        np.tile(ctx.p0, (b, 1)),
+        ctx.graph,
+        ctx.steps,
+        ctx.step_hours,
+        amplification=np.repeat(amps, n, axis=0),
+        delays=np.repeat(delay_steps(delays, ctx.step_hours), n, axis=0),
+        noise=step_noise(ctx.steps, c),
+        outputs=ctx.outputs,
+    )
+    ttf = batch.time_to_failure_days(sla_index(ctx.graph)).reshape(b, n)
+    probs = batch.first_probabilities().reshape(b, n, c)
+
+    out: List[Dict[str, Any]] = []
+    for i in range(b):
+        cache = EriCache(as_of=ctx.as_of, controls=ctx.graph.controls, probabilities=probs[i], time_to_failure_days=ttf[i], incident_active=ctx.incident_active)
+        point = sweep_thresholds(cache, ctx.incidents, [ctx.threshold], ctx.impact_weights, lookback_days=ctx.lookback_days)[0]
+        credited = (point["mean_lead_time_days"] or 0.0) * point["detected"] / max(1, point["incidents"])
+        out.append({
+            "delay_days": {f"{u}->{v}": int(d) for (u, v), d in zip(ctx.graph.edges, delays[i])},
+            "amplification": {f"{u}->{v}": float(a) for (u, v), a in zip(ctx.graph.edges, amps[i])},
+            "score": float(credited - ctx.false_positive_penalty * point["false_positive_rate"]),
+            "detected": point["detected"],
+            "incidents": point["incidents"],
+            "mean_lead_time_days": point["mean_lead_time_days"],
+            "false_positive_rate": point["false_positive_rate"],
+        })
+    return out
+
+def candidate_key(delays: np.ndarray, amps: np.ndarray) -> str:
+    payload = json.dumps([[int(d) for d in delays], [round(float(a), 9) for a in amps]])
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+_WORKER_CTX: SearchContext | None = None
+
+def _init_worker(ctx: SearchContext) -> None:
+    global _WORKER_CTX
+    _WORKER_CTX = ctx
+
+def _evaluate_in_worker(delays: np.ndarray, amps: np.ndarray) -> List[Dict[str, Any]]:
+    return evaluate_candidates(_WORKER_CTX, delays, amps)
+
+def _read_log(path: str | None, fingerprint: str) -> Dict[str, Dict[str, Any]]:
+    done: Dict[str, Dict[str, Any]] = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            if rec.get("context") == fingerprint:
+                done[rec["key"]] = rec
+    return done
+
+def _chunks(todo: List[int], size: int) -> Iterator[List[int]]:
+    for i in range(0, len(todo), size):
+        yield todo[i:i + size]
+
+def search(
+    ctx: SearchContext,
+    delays: np.ndarray,
+    amps: np.ndarray,
+    log_path: str | None = None,
+    workers: int | None = None,
+    batch_size: int = 32,
+    patience: int | None = None,
+    min_delta: float = 1e-6,
+    top_n: int = 10,
+) -> SearchResult:
+    """Evaluate candidate edge parameters, batched per chunk and spread over a process pool.
+
+    Results are appended to `log_path` (JSONL) as each chunk finishes; rerunning
+    with the same log and context skips candidates already scored. With
+    `patience`, the search stops once that many consecutive candidates fail to
+    improve the best score by `min_delta`.
+    """
+    fp = ctx.fingerprint()
+    done = _read_log(log_path, fp)
+    keys = [candidate_key(d, a) for d, a in zip(delays, amps)]
+    results: Dict[str, Dict[str, Any]] = {k: done[k] for k in keys if k in done}
+    resumed = len(results)
+
+    todo: List[int] = []
+    seen = set(results)
+    for i, k in enumerate(keys):
+        if k not in seen:
+            seen.add(k)
+            todo.append(i)
+
+    best = max((r["score"] for r in results.values()), default=-np.inf)
+    since_best = 0
+    stopped = False
+    log = open(log_path, "a", encoding="utf-8") if log_path else None
+
+    def record(idx: List[int], scored: List[Dict[str, Any]]) -> bool:
+        nonlocal best, since_best
+        for i, rec in zip(idx, scored):
+            rec = {"key": keys[i], "context": fp, **rec}
+            results[keys[i]] = rec
+            if log:
+                log.write(json.dumps(rec) + "\n")
+            if rec["score"] > best + min_delta:
+                best, since_best = rec["score"], 0
+            else:
+                since_best += 1
+        if log:
+            log.flush()
+        return patience is not None and since_best >= patience
+
+    chunks = list(_chunks(todo, max(1, int(batch_size))))
+    n_workers = (os.cpu_count() or 1) if workers is None else int(workers)
+    try:
+        if n_workers <= 1 or len(chunks) <= 1:
+            for idx in chunks:
+                if record(idx, evaluate_candidates(ctx, delays[idx], amps[idx])):
+                    stopped = True
+                    break
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(ctx,)) as pool:
+                pending = {}
+                queue = iter(chunks)
+                for idx in itertools.islice(queue, 2 * n_workers):
+                    pending[pool.submit(_evaluate_in_worker, delays[idx], amps[idx])] = idx
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        idx = pending.pop(fut)
+                        if record(idx, fut.result()):
+                            stopped = True
+                    if stopped:
+                        for fut in pending:
+                            fut.cancel()
+                        break
+                    for idx in itertools.islice(queue, len(finished)):
+                        pending[pool.submit(_evaluate_in_worker, delays[idx], amps[idx])] = idx
+    finally:
+        if log:
+            log.close()
+
+    ranked = sorted(results.values(), key=lambda r: r["score"], reverse=True)
+    baseline = results.get(keys[0]) if keys else None
+    return SearchResult(
+        baseline=baseline or {},
+        best=ranked[0] if ranked else {},
+        evaluated=len(results) - resumed,
+        resumed=resumed,
+        stopped_early=stopped,
+        top=ranked[:top_n],
+    )
+
+def to_ontology_fragment(graph: CompiledGraph, rec: Dict[str, Any]) -> str:
+    """`propagation_graph` YAML for a scored candidate."""
+    edges = [
+        {"src": u, "dst": v, "delay_days": rec["delay_days"][f"{u}->{v}"], "amplification": rec["amplification"][f"{u}->{v}"]}
+        for u, v in graph.edges
+    ]
+    return yaml.safe_dump({"propagation_graph": edges}, sort_keys=False)
+
+def main():
+    ap = argparse.ArgumentParser(description="Fit propagation_graph delay_days/amplification to historical incidents.")
+    ap.add_argument("--csv", default="data/arcadian_cloud_systems_timeseries.csv")
+    ap.add_argument("--ontology", default="config/ontology.yaml")
+    ap.add_argument("--grid", required=True, help="YAML file with an 'edges' list of {src, dst, delay_days: [...], amplification: [...]}.")
+    ap.add_argument("--incident", action="append", default=None, help="ISO8601 incident onset; repeatable. Defaults to incident_flag onsets.")
+    ap.add_argument("--lookback-days", type=int, default=30)
+    ap.add_argument("--horizon-days", type=int, default=None)
+    ap.add_argument("--fp-penalty", type=float, default=30.0)
+    ap.add_argument("--max-candidates", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--patience", type=int, default=None)
+    ap.add_argument("--log", default=None, help="JSONL checkpoint; reruns resume from it.")
+    args = ap.parse_args()
+
+    ont = load_ontology(args.ontology)
+    with open(args.grid, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f).get("edges", [])
+
+    ctx = build_context(pd.read_csv(args.csv), ont, incidents=args.incident, lookback_days=args.lookback_days, horizon_days=args.horizon_days, false_positive_penalty=args.fp_penalty)
+    delays, amps = grid_candidates(ctx.graph, spec, max_candidates=args.max_candidates, seed=args.seed)
+    res = search(ctx, delays, amps, log_path=args.log, workers=args.workers, batch_size=args.batch_size, patience=args.patience)
+
+    print(f"Candidates: {len(delays)} | evaluated: {res.evaluated} | resumed: {res.resumed} | stopped early: {res.stopped_early}")
+    print("Baseline score:", res.baseline.get("score"))
+    print("Best score:", res.best.get("score"), "| detected:", res.best.get("detected"), "| lead:", res.best.get("mean_lead_time_days"), "| fpr:", res.best.get("false_positive_rate"))
+    if res.best:
+        print(to_ontology_fragment(ctx.graph, res.best))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Tuple
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get("ADAM_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "adam-cache")
+DEFAULT_MAX_BYTES = int(os.environ.get("ADAM_CACHE_MAX_BYTES", 2 << 30))
+
+class SharedArrayCache:
+    """Arrays derived from a source file, built once and memory-mapped by every process.
+
+    An entry is a directory of `.npy` files plus `meta.json`, named after the
+    source's path, mtime and size. A change to the file therefore gives it a
+    new entry. The first process to ask builds the entry under an exclusive
+    lock; all others map the same files read-only, so the OS page cache holds
+    one copy however many workers use it.
+
+    A process that maps an entry holds a shared `flock` on its `ref` file until
+    it releases the entry, exits, or moves on to a newer version of the source.
+    Eviction only deletes entries it can lock exclusively, i.e. that no process
+    holds. It removes them when their source changed or disappeared, or least
+    recently used first while the cache is over `max_bytes`.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self._held: Dict[Tuple[str, str], Tuple[str, int, Dict[str, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stamp(source: str) -> Tuple[str, int, int]:
+        path = os.path.abspath(source)
+        st = os.stat(path)
+        return path, st.st_mtime_ns, st.st_size
+
+    def _entry(self, name: str, stamp: Tuple[str, int, int]) -> str:
+        digest = hashlib.sha1(repr(stamp).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, f"{name}-{digest}")
+
+    def get(self, name: str, source: str, build: Callable[[], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        """Read-only arrays for the current version of `source`, calling `build` only if no process has yet."""
+        stamp = self._stamp(source)
+        entry = self._entry(name, stamp)
+        with self._lock:
+            held = self._held.get((name, stamp[0]))
+            if held is not None and held[0] == entry:
+                return held[2]
+            if held is not None:
+                self._release(name, stamp[0])
+            os.makedirs(self.root, exist_ok=True)
+            built = False
+            with self._locked(entry) as lock:
+                if not os.path.isdir(entry):
+                    self._write(entry, name, stamp, build())
+                    built = True
+                ref = os.open(os.path.join(entry, "ref"), os.O_RDONLY)
+                fcntl.flock(ref, fcntl.LOCK_SH)
+            os.utime(os.path.join(entry, "ref"))
+            with open(os.path.join(entry, "meta.json"), "r", encoding="utf-8") as f:
+                names = json.load(f)["arrays"]
+            arrays = {k: np.load(os.path.join(entry, f"{i}.npy"), mmap_mode="r") for i, k in enumerate(names)}
+            self._held[(name, stamp[0])] = (entry, ref, arrays)
+        if built or held is not None:
+            self.evict()
+        return arrays
+
+    @staticmethod
+    def _locked(entry: str, blocking: bool = True):
+        """The entry's build lock, open and exclusively locked; None if `blocking` is False and it is taken.
+
+        Eviction unlinks lock files, so after locking, check the file is still the one on disk.
+        """
+        while True:
+            lock = open(f"{entry}.lock", "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                return None
+            try:
+                if os.fstat(lock.fileno()).st_ino == os.stat(f"{entry}.lock").st_ino:
+                    return lock
+            except FileNotFoundError:
+                pass
+            lock.close()
+
+    def _write(self, entry: str, name: str, stamp: Tuple[str, int, int], arrays: Dict[str, np.ndarray]) -> None:
+        tmp = tempfile.mkdtemp(prefix=".build-", dir=self.root)
+        try:
+            size = 0
+            for i, a in enumerate(arrays.values()):
+                a = np.ascontiguousarray(a)
+                np.save(os.path.join(tmp, f"{i}.npy"), a)
+                size += a.nbytes
+            meta = {"name": name, "source": stamp[0], "mtime_ns": stamp[1], "size": stamp[2], "bytes": size, "arrays": list(arrays)}
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            open(os.path.join(tmp, "ref"), "w").close()
+            os.rename(tmp, entry)  # the entry appears complete or not at all
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def release(self, name: str, source: str) -> None:
+        """Drop this process's hold on `source`'s entry; it becomes evictable once no process holds it."""
+        with self._lock:
+            self._release(name, os.path.abspath(source))
+
+    def _release(self, name: str, path: str) -> None:
+        held = self._held.pop((name, path), None)
+        if held is not None:
+            os.close(held[1])  # the mapped arrays stay valid until garbage collected
+
+    def entries(self) -> List[Dict]:
+        out = []
+        if not os.path.isdir(self.root):
+            return out
+        for d in os.listdir(self.root):
+            path = os.path.join(self.root, d)
+            if d.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                meta["entry"] = path
+                meta["used_at"] = os.stat(os.path.join(path, "ref")).st_mtime
+            except (OSError, ValueError):
+                continue
+            out.append(meta)
+        return out
+
+    def evict(self) -> int:
+        """Delete unheld entries that are stale or beyond `max_bytes`; returns how many were removed."""
+        entries = sorted(self.entries(), key=lambda m: m["used_at"])
+        total = sum(m["bytes"] for m in entries)
+        removed = 0
+        for meta in entries:
+            try:
+                st = os.stat(meta["source"])
+                stale = (st.st_mtime_ns, st.st_size) != (meta["mtime_ns"], meta["size"])
+            except OSError:
+                stale = True
+            if not stale and total <= self.max_bytes:
+                continue
+            if self._remove_if_unheld(meta["entry"]):
+                total -= meta["bytes"]
+                removed += 1
+        return removed
+
+    def _remove_if_unheld(self, entry: str) -> bool:
+        lock = self._locked(entry, blocking=False)
+        if lock is None:
+            return False  # being built or mapped right now
+        with lock:
+            try:
+                ref = os.open(os.path.join(entry, "ref"), os.O_RDONLY)
+            except FileNotFoundError:
+                return False
+            try:
+                fcntl.flock(ref, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False  # some process holds it
+            finally:
+                os.close(ref)
+            # Rename first so no reader can open a half-deleted entry.
+            doomed = os.path.join(self.root, f".evict-{os.getpid()}-{time.monotonic_ns()}")
+            os.rename(entry, doomed)
+            shutil.rmtree(doomed, ignore_errors=True)
+            os.remove(f"{entry}.lock")  # while still locked, so waiters notice and retry
+        return True
@@ -1,12 +1,43 @@
 from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Dict, List, Any, Tuple
-import pandas as pd
+from functools import cached_property
+from datetime import timedelta
+from typing import TYPE_CHECKING, Dict, List, Any, Sequence
+import os
+import threading
 import numpy as np
 
 from .config import Ontology
-from .states import classify_state, severity_to_pressure, state_from_pressure
-from .graph import build_graph
+from .states import classify_severity, severity_to_pressure_array, state_codes_from_pressure, STATE_ORDER
+from .graph import CompiledGraph, compile_graph
+from . import kernels
+
+if TYPE_CHECKING:
+    import pandas as pd  # imported where needed, so simulation alone does not load pandas
+
+DECAY_PER_STEP = 0.03
+INCOMING_GAIN = 0.25
+NOISE_SCALE = 0.01
+NOISE_SEED = 42
+PROBABILITY_WINDOW = 12
+SLA_CONTROL = "sla_compliance"
+SHARD_MIN_CONTROLS = 512  # below this, one loop beats the thread hand-off
+SPARSE_MAX_ACTIVE = 0.1  # "auto" mode runs event-driven while at most this share of pressures is active
+
+RUN_CACHE_SIZE = 16  # recent runs kept by `simulate_cached`
+RUN_CACHE_MAX_VALUES = 1 << 22  # larger histories are not cached
+
+_POOL: ThreadPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+def _pool() -> ThreadPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="adam-shard")
+        return _POOL
 
 @dataclass(frozen=True)
 class ForecastPoint:
@@ -22,6 +53,65 @@ class ForecastResult:
     horizon_days: int
     series: List[ForecastPoint]
     summary: Dict[str, Any]
+    attribution: Dict[str, Any] | None = None
+    # The (steps, C) "pressures", "probabilities" and int8 "states" behind `series`, in `graph.controls` order.
+    arrays: Dict[str, np.ndarray] | None = None
+
+@dataclass(frozen=True)
+class SimulationBatch:
+    """K independent runs over the same compiled graph and noise stream.
+
+    Only the pressure history is stored; probabilities and state codes are
+    derived on first access so callers that need just ERI inputs stay cheap.
+    """
+    history: np.ndarray  # (steps + 1, K, C); row 0 is the starting pressure
+    step_hours: int
+
+    @property
+    def steps(self) -> int:
+        return self.history.shape[0] - 1
+
+    def prefix(self, steps: int) -> "SimulationBatch":
+        """The first `steps` steps, identical to a run of that length (same start, same noise)."""
+        if steps == self.steps:
+            return self
+        return SimulationBatch(history=self.history[: int(steps) + 1], step_hours=self.step_hours)
+
+    @property
+    def pressures(self) -> np.ndarray:
+        """(K, steps, C) pressure after each step."""
+        return self.history[1:].transpose(1, 0, 2)
+
+    @cached_property
+    def probabilities(self) -> np.ndarray:
+        """(K, steps, C) failure probabilities."""
+        if kernels.JIT:
+            return kernels.probabilities(self.history, PROBABILITY_WINDOW).transpose(1, 0, 2)
+        return _estimate_probabilities(self.history).transpose(1, 0, 2)
+
+    @cached_property
+    def states(self) -> np.ndarray:
+        """(K, steps, C) int8 state codes."""
+        return state_codes_from_pressure(self.pressures)
+
+    def first_probabilities(self) -> np.ndarray:
+        """(K, C) probabilities after the first step, the ones ERI uses."""
+        if self.steps == 0:
+            return np.zeros(self.history.shape[1:])
+        return np.clip(self.history[1], 0.0, 1.0)  # a two-value window is just the current pressure
+
+    def first_sla_step(self, sla_index: int | None) -> np.ndarray:
+        """(K,) 0-based step of the first degraded/failed SLA state, -1 if none."""
+        k = self.history.shape[1]
+        if sla_index is None or self.steps == 0:
+            return np.full(k, -1, dtype=np.int64)
+        bad = state_codes_from_pressure(self.history[1:, :, sla_index]) >= 2  # (steps, K)
+        return np.where(bad.any(axis=0), bad.argmax(axis=0), -1)
+
+    def time_to_failure_days(self, sla_index: int | None) -> np.ndarray:
+        """(K,) days from the start to the first SLA degrade, NaN if none."""
+        first = self.first_sla_step(sla_index)
+        return np.where(first >= 0, (first + 1) * self.step_hours / 24.0, np.nan)
 
 def _estimate_probability(pressure_series: List[float]) -> float:
     if not pressure_series:
@@ -34,10 +124,371 @@ def _estimate_probability(pressure_series: List[float]) -> float:
     p = 0.65 * cur + 0.35 * max(0.0, trend) * 1.2
     return float(min(1.0, max(0.0, p)))
 
-def forecast(df: pd.DataFrame, ontology: Ontology, start_time: str | None = None, horizon_days: int | None = None) -> ForecastResult:
+def _estimate_probabilities(history: np.ndarray) -> np.ndarray:
+    """Vectorized `_estimate_probability` over a (steps + 1, K, C) pressure history.
+
+    Row s of the result uses the trailing window of `PROBABILITY_WINDOW` values
+    ending at history[s + 1], exactly like the per-step estimator.
+    """
+    total = history.shape[0]
+    steps = total - 1
+    if steps <= 0:
+        return np.zeros((0,) + history.shape[1:])
+
+    cur = history[1:]
+    prev_sum = np.zeros_like(cur)
+    count = np.zeros(steps)
+    s = np.arange(steps)
+    for lag in range(1, PROBABILITY_WINDOW):
+        idx = s + 1 - lag
+        live = idx >= 0
+        prev_sum += np.where(live[:, None, None], history[np.maximum(idx, 0)], 0.0)
+        count += live
+    prev_mean = prev_sum / count[:, None, None]
+    trend = np.maximum(0.0, cur - prev_mean)
+    p = np.where((count + 1 < 3)[:, None, None], cur, 0.65 * cur + 0.35 * trend * 1.2)
+    return np.clip(p, 0.0, 1.0)
+
+def delay_steps(delay_days: np.ndarray, step_hours: int) -> np.ndarray:
+    """Edge delays in simulation steps; every edge delays by at least one step."""
+    return np.maximum(1, (np.asarray(delay_days, dtype=np.int64) * 24) // int(step_hours))
+
+def step_noise(steps: int, n_controls: int) -> np.ndarray:
+    """The (steps, C) noise stream every run shares (same draws as a per-control loop)."""
+    rng = np.random.default_rng(NOISE_SEED)
+    return rng.normal(0.0, NOISE_SCALE, size=(steps, n_controls))
+
+def initial_pressures(rows: np.ndarray, graph: CompiledGraph, ontology: Ontology) -> np.ndarray:
+    """Classify an (N, C) matrix of metric values (columns in `graph.metrics` order) into pressures."""
+    values = np.asarray(rows, dtype=float).reshape(-1, len(graph.controls))
+    out = np.empty(values.shape)
+    for j, cid in enumerate(graph.controls):
+        th = ontology.controls[cid].thresholds
+        out[:, j] = severity_to_pressure_array(classify_severity(th.direction, th.states, values[:, j]))
+    return out
+
+def simulate_batch(
+    p0: np.ndarray,
+    graph: CompiledGraph,
+    steps: int,
+    step_hours: int,
+    amplification: np.ndarray | None = None,
+    delays: np.ndarray | None = None,
+    noise: np.ndarray | None = None,
+    cap: np.ndarray | None = None,
+    outputs: Sequence[int] | None = None,
+    workers: int | None = None,
+    mode: str = "auto",
+    eps: float = 0.0,
+) -> SimulationBatch:
+    """Propagate K starting pressure vectors through the graph in one pass.
+
+    `amplification` and `delays` (in steps) may be (E,) or per-run (K, E);
+    `cap` is an optional (C,) or (K, C) ceiling on each control's pressure.
+    Arrivals are read straight from the pressure history, which is equivalent to
+    per-edge FIFO buffers of length `delay`.
+
+    `outputs` (control indices) prunes, via `graph.paths`, every control that
+    cannot reach one of them: those columns get the first step only (all ERI
+    reads) and are NaN afterwards. Kept columns are bit-identical to a full run.
+
+    Weakly connected components never exchange pressure, so graphs with more
+    than one are split into up to `workers` shards that run on a shared thread
+    pool (NumPy releases the GIL in the heavy kernels) and write disjoint
+    columns of one history. By default this kicks in at `SHARD_MIN_CONTROLS`
+    controls with one shard per core; `workers=1` keeps a single loop.
+
+    `mode` picks the propagation engine: "dense" touches every edge each step,
+    "sparse" queues arrivals only from pressures above `eps` (see
+    `_propagate_sparse`), and "auto" switches per step on the active share,
+    with `SPARSE_MAX_ACTIVE` as the threshold. With `eps=0` only exact zeros
+    are skipped and every mode gives the same history bit for bit. A larger
+    `eps` trades accuracy for speed.
+
+    When Numba is installed (see `kernels.JIT`), "dense" and exact "auto" runs
+    use the compiled step loop instead, with the same history bit for bit.
+    """
+    if mode not in ("auto", "dense", "sparse"):
+        raise ValueError(f"Unknown simulation mode: {mode}")
+    p0 = np.atleast_2d(np.asarray(p0, dtype=float))
+    k, c = p0.shape
+    amp = graph.amplification if amplification is None else np.asarray(amplification, dtype=float)
+    lag = delay_steps(graph.delay_days, step_hours) if delays is None else np.asarray(delays, dtype=np.int64)
+    if noise is None:
+        noise = step_noise(steps, c)
+
+    if outputs is not None and steps > 1:
+        keep = np.flatnonzero(graph.paths.upstream_mask(list(outputs))) if len(outputs) else np.zeros(0, dtype=np.intp)
+        if len(keep) < c:
+            return _simulate_pruned(p0, graph, steps, step_hours, amp, lag, noise, cap, keep, workers, mode, eps)
+
+    if workers is None:
+        workers = (os.cpu_count() or 1) if c >= SHARD_MIN_CONTROLS else 1
+    if workers > 1 and steps and len(graph.components) > 1:
+        return _simulate_sharded(p0, graph, steps, step_hours, amp, lag, noise, cap, graph.shards(workers), mode, eps)
+
+    hi = 1.0 if cap is None else np.minimum(1.0, np.broadcast_to(np.asarray(cap, dtype=float), (k, c)))
+
+    history = np.empty((steps + 1, k, c))
+    history[0] = p0 if cap is None else np.minimum(p0, hi)
+    if kernels.JIT and (mode == "dense" or (mode == "auto" and eps == 0.0)):
+        e = len(graph.src)
+        kernels.propagate(
+            history, graph.src, graph.dst,
+            np.broadcast_to(amp, (k, e)), np.broadcast_to(lag, (k, e)), noise,
+            np.broadcast_to(hi, (k, c)), 1.0 - DECAY_PER_STEP, INCOMING_GAIN,
+        )
+        return SimulationBatch(history=history, step_hours=int(step_hours))
+    if mode != "dense" and len(graph.src):
+        _propagate_sparse(history, graph, amp, lag, noise, hi, mode, eps)
+        return SimulationBatch(history=history, step_hours=int(step_hours))
+
+    runs = np.arange(k)[:, None]
+    src = graph.src
+    # Flat (run, dst) bins; bincount sums each bin in edge order, like the per-edge loop.
+    bins = (runs * c + graph.dst).ravel()
+    for s in range(steps):
+        incoming = 0.0
+        if len(src):
+            at = s - lag
+            arriving = np.where(at >= 0, history[np.maximum(at, 0), runs, src] * amp, 0.0)
+            incoming = np.bincount(bins, weights=arriving.ravel(), minlength=k * c).reshape(k, c)
+        new_p = history[s] * (1.0 - DECAY_PER_STEP) + incoming * INCOMING_GAIN
+        history[s + 1] = np.clip(new_p + noise[s], 0.0, hi)
+
+    return SimulationBatch(history=history, step_hours=int(step_hours))
+
+def _propagate_sparse(history, graph, amp, lag, noise, hi, mode, eps) -> None:
+    """Fill `history[1:]` in place, queueing edge arrivals only from active pressures.
+
+    Arrivals wait in a timing wheel keyed by arrival step. While sparse, each
+    step queues the out-edges (CSR by source) of (run, control) pressures
+    above `eps`, then sums its bucket in (run, edge) order, which is the
+    dense engine's summation order. In "auto" mode a step runs dense whenever
+    the active share exceeds `SPARSE_MAX_ACTIVE`, with 2x hysteresis on the
+    way back. Re-entering sparse mode re-queues the arrivals still owed from
+    the last `max(lag)` steps.
+    """
+    steps = len(history) - 1
+    _, k, c = history.shape
+    e = len(graph.src)
+    amp_k = np.broadcast_to(amp, (k, e))
+    lag_k = np.broadcast_to(lag, (k, e))
+    max_lag = int(lag_k.max())
+    by_src = np.argsort(graph.src, kind="stable")
+    ptr = np.searchsorted(graph.src[by_src], np.arange(c + 1))
+    runs = np.arange(k)[:, None]
+    dense_bins = (runs * c + graph.dst).ravel()
+    wheel: Dict[int, List[tuple[np.ndarray, np.ndarray]]] = {}
+
+    def queue(t: int, first: int) -> None:
+        r, j = np.nonzero(history[t] > eps)
+        deg = ptr[j + 1] - ptr[j]
+        if not deg.sum():
+            return
+        r = np.repeat(r, deg)
+        edge = by_src[np.repeat(ptr[j] - np.cumsum(deg) + deg, deg) + np.arange(deg.sum())]
+        at = t + lag_k[r, edge]
+        ok = (at >= first) & (at < steps)
+        r, edge, at = r[ok], edge[ok], at[ok]
+        key = r * e + edge
+        val = history[t, r, graph.src[edge]] * amp_k[r, edge]
+        for a in np.unique(at):
+            m = at == a
+            wheel.setdefault(int(a), []).append((key[m], val[m]))
+
+    sparse = False
+    for s in range(steps):
+        if mode == "sparse":
+            want = True
+        else:
+            share = np.count_nonzero(history[s] > eps) / (k * c)
+            want = share <= SPARSE_MAX_ACTIVE * (2.0 if sparse else 1.0)
+        if want and not sparse:
+            wheel.clear()
+            for t in range(max(0, s - max_lag), s):
+                queue(t, s)
+        sparse = want
+
+        if sparse:
+            queue(s, s)
+            parts = wheel.pop(s, None)
+            incoming = 0.0
+            if parts:
+                key = np.concatenate([p[0] for p in parts])
+                val = np.concatenate([p[1] for p in parts])
+                order = np.argsort(key)
+                key, val = key[order], val[order]
+                bins = (key // e) * c + graph.dst[key % e]
+                incoming = np.bincount(bins, weights=val, minlength=k * c).reshape(k, c)
+        else:
+            at = s - lag
+            arriving = np.where(at >= 0, history[np.maximum(at, 0), runs, graph.src] * amp, 0.0)
+            incoming = np.bincount(dense_bins, weights=arriving.ravel(), minlength=k * c).reshape(k, c)
+        new_p = history[s] * (1.0 - DECAY_PER_STEP) + incoming * INCOMING_GAIN
+        history[s + 1] = np.clip(new_p + noise[s], 0.0, hi)
+
+def _simulate_sharded(p0, graph, steps, step_hours, amp, lag, noise, cap, shards, mode="auto", eps=0.0) -> SimulationBatch:
+    """Run each shard's columns independently and merge them into one history."""
+    k, c = p0.shape
+    history = np.empty((steps + 1, k, c))
+    full_cap = None if cap is None else np.broadcast_to(np.asarray(cap, dtype=float), (k, c))
+
+    def run(shard) -> None:
+        keep, sub, mask = shard
+        part = simulate_batch(
+            p0[:, keep], sub, steps, step_hours,
+            amplification=amp[..., mask],
+            delays=lag[..., mask],
+            noise=noise[:, keep],
+            cap=None if full_cap is None else full_cap[:, keep],
+            workers=1,
+            mode=mode,
+            eps=eps,
+        )
+        history[:, :, keep] = part.history
+
+    for fut in [_pool().submit(run, shard) for shard in shards]:
+        fut.result()
+    return SimulationBatch(history=history, step_hours=int(step_hours))
+
+def _simulate_pruned(p0, graph, steps, step_hours, amp, lag, noise, cap, keep, workers=None, mode="auto", eps=0.0) -> SimulationBatch:
+    """Full first step for every control, then the rest on the subgraph upstream of the outputs."""
+    k, c = p0.shape
+    head = simulate_batch(p0, graph, 1, step_hours, amplification=amp, delays=lag, noise=noise, cap=cap, workers=1, mode=mode, eps=eps)
+    history = np.full((steps + 1, k, c), np.nan)
+    history[:2] = head.history
+    if len(keep):
+        sub, mask = graph.subgraph(keep)
+        sub_cap = None if cap is None else np.broadcast_to(np.asarray(cap, dtype=float), (k, c))[:, keep]
+        tail = simulate_batch(
+            p0[:, keep], sub, steps, step_hours,
+            amplification=amp[..., mask],
+            delays=lag[..., mask],
+            noise=noise[:, keep],
+            cap=sub_cap,
+            workers=workers,
+            mode=mode,
+            eps=eps,
+        )
+        history[:, :, keep] = tail.history
+    return SimulationBatch(history=history, step_hours=int(step_hours))
+
+_RUNS: "OrderedDict[tuple, tuple[CompiledGraph, SimulationBatch]]" = OrderedDict()
+_RUNS_LOCK = threading.Lock()
+
+def simulate_cached(p0: np.ndarray, graph: CompiledGraph, steps: int, step_hours: int, outputs: Sequence[int] | None = None) -> SimulationBatch:
+    """`simulate_batch` with the ontology's own dynamics, served from recent runs when possible.
+
+    A shorter horizon is a prefix of a longer one, so any cached run from the
+    same starting pressures with at least `steps` steps is sliced instead of
+    re-simulated. Cached histories are read-only.
+    """
+    p0 = np.asarray(p0, dtype=float)
+    key = (id(graph), int(step_hours), p0.shape, p0.tobytes(), None if outputs is None else tuple(sorted(int(j) for j in outputs)))
+    with _RUNS_LOCK:
+        hit = _RUNS.get(key)
+        if hit is not None and hit[0] is graph and hit[1].steps >= steps:
+            _RUNS.move_to_end(key)
+            return hit[1].prefix(steps)
+    batch = simulate_batch(p0, graph, steps, step_hours, outputs=outputs)
+    if batch.history.size <= RUN_CACHE_MAX_VALUES:
+        batch.history.setflags(write=False)
+        with _RUNS_LOCK:
+            _RUNS[key] = (graph, batch)
+            _RUNS.move_to_end(key)
+            while len(_RUNS) > RUN_CACHE_SIZE:
+                _RUNS.popitem(last=False)
+    return batch
+
+def sla_index(graph: CompiledGraph) -> int | None:
+    return graph.controls.index(SLA_CONTROL) if SLA_CONTROL in graph.controls else None
+
+def summarize_run(batch: SimulationBatch, k: int, graph: CompiledGraph, t0: pd.Timestamp) -> Dict[str, Any]:
+    """The `ForecastResult.summary` dict for run `k` of a batch."""
+    first = int(batch.first_sla_step(sla_index(graph))[k])
+    first_fail = t0 + timedelta(hours=batch.step_hours * (first + 1)) if first >= 0 else None
+    time_to_failure_days = (first_fail - t0).total_seconds() / (3600 * 24) if first_fail is not None else None
+
+    avg = batch.pressures[k].mean(axis=0)
+    avg_pressure = {cid: float(avg[j]) for j, cid in enumerate(graph.controls)}
+    choke = graph.controls[int(avg.argmax())]
+
+    return {
+        "start_time": str(t0.isoformat()),
+        "predicted_first_sla_degrade_or_fail": str(first_fail.isoformat()) if first_fail is not None else None,
+        "time_to_failure_days": time_to_failure_days,
+        "avg_pressure": avg_pressure,
+        "top_choke_point": choke,
+        "propagation_edges": [
+            {"src": u, "dst": v, "delay_days": int(d), "amplification": float(a)}
+            for (u, v), d, a in zip(graph.edges, graph.delay_days, graph.amplification)
+        ],
+    }
+
+def forecast_from_pressures(p0: np.ndarray, t0: pd.Timestamp, ontology: Ontology, graph: CompiledGraph, horizon_days: int | None = None, explain: bool = False) -> ForecastResult:
+    """Simulate the horizon from an already-classified (C,) starting pressure vector.
+
+    With `explain`, also attach a per-control attribution (see `attribution.attribute`).
+    """
+    horizon = int(horizon_days or ontology.forecast_horizon_days)
+    return forecast_horizons_from_pressures(p0, t0, ontology, graph, [horizon], explain=explain)[horizon]
+
+def forecast_horizons_from_pressures(p0: np.ndarray, t0: pd.Timestamp, ontology: Ontology, graph: CompiledGraph, horizons: Sequence[int], explain: bool = False) -> Dict[int, ForecastResult]:
+    """One `ForecastResult` per horizon (days), ascending, all from one run to the longest.
+
+    Shorter horizons are prefix slices of that run, so they match separate
+    forecasts exactly. With `explain`, only the first horizon listed (the
+    caller's primary one) gets an attribution; it costs a batched run of its own.
+    """
+    primary = int(horizons[0]) if len(horizons) else None
+    horizons = sorted({int(h) for h in horizons})
+    if not horizons or horizons[0] < 1:
+        raise ValueError("Horizons must be at least one day.")
+    step_hours = int(ontology.step_hours)
+    steps_for = {h: int((h * 24) / step_hours) for h in horizons}
+
+    batch = simulate_cached(p0, graph, steps_for[horizons[-1]], step_hours)
+
+    series: List[ForecastPoint] = []
+    for s in range(batch.steps):
+        pressures = batch.pressures[0, s]
+        codes = batch.states[0, s]
+        probabilities = batch.probabilities[0, s]
+        series.append(ForecastPoint(
+            timestamp=t0 + timedelta(hours=step_hours * (s + 1)),
+            pressures={cid: float(pressures[j]) for j, cid in enumerate(graph.controls)},
+            predicted_states={cid: STATE_ORDER[codes[j]] for j, cid in enumerate(graph.controls)},
+            probabilities={cid: float(probabilities[j]) for j, cid in enumerate(graph.controls)},
+        ))
+    arrays = {"pressures": batch.pressures[0], "probabilities": batch.probabilities[0], "states": batch.states[0]}
+
+    out: Dict[int, ForecastResult] = {}
+    for h in horizons:
+        n = steps_for[h]
+        points = series[:n]
+        out[h] = ForecastResult(
+            start=str(t0.isoformat()),
+            end=str(points[-1].timestamp.isoformat()) if points else str(t0.isoformat()),
+            horizon_days=h,
+            series=points,
+            summary=summarize_run(batch.prefix(n), 0, graph, t0),
+            attribution=_attribute(p0, ontology, graph, h) if explain and h == primary else None,
+            arrays={k: v[:n] for k, v in arrays.items()},
+        )
+    return out
+
+def _attribute(p0: np.ndarray, ontology: Ontology, graph: CompiledGraph, horizon: int) -> Dict[str, Any]:
+    from .attribution import attribute  # attribution builds on this module
+    return attribute(p0, ontology, graph, horizon)
+
+def select_start(df: pd.DataFrame, start_time: str | None = None) -> tuple[pd.Timestamp, pd.Series]:
+    """The forecast start time and the row it starts from (last row at that timestamp)."""
+    import pandas as pd
+
     df = df.copy()
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
-    df = df.sort_values("timestamp")
+    df = df.sort_values("timestamp", kind="mergesort")
 
     if start_time:
         t0 = pd.to_datetime(start_time, utc=True)
@@ -48,91 +499,20 @@ def forecast(df: pd.DataFrame, ontology: Ontology, start_time: str | None = None
         df_hist = df.copy()
         t0 = df_hist["timestamp"].iloc[-1]
 
-    horizon = int(horizon_days or ontology.forecast_horizon_days)
-    step_hours = int(ontology.step_hours)
-    steps = int((horizon * 24) / step_hours)
-
-    pg = build_graph(ontology.edges)
-
-    last = df_hist[df_hist["timestamp"] == t0].iloc[-1]
-    pressures: Dict[str, float] = {}
-    for cid, ctrl in ontology.controls.items():
-        val = float(last[ctrl.metric])
-        cs = classify_state(ctrl.thresholds.direction, ctrl.thresholds.states, val)
-        pressures[cid] = severity_to_pressure(cs.severity)
-
-    pressure_hist: Dict[str, List[float]] = {cid: [pressures[cid]] for cid in ontology.controls.keys()}
-
-    series: List[ForecastPoint] = []
-    current_time = t0
-
-    decay_per_step = 0.03
-    noise_scale = 0.01
-    rng = np.random.default_rng(42)
-
-    edge_buffers: Dict[Tuple[str, str], List[float]] = {}
-    for u, v, d in pg.graph.edges(data=True):
-        delay_steps = int((int(d["delay_days"]) * 24) / step_hours)
-        edge_buffers[(u, v)] = [0.0 for _ in range(max(1, delay_steps))]
-
-    for _ in range(steps):
-        incoming = {cid: 0.0 for cid in ontology.controls.keys()}
-        for u, v, d in pg.graph.edges(data=True):
-            amp = float(d["amplification"])
-            buf = edge_buffers[(u, v)]
-            buf.append(pressures[u] * amp)
-            arriving = buf.pop(0)
-            incoming[v] += arriving
-
-        for cid in pressures.keys():
-            new_p = pressures[cid] * (1.0 - decay_per_step) + incoming[cid] * 0.25
-            new_p = new_p + float(rng.normal(0.0, noise_scale))
-            pressures[cid] = float(min(1.0, max(0.0, new_p)))
-            pressure_hist[cid].append(pressures[cid])
-
-        predicted_states: Dict[str, str] = {}
-        probabilities: Dict[str, float] = {}
-        for cid, pseries in pressure_hist.items():
-            st, _ = state_from_pressure(pseries[-1])
-            predicted_states[cid] = st
-            probabilities[cid] = _estimate_probability(pseries[-12:])
-
-        current_time = current_time + pd.Timedelta(hours=step_hours)
-        series.append(ForecastPoint(timestamp=current_time, pressures=dict(pressures), predicted_states=predicted_states, probabilities=probabilities))
-
-    first_fail = None
-    for pt in series:
-        if pt.predicted_states.get("sla_compliance") in ("degraded", "failed"):
-            first_fail = pt.timestamp
-            break
-
-    time_to_failure_days = None
-    if first_fail is not None:
-        time_to_failure_days = (first_fail - t0).total_seconds() / (3600 * 24)
-
-    avg_pressure = {cid: float(np.mean([pt.pressures[cid] for pt in series])) for cid in ontology.controls.keys()}
-    choke = max(avg_pressure.items(), key=lambda kv: kv[1])[0]
-
-    summary = {
-        "start_time": str(t0.isoformat()),
-        "predicted_first_sla_degrade_or_fail": str(first_fail.isoformat()) if first_fail is not None else None,
-        "time_to_failure_days": time_to_failure_days,
-        "avg_pressure": avg_pressure,
-        "top_choke_point": choke,
-        "propagation_edges": [{"src": u, "dst": v, **d} for u, v, d in pg.graph.edges(data=True)],
-    }
-
-    return ForecastResult(
-        start=str(t0.isoformat()),
-        end=str(series[-1].timestamp.isoformat()) if series else str(t0.isoformat()),
-        horizon_days=horizon,
-        series=series,
-        summary=summary,
-    )
-
-
+    return t0, df_hist[df_hist["timestamp"] == t0].iloc[-1]
 
+def forecast(df: pd.DataFrame, ontology: Ontology, start_time: str | None = None, horizon_days: int | Sequence[int] | None = None, explain: bool = False) -> ForecastResult | Dict[int, ForecastResult]:
+    """Forecast from the row at `start_time` (default: the last row).
 
+    With a list of horizons, returns {horizon_days: ForecastResult} from a single run;
+    `explain` then attributes the first horizon listed only.
+    """
+    t0, last = select_start(df, start_time)
+    graph = compile_graph(ontology)
+    p0 = initial_pressures(np.array([float(last[m]) for m in graph.metrics]), graph, ontology)
+    if isinstance(horizon_days, (list, tuple, np.ndarray)):
+        return forecast_horizons_from_pressures(p0[0], t0, ontology, graph, horizon_days, explain=explain)
+    return forecast_from_pressures(p0[0], t0, ontology, graph, horizon_days, explain=explain)
 
 from dataclasses import dataclass
 
@@ -2,6 +2,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Dict, Tuple
 import math
+import numpy as np
 
 STATE_ORDER = ["healthy", "constrained", "degraded", "failed"]
 
@@ -49,3 +50,30 @@ def state_from_pressure(pressure: float) -> Tuple[str, int]:
     if pressure < 0.85:
         return "degraded", 2
     return "failed", 3
+
+PRESSURE_LEVELS = np.array([0.0, 0.35, 0.7, 1.0])
+PRESSURE_CUTS = np.array([0.2, 0.5, 0.85])
+
+def classify_severity(direction: str, thresholds: Dict[str, Dict[str, float]], values: np.ndarray) -> np.ndarray:
+    """Vectorized `classify_state(...).severity` as int8 codes (NaN classifies as failed)."""
+    if direction not in ("higher_is_worse", "lower_is_worse"):
+        raise ValueError(f"Unknown direction: {direction}")
+
+    v = np.asarray(values, dtype=float)
+    sev = np.full(v.shape, 3, dtype=np.int8)
+    if direction == "higher_is_worse":
+        for i in reversed(range(len(STATE_ORDER))):
+            sev[v <= thresholds[STATE_ORDER[i]].get("max", math.inf)] = i
+        return sev
+
+    for i in reversed(range(len(STATE_ORDER) - 1)):
+        sev[v >= thresholds[STATE_ORDER[i]].get("min", -math.inf)] = i
+    return sev
+
+def severity_to_pressure_array(sev: np.ndarray) -> np.ndarray:
+    """Vectorized `severity_to_pressure`."""
+    return PRESSURE_LEVELS[np.clip(np.asarray(sev, dtype=np.intp), 0, 3)]
+
+def state_codes_from_pressure(pressure: np.ndarray) -> np.ndarray:
+    """Vectorized `state_from_pressure(...)[1]` as int8 codes."""
+    return np.searchsorted(PRESSURE_CUTS, np.asarray(pressure, dtype=float), side="right").astype(np.int8)
@@ -0,0 +1,242 @@
+from __future__ import annotations
+from typing import Optional, Dict, Tuple, Any
+import threading
+import os
+import numpy as np
+import pandas as pd
+
+from adam_core.config import load_ontology, Ontology
+from adam_core.graph import PathIndex, build_path_index, compile_graph
+from adam_core.simulator import forecast, simulate_batch, ForecastResult
+from adam_core.resample import resample, resample_csv
+from adam_core.datasets import Dataset, DatasetStore, parse_csv
+from adam_core.downsample import downsample_frame
+from adam_core.shared_cache import SharedArrayCache
+from adam_core.whatif import Intervention, whatif
+from adam_core.eri import compute_eri
+from adam_core.replay import backtest_replay
+from adam_core.calibrate import EriCache, build_eri_cache, calibrate
+from adam_core.states import STATE_ORDER
+from api.offload import JobError
+from api.responses import dumps
+
+APP_ONT_PATH = "config/ontology.yaml"
+EXPORT_DIR = os.environ.get("ADAM_EXPORT_DIR")  # when set, forecasts and replays also land here as Parquet
+DATASETS = DatasetStore()  # filled by POST /datasets
+SHARED = SharedArrayCache()  # parsed CSVs and path indexes, mapped by every worker process
+
+# Parsed ontology keyed by (path, mtime, size); its compiled graph and path index are built on load.
+_ONTOLOGY: Dict[Tuple[str, int, int], Ontology] = {}
+_ONTOLOGY_LOCK = threading.Lock()
+
+def get_ontology() -> Ontology:
+    st = os.stat(APP_ONT_PATH)
+    key = (APP_ONT_PATH, st.st_mtime_ns, st.st_size)
+    with _ONTOLOGY_LOCK:
+        ont = _ONTOLOGY.get(key)
+        if ont is None:
+            ont = load_ontology(APP_ONT_PATH)
+            graph = compile_graph(ont)
+            # The path index is built by one process and mapped by the rest.
+            arrays = SHARED.get("paths", APP_ONT_PATH, lambda: build_path_index(graph).arrays())
+            graph.__dict__["paths"] = PathIndex(controls=list(graph.controls), **arrays)
+            _ONTOLOGY.clear()
+            _ONTOLOGY[key] = ont
+        return ont
+
+def warm_worker() -> None:
+    """Parse the ontology, map its path index and run a tiny simulation before taking requests."""
+    graph = compile_graph(get_ontology())
+    simulate_batch(np.zeros((1, len(graph.controls))), graph, 2, 6).probabilities
+
+def export_forecast(tenant: str, fr: ForecastResult, ont: Ontology) -> None:
+    """Append a forecast to the Parquet store at ADAM_EXPORT_DIR, if set."""
+    if EXPORT_DIR:
+        from adam_core.export import ParquetExporter  # pyarrow loads only when exporting
+
+        # One part file per request; the data lake compacts small files.
+        with ParquetExporter(EXPORT_DIR) as ex:
+            ex.write_forecast(tenant, fr, compile_graph(ont).controls)
+
+def export_replay(tenant: str, rr) -> None:
+    """Append a replay's ERI series to the Parquet store at ADAM_EXPORT_DIR, if set."""
+    if EXPORT_DIR:
+        from adam_core.export import ParquetExporter
+
+        with ParquetExporter(EXPORT_DIR) as ex:
+            ex.write_replay(tenant, rr)
+
+def forecast_payload(fr: ForecastResult, ont: Ontology, layout: str = "points") -> dict:
+    probs = fr.series[0].probabilities if fr.series else {}
+    ttf = fr.summary.get("time_to_failure_days")
+    eri = compute_eri(probs, ont.impact_weights, ttf)
+
+    payload = {
+        "eri": eri.eri,
+        "top_driver": eri.top_driver,
+        "time_to_failure_days": eri.time_to_failure_days,
+        "summary": fr.summary,
+        "attribution": fr.attribution,
+    }
+    if layout == "columnar" and fr.arrays is not None:
+        payload["series"] = {
+            "timestamps": [p.timestamp.isoformat() for p in fr.series],
+            "controls": compile_graph(ont).controls,
+            "state_names": STATE_ORDER,
+            **fr.arrays,
+        }
+        return payload
+    payload["series"] = [
+        {
+            "timestamp": str(p.timestamp.isoformat()),
+            "pressures": p.pressures,
+            "predicted_states": p.predicted_states,
+            "probabilities": p.probabilities,
+        }
+        for p in fr.series
+    ]
+    return payload
+
+def horizon_summary(fr: ForecastResult, ont: Ontology) -> dict:
+    eri = compute_eri(fr.series[0].probabilities if fr.series else {}, ont.impact_weights, fr.summary.get("time_to_failure_days"))
+    return {
+        "horizon_days": fr.horizon_days,
+        "eri": eri.eri,
+        "top_driver": eri.top_driver,
+        "time_to_failure_days": eri.time_to_failure_days,
+        "predicted_first_sla_degrade_or_fail": fr.summary["predicted_first_sla_degrade_or_fail"],
+        "top_choke_point": fr.summary["top_choke_point"],
+        "avg_pressure": fr.summary["avg_pressure"],
+    }
+
+def load_history(csv_path: Optional[str], dataset_id: Optional[str]) -> pd.DataFrame:
+    """Rows from exactly one of a server-side CSV or an uploaded dataset."""
+    if (csv_path is None) == (dataset_id is None):
+        raise JobError(422, "Provide exactly one of csv_path or dataset_id.")
+    if csv_path is not None:
+        return load_csv(csv_path)
+    try:
+        return DATASETS.load(dataset_id).to_frame()
+    except ValueError as e:
+        raise JobError(422, str(e))
+    except KeyError:
+        raise JobError(404, f"Unknown dataset {dataset_id!r}")
+
+def load_csv(path: str) -> pd.DataFrame:
+    """A server-side CSV, parsed once per version of the file across all worker processes."""
+    def build() -> Dict[str, Any]:
+        stamps, columns = parse_csv(path)
+        return {"timestamp": stamps, **columns}
+
+    try:
+        arrays = dict(SHARED.get("csv", path, build))
+    except FileNotFoundError:
+        raise JobError(404, f"No such file: {path}")
+    return Dataset(id=path, stamps=arrays.pop("timestamp"), columns=arrays).to_frame()
+
+# Each job takes a request model's `model_dump()` and returns the JSON body, so
+# it can run in a worker process and only bytes cross back.
+
+def forecast_job(req: Dict[str, Any]) -> bytes:
+    ont = get_ontology()
+    if req["resample"] and req["csv_path"] is not None and req["dataset_id"] is None:
+        df = resample_csv(req["csv_path"], ont).to_frame()
+    else:
+        df = load_history(req["csv_path"], req["dataset_id"])
+        if req["resample"]:
+            df = resample(df, ont).to_frame()
+    horizon = int(req["horizon_days"] or ont.forecast_horizon_days)
+    try:
+        runs = forecast(df, ont, start_time=req["start_time"], horizon_days=[horizon, *(req["horizons"] or [])], explain=req["explain"])
+    except ValueError as e:
+        raise JobError(422, str(e))
+    export_forecast(req["tenant"], runs[horizon], ont)
+    payload = forecast_payload(runs[horizon], ont, req["layout"])
+    if req["horizons"]:
+        payload["horizons"] = [horizon_summary(fr, ont) for fr in runs.values()]
+    return dumps(payload)
+
+def history_job(req: Dict[str, Any]) -> bytes:
+    df = load_history(req["csv_path"], req["dataset_id"])
+    metrics = req["metrics"] or [c for c in df.columns if c != "timestamp" and pd.api.types.is_numeric_dtype(df[c])]
+    unknown = [m for m in metrics if m not in df.columns]
+    if unknown:
+        raise JobError(422, f"Unknown metrics: {unknown}")
+    try:
+        stamps = pd.to_datetime(df["timestamp"], utc=True)
+        end = pd.to_datetime(req["end_time"], utc=True) if req["end_time"] else stamps.max()
+        if req["start_time"]:
+            start = pd.to_datetime(req["start_time"], utc=True)
+        elif req["lookback_days"]:
+            start = end - pd.Timedelta(days=req["lookback_days"])
+        else:
+            start = stamps.min()
+    except (ValueError, TypeError) as e:
+        raise JobError(422, str(e))
+    window = df.loc[(stamps >= start) & (stamps <= end), ["timestamp", *metrics]]
+    window = window.assign(timestamp=stamps[window.index]).sort_values("timestamp", kind="stable")
+    try:
+        out = downsample_frame(window, req["max_points"], metrics, on="timestamp", method=req["method"])
+    except ValueError as e:
+        raise JobError(422, str(e))
+    return dumps({
+        "rows": len(window),
+        "points": len(out),
+        "method": req["method"],
+        "timestamps": [t.isoformat() for t in out["timestamp"]],
+        "series": {m: out[m].to_numpy(dtype=np.float64, na_value=np.nan) for m in metrics},
+    })
+
+def whatif_job(req: Dict[str, Any]) -> bytes:
+    ont = get_ontology()
+    df = load_history(req["csv_path"], req["dataset_id"])
+    interventions = [Intervention(name=sc["name"], cap=sc["cap"], edges=sc["edges"], shift=sc["shift"]) for sc in req["scenarios"]]
+    try:
+        res = whatif(df, ont, interventions, start_time=req["start_time"], horizon_days=req["horizon_days"])
+    except ValueError as e:
+        raise JobError(422, str(e))
+    return dumps(res.__dict__)
+
+def replay_job(req: Dict[str, Any]) -> bytes:
+    ont = get_ontology()
+    df = load_history(req["csv_path"], req["dataset_id"])
+    try:
+        rr = backtest_replay(
+            df, ont, incident_time=req["incident_time"], lookback_days=req["lookback_days"], horizon_days=req["horizon_days"],
+            refine=req["refine"], first_warning_only=req["first_warning_only"], sustain=req["sustain"],
+        )
+    except ValueError as e:
+        raise JobError(422, str(e))
+    export_replay(req["tenant"], rr)
+    return dumps(rr.__dict__)
+
+# Per-day ERI inputs for the most recently calibrated (source, mtime, size, horizon); sweeps never re-simulate.
+_ERI_CACHES: Dict[Tuple[str, int, int, int], EriCache] = {}
+
+def calibrate_job(req: Dict[str, Any]) -> bytes:
+    ont = get_ontology()
+    df = load_history(req["csv_path"], req["dataset_id"])
+    horizon = int(req["horizon_days"] or ont.forecast_horizon_days)
+    if req["dataset_id"] is not None:
+        key = (f"dataset:{req['dataset_id']}", 0, 0, horizon)  # datasets never change once stored
+    else:
+        st = os.stat(req["csv_path"])
+        key = (os.path.abspath(req["csv_path"]), st.st_mtime_ns, st.st_size, horizon)
+    cache = _ERI_CACHES.get(key)
+    if cache is None:
+        cache = build_eri_cache(df, ont, horizon_days=req["horizon_days"])
+        _ERI_CACHES.clear()
+        _ERI_CACHES[key] = cache
+    try:
+        report = calibrate(
+            df, ont,
+            incidents=req["incidents"],
+            thresholds=req["thresholds"],
+            weight_sets=req["weight_sets"],
+            lookback_days=req["lookback_days"],
+            max_false_positive_rate=req["max_false_positive_rate"],
+            cache=cache,
+        )
+    except ValueError as e:
+        raise JobError(422, str(e))
+    return dumps(report.__dict__)
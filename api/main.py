@@ -1,44 +1,182 @@
 from __future__ import annotations
-from fastapi import FastAPI, Depends, HTTPException, Header
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from fastapi import FastAPI, Body, Depends, HTTPException, Header, Query, Request, Response, UploadFile, File
 from pydantic import BaseModel, Field
-from typing import Optional
-import pandas as pd
+from typing import TYPE_CHECKING, Annotated, Optional, List, Dict, Any, Literal
+import asyncio
+import threading
+import os
 
-from adam_core.config import load_ontology, Ontology
-from adam_core.simulator import forecast
-from adam_core.eri import compute_eri
-from adam_core.replay import backtest_replay
+from api.offload import JobError, Offloader, Saturated
+from api.responses import json_response, encoded_response
 
-APP_ONT_PATH = "config/ontology.yaml"
+if TYPE_CHECKING:
+    from adam_core.agents import AgentStore
+    from adam_core.anomaly import AnomalyDetector
+    from adam_core.daemon import SnapshotStore
+    from adam_core.forecaster import Forecaster
+    from adam_core.resample import Resampler
+    from adam_core.simulator import ForecastResult
+
+# pandas and the engine load on first use (or during startup warmup), not at import.
 API_KEY = "adam-demo-key"  # replace with env/secret manager in production
+# Heavy endpoints run here: ADAM_API_WORKERS processes (0 = one thread), at most ADAM_API_MAX_PENDING distinct jobs.
+JOBS = Offloader(
+    workers=int(os.environ["ADAM_API_WORKERS"]) if "ADAM_API_WORKERS" in os.environ else None,
+    max_pending=int(os.environ["ADAM_API_MAX_PENDING"]) if "ADAM_API_MAX_PENDING" in os.environ else None,
+)
+
+def _jobs():
+    from api import jobs
+    return jobs
+
+@lru_cache(maxsize=None)
+def _snapshots() -> "SnapshotStore":
+    from adam_core.daemon import SnapshotStore
+    return SnapshotStore()  # written by `python -m adam_core.daemon`
+
+@lru_cache(maxsize=None)
+def _agents() -> "AgentStore":
+    from adam_core.agents import AgentStore
+    return AgentStore()  # shared with the AI Agents page
+
+def get_ontology():
+    return _jobs().get_ontology()
+
+def warm() -> None:
+    """Load the engine, parse and compile the ontology, and run a tiny simulation in this process."""
+    _jobs().warm_worker()
+    _snapshots()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Readiness waits for this: the first request should not pay for imports or compilation.
+    await asyncio.to_thread(warm)
+    await JOBS.start(preload=["api.jobs"], warm=_jobs().warm_worker)
+    yield
+    JOBS.shutdown()
 
 app = FastAPI(
     title="ADAM API",
     version="0.1",
     description="Enterprise integration surface for Adam: control-health forecasting and historical replay.",
+    lifespan=lifespan,
 )
 
 def require_api_key(x_api_key: str = Header(default="")):
     if x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-def get_ontology() -> Ontology:
-    return load_ontology(APP_ONT_PATH)
-
 class ForecastRequest(BaseModel):
-    csv_path: str = Field(..., description="Path to CSV with columns: timestamp + required metrics.")
+    csv_path: Optional[str] = Field(None, description="Path to CSV with columns: timestamp + required metrics.")
+    dataset_id: Optional[str] = Field(None, description="Uploaded dataset (POST /datasets) to use instead of csv_path.")
     start_time: Optional[str] = Field(None, description="ISO8601 time to forecast from; defaults to last row timestamp.")
     horizon_days: Optional[int] = Field(None, description="Forecast horizon; defaults to ontology.")
+    horizons: Optional[List[int]] = Field(None, description="Also summarize these horizons (days) from the same run, e.g. [7, 14, 30, 60].")
+    explain: bool = Field(True, description="Include per-control attribution (one extra batched run).")
+    resample: bool = Field(False, description="Bucket irregular rows onto the step_hours grid first (worst value per bucket).")
+    layout: Literal["points", "columnar"] = Field("points", description="'columnar': series as (steps, controls) arrays instead of one object per step.")
+    tenant: str = Field("default", pattern=r"^[A-Za-z0-9_.-]+$", description="Tenant partition for the Parquet export (ADAM_EXPORT_DIR).")
+
+class IngestRequest(BaseModel):
+    stream: str = Field(..., description="Stream id; one incremental forecaster is kept per stream.")
+    csv_path: Optional[str] = Field(None, description="History to seed the stream with on first use.")
+    rows: List[Dict[str, Any]] = Field(default_factory=list, description="New rows: timestamp + required metrics.")
+    resample: bool = Field(False, description="On first use: bucket this stream onto the step_hours grid; rows reach the forecaster as buckets close.")
+    tenant: str = Field("default", pattern=r"^[A-Za-z0-9_.-]+$", description="Tenant partition for the Parquet export (ADAM_EXPORT_DIR).")
 
 class ReplayRequest(BaseModel):
-    csv_path: str
+    csv_path: Optional[str] = None
+    dataset_id: Optional[str] = Field(None, description="Uploaded dataset (POST /datasets) to use instead of csv_path.")
     incident_time: str = Field(..., description="ISO8601 incident time (ground truth).")
     lookback_days: int = Field(30, ge=7, le=120)
     horizon_days: int = Field(14, ge=7, le=60)
+    refine: bool = Field(False, description="Re-scan the day before each warning crossing at step resolution.")
+    first_warning_only: bool = Field(False, description="Stop at the first sustained crossing and return no eri_series.")
+    sustain: int = Field(1, ge=1, le=30, description="Consecutive daily points at or above the warning threshold that count as a warning.")
+    tenant: str = Field("default", pattern=r"^[A-Za-z0-9_.-]+$", description="Tenant partition for the Parquet export (ADAM_EXPORT_DIR).")
+
+class HistoryRequest(BaseModel):
+    csv_path: Optional[str] = None
+    dataset_id: Optional[str] = Field(None, description="Uploaded dataset (POST /datasets) to use instead of csv_path.")
+    metrics: Optional[List[str]] = Field(None, description="Columns to return; defaults to every numeric column.")
+    start_time: Optional[str] = Field(None, description="ISO8601; defaults to end_time - lookback_days, else the first row.")
+    end_time: Optional[str] = Field(None, description="ISO8601; defaults to the last row.")
+    lookback_days: Optional[float] = Field(None, gt=0)
+    max_points: int = Field(2000, ge=30, le=100_000, description="Rows to return at most, e.g. about twice the chart width in pixels; at least 3 per metric.")
+    method: Literal["lttb", "minmax"] = Field("lttb", description="'minmax' keeps every bucket's extremes; better for step-like series.")
+
+class AgentRequest(BaseModel):
+    owner: str
+    scopes: List[str] = Field(default_factory=list)
+    purpose: str = ""
+    status: Literal["active", "inactive"] = "active"
+
+class AuditEvent(BaseModel):
+    agent: Optional[str] = None
+    action: str = Field(..., min_length=1, description="Short machine-readable verb, e.g. 'routed_incident'.")
+    message: str
+    detail: Optional[Dict[str, Any]] = None
+    ts: Optional[str] = Field(None, description="ISO8601 time of the event; defaults to now.")
+
+class EdgeChange(BaseModel):
+    src: str
+    dst: str
+    scale: float = Field(1.0, ge=0.0, description="Multiplier on the edge's amplification; 0 cuts it.")
+    remove: bool = False
+    delay_days: Optional[int] = Field(None, ge=0)
+
+class Scenario(BaseModel):
+    name: str
+    cap: Dict[str, float] = Field(default_factory=dict, description="Control id -> maximum pressure (0..1).")
+    edges: List[EdgeChange] = Field(default_factory=list)
+    shift: Dict[str, float] = Field(default_factory=dict, description="Metric -> delta applied to the starting value.")
+
+class WhatIfRequest(BaseModel):
+    csv_path: Optional[str] = None
+    dataset_id: Optional[str] = Field(None, description="Uploaded dataset (POST /datasets) to use instead of csv_path.")
+    start_time: Optional[str] = None
+    horizon_days: Optional[int] = Field(None, ge=1, le=120)
+    scenarios: List[Scenario] = Field(..., min_length=1, max_length=5000)
+
+class CalibrateRequest(BaseModel):
+    csv_path: Optional[str] = None
+    dataset_id: Optional[str] = Field(None, description="Uploaded dataset (POST /datasets) to use instead of csv_path.")
+    incidents: Optional[List[str]] = Field(None, description="ISO8601 incident onsets; defaults to incident_flag onsets in the CSV.")
+    thresholds: Optional[List[float]] = Field(None, description="Candidate eri_warning values; defaults to 0.50..0.99.")
+    weight_sets: Optional[List[Dict[str, float]]] = Field(None, description="Impact-weight overrides to sweep alongside the ontology's weights.")
+    lookback_days: int = Field(30, ge=7, le=120)
+    horizon_days: Optional[int] = Field(None, ge=7, le=60)
+    max_false_positive_rate: float = Field(0.05, ge=0.0, le=1.0)
+
+@dataclass
+class _Stream:
+    """One /ingest stream. `lock` keeps its resampler, detector and forecaster in step."""
+    forecaster: "Forecaster"
+    detector: "AnomalyDetector"
+    resampler: Optional["Resampler"] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    last: Optional["ForecastResult"] = None  # the forecast the stream last returned
+    last_p0: Any = None  # its starting pressures
+
+_STREAMS: Dict[str, _Stream] = {}
+_STREAMS_LOCK = threading.Lock()
+
+async def _offload(name: str, fn, req: BaseModel, request: Request) -> Response:
+    """Run `fn(req)` on the job pool; identical concurrent requests share one run."""
+    try:
+        body = await JOBS.run((name, req.model_dump_json()), fn, req.model_dump())
+    except Saturated as e:
+        raise HTTPException(status_code=503, detail="Server busy; retry later.", headers={"Retry-After": str(e.retry_after)})
+    except JobError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return encoded_response(body, request)
 
 @app.get("/health")
-def health():
-    return {"status": "ok"}
+async def health():
+    return {"status": "ok", "jobs_pending": JOBS.pending, **JOBS.stats}
 
 @app.get("/ontology", dependencies=[Depends(require_api_key)])
 def ontology():
@@ -52,35 +190,187 @@ def ontology():
         "forecast": {"horizon_days": ont.forecast_horizon_days, "step_hours": ont.step_hours, "eri_warning": ont.eri_warning},
     }
 
+@app.get("/graph/paths", dependencies=[Depends(require_api_key)])
+def graph_paths(src: Optional[str] = None, dst: Optional[str] = None, within_days: Optional[float] = None):
+    """Reachability, minimum cumulative delay and maximum amplification from the precomputed path index.
+
+    Both `src` and `dst`: that pair. Only `dst`: every upstream control. Only `src`:
+    every downstream control. Lists are ordered by delay and can be limited to `within_days`.
+    """
+    from adam_core.graph import compile_graph
+
+    paths = compile_graph(get_ontology()).paths
+    for cid in (src, dst):
+        if cid is not None and cid not in paths.controls:
+            raise HTTPException(status_code=404, detail=f"Unknown control {cid!r}")
+    if src is not None and dst is not None:
+        return paths.lookup(src, dst)
+    if dst is not None:
+        return {"dst": dst, "upstream": paths.upstream(dst, within_days)}
+    if src is not None:
+        return {"src": src, "downstream": paths.downstream(src, within_days)}
+    raise HTTPException(status_code=422, detail="Provide src, dst or both.")
+
+@app.get("/snapshot/{tenant}", dependencies=[Depends(require_api_key)])
+def snapshot(tenant: str):
+    """Latest daemon snapshot for a tenant, served as stored (no computation)."""
+    try:
+        raw = _snapshots().read_bytes(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if raw is None:
+        raise HTTPException(status_code=404, detail=f"No snapshot for tenant {tenant!r}")
+    return Response(content=raw, media_type="application/json")
+
+@app.get("/agents", dependencies=[Depends(require_api_key)])
+def list_agents(owner: Optional[str] = None):
+    return _agents().agents(owner)
+
+@app.put("/agents/{name}", dependencies=[Depends(require_api_key)])
+def register_agent(name: str, req: AgentRequest):
+    try:
+        return _agents().register(name, req.owner, req.scopes, req.purpose, req.status)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.delete("/agents/{name}", dependencies=[Depends(require_api_key)])
+def delete_agent(name: str):
+    try:
+        _agents().delete(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown agent {name!r}")
+    return {"deleted": name}
+
+@app.post("/agents/events", dependencies=[Depends(require_api_key)])
+def write_audit_events(events: List[AuditEvent] = Body(..., max_length=10_000)):
+    """Append audit events; the batch is written in one transaction before the response."""
+    store = _agents()
+    try:
+        n = store.log_many(e.model_dump() for e in events)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    store.flush()
+    return {"written": n}
+
+@app.get("/agents/events", dependencies=[Depends(require_api_key)])
+def read_audit_events(
+    agent: Optional[str] = None,
+    owner: Optional[str] = None,
+    before: Optional[str] = Query(None, description="next_cursor of the previous page."),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """Audit events newest first, one keyset page at a time."""
+    try:
+        page = _agents().audit(limit, before=before, agent=agent, owner=owner)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"events": page.events, "next_cursor": page.next_cursor}
+
+@app.post("/datasets", dependencies=[Depends(require_api_key)])
+def upload_dataset(file: UploadFile = File(..., description="CSV with columns: timestamp + metrics.")):
+    """Store an uploaded CSV in parsed form and return its `dataset_id`.
+
+    The body is copied to disk in chunks while it is hashed; re-uploading the
+    same bytes returns the existing dataset without parsing it again.
+    """
+    import pandas as pd
+
+    try:
+        meta, deduplicated = _jobs().DATASETS.put_stream(file.file, filename=file.filename)
+    except (ValueError, pd.errors.ParserError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {**meta, "deduplicated": deduplicated}
+
+@app.get("/datasets/{dataset_id}", dependencies=[Depends(require_api_key)])
+def dataset_info(dataset_id: str):
+    try:
+        meta = _jobs().DATASETS.meta(dataset_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if meta is None:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset {dataset_id!r}")
+    return meta
+
 @app.post("/forecast", dependencies=[Depends(require_api_key)])
-def run_forecast(req: ForecastRequest):
+async def run_forecast(req: ForecastRequest, request: Request):
+    return await _offload("forecast", _jobs().forecast_job, req, request)
+
+@app.get("/history", dependencies=[Depends(require_api_key)])
+async def history(req: Annotated[HistoryRequest, Query()], request: Request):
+    """Metric history downsampled to `max_points` rows that keep each series' shape and spikes."""
+    return await _offload("history", _jobs().history_job, req, request)
+
+def _new_stream(req: IngestRequest) -> _Stream:
+    """A stream seeded from `req.csv_path`, if given, and not yet registered."""
+    from adam_core.anomaly import AnomalyDetector
+    from adam_core.forecaster import Forecaster
+    from adam_core.resample import Resampler
+
     ont = get_ontology()
-    df = pd.read_csv(req.csv_path)
-    fr = forecast(df, ont, start_time=req.start_time, horizon_days=req.horizon_days)
+    seed = _jobs().load_csv(req.csv_path) if req.csv_path else None
+    resampler = Resampler(ont) if req.resample else None
+    if resampler is not None and seed is not None:
+        seed = resampler.push(seed).to_frame()
+    detector = AnomalyDetector(ont)
+    if seed is not None:
+        detector.update(seed)
+    return _Stream(Forecaster(ont, seed), detector, resampler)
 
-    probs = fr.series[0].probabilities if fr.series else {}
-    ttf = fr.summary.get("time_to_failure_days")
-    eri = compute_eri(probs, ont.impact_weights, ttf)
+@app.post("/ingest", dependencies=[Depends(require_api_key)])
+def run_ingest(req: IngestRequest, request: Request):
+    """Append rows to a stream and re-forecast only the horizon from its newest row.
 
-    return {
-        "eri": eri.eri,
-        "top_driver": eri.top_driver,
-        "time_to_failure_days": eri.time_to_failure_days,
-        "summary": fr.summary,
-        "series": [
-            {
-                "timestamp": str(p.timestamp.isoformat()),
-                "pressures": p.pressures,
-                "predicted_states": p.predicted_states,
-                "probabilities": p.probabilities,
-            }
-            for p in fr.series
-        ],
-    }
+    The stream re-forecasts only when something changed: on first use, when
+    its anomaly detector flags an excursion in these rows, or when the newest
+    row's starting pressures differ from the last forecast's. Otherwise the
+    last forecast is returned again and `reforecast` is false. The response
+    also lists the flagged excursions, and which of them line up along graph edges.
+    """
+    import numpy as np
+    import pandas as pd
+
+    with _STREAMS_LOCK:
+        stream = _STREAMS.get(req.stream)
+    if stream is None:
+        # Seeding parses and scans a whole history, so it runs outside the lock every stream shares.
+        try:
+            seeded = _new_stream(req)
+        except JobError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        except (KeyError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        with _STREAMS_LOCK:
+            stream = _STREAMS.setdefault(req.stream, seeded)  # a concurrent first ingest may have won
+    # Held across the whole sequence, so concurrent ingests on one stream cannot interleave.
+    with stream.lock:
+        try:
+            rows = pd.DataFrame(list(req.rows))
+            if stream.resampler is not None:
+                rows = stream.resampler.push(rows).to_frame()
+            report = stream.detector.update(rows)
+            stream.forecaster.append(rows)
+            p0 = stream.forecaster.latest_pressures
+            reforecast = stream.last is None or report.changed or p0 is None or not np.array_equal(p0, stream.last_p0)
+            if reforecast:
+                stream.last, stream.last_p0 = stream.forecaster.update([]), p0
+                _jobs().export_forecast(req.tenant, stream.last, stream.forecaster.ontology)
+        except (KeyError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        fr = stream.last
+    payload = _jobs().forecast_payload(fr, stream.forecaster.ontology)
+    payload["reforecast"] = reforecast
+    payload["anomalies"] = report.anomalies
+    payload["correlated_anomalies"] = report.correlated
+    return json_response(payload, request)
+
+@app.post("/whatif", dependencies=[Depends(require_api_key)])
+async def run_whatif(req: WhatIfRequest, request: Request):
+    return await _offload("whatif", _jobs().whatif_job, req, request)
 
 @app.post("/replay", dependencies=[Depends(require_api_key)])
-def run_replay(req: ReplayRequest):
-    ont = get_ontology()
-    df = pd.read_csv(req.csv_path)
-    rr = backtest_replay(df, ont, incident_time=req.incident_time, lookback_days=req.lookback_days, horizon_days=req.horizon_days)
-    return rr.__dict__
+async def run_replay(req: ReplayRequest, request: Request):
+    return await _offload("replay", _jobs().replay_job, req, request)
+
+@app.post("/calibrate", dependencies=[Depends(require_api_key)])
+async def run_calibrate(req: CalibrateRequest, request: Request):
+    return await _offload("calibrate", _jobs().calibrate_job, req, request)
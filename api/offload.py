@@ -0,0 +1,112 @@
+from __future__ import annotations
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Hashable, Sequence
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+
+class JobError(Exception):
+    """An HTTP error from a job. Unlike HTTPException it survives the trip back from a worker process."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(status_code, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class Saturated(Exception):
+    """Admission control refused a job; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+class Offloader:
+    """Runs CPU-bound jobs off the event loop, one computation per distinct request.
+
+    - Single flight: a job whose key is already in flight is not submitted again;
+      every caller awaits the same result (or exception).
+    - Bounded pool: jobs run on `workers` processes (threads if `workers` is 0),
+      so the event loop and cheap endpoints stay responsive.
+    - Admission control: once `max_pending` distinct jobs are queued or running,
+      new keys are refused with `Saturated`, whose `retry_after` is the expected
+      wait at the recent mean job duration.
+
+    The pool is created on first use and restarted if a worker dies.
+    """
+
+    def __init__(self, workers: int | None = None, max_pending: int | None = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else max(0, int(workers))
+        self.max_pending = max(1, int(max_pending if max_pending is not None else 4 * max(1, self.workers)))
+        self._pool: Executor | None = None
+        self._preload: list[str] = []
+        self._pool_lock = threading.Lock()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._mean_seconds = 1.0  # EWMA of job durations, for Retry-After
+        self.stats = {"submitted": 0, "coalesced": 0, "rejected": 0}
+
+    def _executor(self) -> Executor:
+        with self._pool_lock:
+            if self._pool is None:
+                if self.workers == 0:
+                    self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="adam-job")
+                else:
+                    # forkserver: workers start from a clean interpreter rather than forking a threaded server.
+                    ctx = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+                    if self._preload and ctx.get_start_method() == "forkserver":
+                        ctx.set_forkserver_preload(self._preload)  # imported once; workers fork with them loaded
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+            return self._pool
+
+    async def start(self, preload: Sequence[str] = (), warm: Callable[[], Any] | None = None) -> None:
+        """Create the pool now and run `warm` once per worker, so the first request finds them ready.
+
+        `preload` modules are imported by the fork server before it forks any worker.
+        """
+        self._preload = list(preload)
+        executor = self._executor()
+        if warm is not None:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(executor, warm) for _ in range(max(1, self.workers))])
+
+    @property
+    def pending(self) -> int:
+        return len(self._inflight)
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._mean_seconds * (self.pending + 1) / max(1, self.workers)))
+
+    async def run(self, key: Hashable, fn: Callable[..., Any], *args: Any) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(fut)
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise Saturated(self.retry_after())
+
+        loop = asyncio.get_running_loop()
+        fut = loop.run_in_executor(self._executor(), fn, *args)
+        self._inflight[key] = fut
+        self.stats["submitted"] += 1
+        started = time.monotonic()
+
+        def done(f: asyncio.Future) -> None:
+            if self._inflight.get(key) is f:
+                del self._inflight[key]
+            self._mean_seconds += 0.2 * (time.monotonic() - started - self._mean_seconds)
+            if not f.cancelled() and isinstance(f.exception(), BrokenProcessPool):
+                self.shutdown()  # a crashed worker breaks the pool; start a fresh one next time
+
+        fut.add_done_callback(done)
+        # Shielded, so a caller that disconnects does not cancel the job for the others.
+        return await asyncio.shield(fut)
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
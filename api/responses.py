@@ -0,0 +1,87 @@
+from __future__ import annotations
+from typing import Any
+import datetime as dt
+import gzip
+import json
+import numpy as np
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:  # optional: several times faster, and serializes NumPy arrays without tolist()
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+try:  # optional: zstd is offered only when the zstandard package is installed
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+def _default(o: Any) -> Any:
+    if isinstance(o, (dt.datetime, dt.date)):  # includes pd.Timestamp
+        return o.isoformat()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"Type is not JSON serializable: {type(o).__name__}")
+
+def _finite(o: Any) -> Any:
+    """`o` with non-finite floats replaced by None, for the stdlib encoder."""
+    if isinstance(o, float):
+        return o if np.isfinite(o) else None
+    if isinstance(o, dict):
+        return {k: _finite(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_finite(v) for v in o]
+    if isinstance(o, (np.ndarray, np.generic)):
+        return _finite(o.tolist())
+    return o
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON; arrays, NumPy scalars and timestamps are written natively.
+
+    Non-finite floats become null, as JSON has no NaN.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_finite(obj), default=_default, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+def negotiate(body: bytes, accept_encoding: str) -> tuple[bytes, str | None]:
+    """Compress `body` with the best coding the client accepts (zstd, then gzip).
+
+    Bodies under `COMPRESS_MIN_BYTES` are sent as is.
+    """
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    if zstandard is not None and offered.get("zstd", 0.0) > 0:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), "zstd"
+    if offered.get("gzip", 0.0) > 0:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+    return body, None
+
+def json_response(payload: Any, request: Request) -> Response:
+    """Serialize directly to bytes, bypassing `jsonable_encoder` and response-model validation."""
+    return encoded_response(dumps(payload), request)
+
+def encoded_response(body: bytes, request: Request) -> Response:
+    """A response for an already-serialized JSON body, compressed as negotiated."""
+    body, encoding = negotiate(body, request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
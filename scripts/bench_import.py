@@ -0,0 +1,37 @@
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["adam_core.config", "adam_core.graph", "adam_core.simulator", "adam_core.replay", "api.jobs", "api.main"]
+HEAVY = ["pandas", "networkx", "fastapi", "scipy"]
+
+def measure(module: str) -> tuple[float, list[str]]:
+    """Cold import time (ms) of `module` in a fresh interpreter, and which heavy packages it pulled in."""
+    code = (
+        "import sys, time; t = time.perf_counter(); import {m}; ms = (time.perf_counter() - t) * 1000; "
+        "print(ms); print(','.join(h for h in {heavy!r} if h in sys.modules))"
+    ).format(m=module, heavy=HEAVY)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout.split("\n")
+    return float(out[0]), [h for h in out[1].split(",") if h]
+
+def main():
+    ap = argparse.ArgumentParser(description="Cold-start import time per module, in fresh interpreters.")
+    ap.add_argument("modules", nargs="*", default=MODULES)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--max-ms", type=float, default=None, help="Exit non-zero if any module's median exceeds this.")
+    args = ap.parse_args()
+
+    failed = False
+    for m in args.modules:
+        runs = [measure(m) for _ in range(args.repeat)]
+        median = statistics.median(ms for ms, _ in runs)
+        print(f"{m:<22} {median:8.1f} ms  loads: {', '.join(runs[0][1]) or '-'}")
+        failed |= args.max_ms is not None and median > args.max_ms
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
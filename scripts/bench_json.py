@@ -0,0 +1,66 @@
+from __future__ import annotations
+import argparse
+import gzip
+import os
+import sys
+import time
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from adam_core.config import load_ontology  # noqa: E402
+from adam_core.simulator import forecast  # noqa: E402
+from adam_core.replay import backtest_replay  # noqa: E402
+from api.jobs import forecast_payload  # noqa: E402
+from api.responses import dumps, zstandard, GZIP_LEVEL, ZSTD_LEVEL  # noqa: E402
+
+def _best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000.0
+
+def _row(name: str, payload, repeat: int) -> None:
+    # The previous path: FastAPI's jsonable_encoder, then Starlette's JSONResponse.render.
+    # jsonable_encoder cannot take arrays, so they are converted with tolist() first, as before.
+    def old_path():
+        plain = dict(payload)
+        if isinstance(plain.get("series"), dict):
+            plain["series"] = {n: (a.tolist() if hasattr(a, "tolist") else a) for n, a in plain["series"].items()}
+        return JSONResponse(jsonable_encoder(plain)).body
+
+    old = old_path()
+    new = dumps(payload)
+    old_ms = _best_ms(old_path, repeat)
+    new_ms = _best_ms(lambda: dumps(payload), repeat)
+    gz_ms = _best_ms(lambda: gzip.compress(new, compresslevel=GZIP_LEVEL, mtime=0), repeat)
+    gz = len(gzip.compress(new, compresslevel=GZIP_LEVEL, mtime=0))
+    line = f"{name:<22} old {len(old):>9,d} B {old_ms:8.2f} ms | new {len(new):>9,d} B {new_ms:7.2f} ms | gzip {gz:>8,d} B +{gz_ms:6.2f} ms"
+    if zstandard is not None:
+        zc = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        line += f" | zstd {len(zc.compress(new)):>8,d} B +{_best_ms(lambda: zc.compress(new), repeat):6.2f} ms"
+    print(line)
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare response serialization: jsonable_encoder + json vs the direct path.")
+    ap.add_argument("--csv", default="data/arcadian_cloud_systems_timeseries.csv")
+    ap.add_argument("--ontology", default="config/ontology.yaml")
+    ap.add_argument("--horizon-days", type=int, default=120)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    ont = load_ontology(args.ontology)
+    df = pd.read_csv(args.csv)
+    fr = forecast(df, ont, horizon_days=args.horizon_days, explain=True)
+    _row(f"forecast {args.horizon_days}d points", forecast_payload(fr, ont), args.repeat)
+    _row(f"forecast {args.horizon_days}d columnar", forecast_payload(fr, ont, "columnar"), args.repeat)
+
+    incident = pd.to_datetime(df.loc[df["incident_flag"] > 0, "timestamp"], utc=True).min() if "incident_flag" in df else pd.to_datetime(df["timestamp"], utc=True).max()
+    rr = backtest_replay(df, ont, incident_time=incident.isoformat(), lookback_days=120, horizon_days=14)
+    _row("replay 120d", rr.__dict__, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from adam_core import kernels  # noqa: E402
+from adam_core.config import load_ontology  # noqa: E402
+from adam_core.graph import compile_graph  # noqa: E402
+from adam_core.simulator import simulate_batch  # noqa: E402
+
+def _best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000.0
+
+def _run(p0, graph, steps, step_hours, jit: bool, mode: str):
+    kernels.JIT, saved = jit, kernels.JIT
+    try:
+        batch = simulate_batch(p0, graph, steps, step_hours, mode=mode, workers=1)
+        batch.probabilities
+        return batch
+    finally:
+        kernels.JIT = saved
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulation step loop: NumPy engine vs the Numba kernel (identical results required).")
+    ap.add_argument("--ontology", default="config/ontology.yaml")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if not kernels.AVAILABLE:
+        print("numba is not installed; the simulator uses the NumPy engine. pip install numba to compare.")
+        return
+    ont = load_ontology(args.ontology)
+    graph = compile_graph(ont)
+    rng = np.random.default_rng(0)
+    steps_60d = 60 * 24 // ont.step_hours
+
+    t = time.perf_counter()
+    _run(rng.random((1, len(graph.controls))), graph, 2, ont.step_hours, True, "dense")
+    print(f"first call (compile or load from cache): {(time.perf_counter() - t) * 1000:.0f} ms")
+
+    for name, k, steps in [("forecast 60d", 1, steps_60d), ("replay 120 days x 14d", 120, 14 * 24 // ont.step_hours), ("ensemble 1000 x 60d", 1000, steps_60d)]:
+        p0 = rng.random((k, len(graph.controls)))
+        jit = _run(p0, graph, steps, ont.step_hours, True, "auto")
+        line = f"{name:<24}"
+        for mode in ("dense", "auto"):
+            ref = _run(p0, graph, steps, ont.step_hours, False, mode)
+            assert np.array_equal(ref.history, jit.history) and np.array_equal(ref.probabilities, jit.probabilities), (name, mode)
+            line += f" numpy {mode} {_best_ms(lambda: _run(p0, graph, steps, ont.step_hours, False, mode), args.repeat):8.2f} ms |"
+        jit_ms = _best_ms(lambda: _run(p0, graph, steps, ont.step_hours, True, "auto"), args.repeat)
+        print(f"{line} numba {jit_ms:8.2f} ms (identical)")
+
+if __name__ == "__main__":
+    main()
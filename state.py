@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
+
+from adam_core.risk_score import cached_risk_timeline, signal_columns
 
 def load_data():
     """
@@ -37,54 +38,20 @@ def get_numeric_signal_columns(df: pd.DataFrame) -> list[str]:
     Returns numeric columns that can be treated as risk signals.
     Excludes timestamp-like columns.
     """
-    if df is None or df.empty:
-        return []
-
-    numeric_cols = df.select_dtypes(include="number").columns.tolist()
-    drop = set([c for c in numeric_cols if c.lower() in {"timestamp", "time", "date"}])
-    return [c for c in numeric_cols if c not in drop]
+    return signal_columns(df)
 
 
 def compute_company_risk_score(df: pd.DataFrame) -> tuple[int, str, float]:
     """
     Overall Company Risk Score: 0-100.
-    Uses latest row and averages numeric signals.
-    If signals look like 0..1 probabilities, scales to 0..100.
+    Scores the latest row of the full-history timeline, so it always matches
+    the plotted history: signals whose whole history lies in 0..1 are scaled
+    to 0..100 before averaging.
     Returns (score_int, label, raw_mean).
     """
     if df is None or df.empty:
         return 0, "No Data", 0.0
-
-    signals = get_numeric_signal_columns(df)
-    if not signals:
-        return 0, "No Numeric Signals", 0.0
-
-    latest = df.iloc[-1]
-    vals = latest[signals].astype(float).to_numpy()
-    vals = vals[~np.isnan(vals)]
-
-    if len(vals) == 0:
-        return 0, "No Numeric Signals", 0.0
-
-    raw_mean = float(np.mean(vals))
-
-    # Auto scale
-    if 0.0 <= float(np.min(vals)) and float(np.max(vals)) <= 1.0:
-        score = int(round(raw_mean * 100))
-    else:
-        score = int(round(raw_mean))
-        score = max(0, min(100, score))
-
-    if score >= 80:
-        label = "Critical"
-    elif score >= 60:
-        label = "High"
-    elif score >= 40:
-        label = "Moderate"
-    else:
-        label = "Low"
-
-    return score, label, raw_mean
+    return cached_risk_timeline(df).latest()
 
 
 def categorize_risk_severity(score: int) -> dict:
@@ -36,3 +36,847 @@ def test_replay_runs():
     incident_time = pd.to_datetime(df["timestamp"].iloc[-1], utc=True).isoformat()
     rr = backtest_replay(df, ont, incident_time=incident_time, lookback_days=10, horizon_days=7)
     assert rr.eri_series
+
+def _reference_eri(probabilities, impact_weights, time_to_failure_days):
+    """The original per-control ERI loop, kept independent of adam_core.eri."""
+    import math
+
+    components = {ctrl: float(p) * float(impact_weights.get(ctrl, 1.0)) for ctrl, p in probabilities.items()}
+    eri = 1.0 - math.exp(-sum(components.values()))
+    if time_to_failure_days is not None:
+        eri = min(1.0, eri * (0.8 + 0.4 / (1.0 + max(0.0, float(time_to_failure_days)) / 14.0)))
+    top = max(components.items(), key=lambda kv: kv[1])[0] if components else "unknown"
+    return eri, components, top
+
+def test_compute_eri_batch_matches_scalar():
+    import math
+    import numpy as np
+    from adam_core.eri import compute_eri, compute_eri_batch, impact_vector
+
+    ont = load_ontology("config/ontology.yaml")
+    controls = list(ont.controls.keys())
+    rng = np.random.default_rng(0)
+    probs = rng.uniform(0.0, 1.0, size=(6, len(controls)))
+    ttf = np.array([np.nan, 0.0, 1.5, 7.0, 14.0, 40.0])
+
+    batch = compute_eri_batch(probs, impact_vector(ont.impact_weights, controls), ttf)
+    for k in range(len(probs)):
+        ref_eri, ref_components, ref_top = _reference_eri(dict(zip(controls, probs[k])), ont.impact_weights, None if np.isnan(ttf[k]) else float(ttf[k]))
+        assert np.isclose(batch.eri[k], ref_eri)
+        assert controls[batch.top_driver[k]] == ref_top
+        assert np.allclose(batch.components[k], [ref_components[c] for c in controls])
+
+        scalar = compute_eri(dict(zip(controls, probs[k])), ont.impact_weights, None if np.isnan(ttf[k]) else float(ttf[k]))
+        assert np.isclose(scalar.eri, ref_eri) and scalar.top_driver == ref_top
+
+    # Hand-computed: total = 0.5 * 2 + 0.2 = 1.2; ttf of 14 days gives a 0.5 boost, a factor of exactly 1.
+    fixed = compute_eri({"a": 0.5, "b": 0.2}, {"a": 2.0}, 14.0)
+    assert math.isclose(fixed.eri, 1.0 - math.exp(-1.2)) and fixed.top_driver == "a"
+    assert math.isclose(compute_eri({"a": 0.5, "b": 0.2}, {"a": 2.0}, 0.0).eri, 1.2 * (1.0 - math.exp(-1.2)))
+    assert compute_eri({}, ont.impact_weights, None).top_driver == "unknown"
+
+def test_calibrate_sweeps_cached_eri(tmp_path):
+    import pytest
+    from adam_core.calibrate import EriCache, build_eri_cache, cache_key, calibrate, incidents_from_flags
+
+    ont = load_ontology("config/ontology.yaml")
+    df = _incident_frame()
+    onsets = incidents_from_flags(df)
+    assert len(onsets) == 1
+
+    cache = build_eri_cache(df, ont, horizon_days=7)
+    report = calibrate(df, ont, thresholds=[0.3, 0.6, 0.9], weight_sets=[{"sla_compliance": 3.0}], lookback_days=10, cache=cache)
+    assert len(report.points) == 6
+    assert report.incidents == [onsets[0].isoformat()]
+    fprs = [p["false_positive_rate"] for p in report.points if p["weight_set"] == 0]
+    assert fprs == sorted(fprs, reverse=True)
+
+    # A saved cache is only reused for the same CSV, ontology and horizon.
+    csv = tmp_path / "history.csv"
+    df.to_csv(csv, index=False)
+    key = cache_key(str(csv), "config/ontology.yaml", 7)
+    cache.save(str(tmp_path / "eri.npz"), key=key)
+    assert (EriCache.load(str(tmp_path / "eri.npz"), key=key).probabilities == cache.probabilities).all()
+    assert cache_key(str(csv), "config/ontology.yaml", 14) != key
+    df.iloc[:-1].to_csv(csv, index=False)
+    with pytest.raises(ValueError):
+        EriCache.load(str(tmp_path / "eri.npz"), key=cache_key(str(csv), "config/ontology.yaml", 7))
+
+def _incident_frame(n: int = 160) -> pd.DataFrame:
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2025-01-01", periods=n, freq="6H", tz="UTC").astype(str),
+        "vendor_latency_ms": [180]*(n - 60) + [900]*60,
+        "ops_queue_depth": [200]*(n - 60) + [1500]*60,
+        "override_rate_per_hr": [2]*(n - 60) + [20]*60,
+        "review_throughput_per_hr": [130]*(n - 60) + [60]*60,
+        "sla_breach_rate": [0.001]*(n - 40) + [0.03]*40,
+        "incident_flag": [0]*(n - 40) + [1]*40,
+    })
+
+def test_replay_batch_matches_forecast():
+    import numpy as np
+    from adam_core.simulator import forecast
+
+    ont = load_ontology("config/ontology.yaml")
+    df = _incident_frame()
+    incident_time = pd.to_datetime(df["timestamp"].iloc[-1], utc=True).isoformat()
+    rr = backtest_replay(df, ont, incident_time=incident_time, lookback_days=20, horizon_days=7)
+    for pt in rr.eri_series[::5]:
+        fr = forecast(df, ont, start_time=pt["as_of"], horizon_days=7)
+        assert fr.summary["time_to_failure_days"] == pt["time_to_failure_days"]
+        assert fr.summary["top_choke_point"] == pt["top_choke_point"]
+
+def test_edge_search_resumes_from_log(tmp_path):
+    import pytest
+    from adam_core.search import build_context, grid_candidates, search
+
+    ont = load_ontology("config/ontology.yaml")
+    ctx = build_context(_incident_frame(), ont, lookback_days=10, horizon_days=7)
+    spec = [{"src": "review_throughput", "dst": "sla_compliance", "delay_days": [1, 3], "amplification": [1.5, 2.5]}]
+    delays, amps = grid_candidates(ctx.graph, spec)
+    assert delays.shape == (5, len(ctx.graph.edges))
+    assert grid_candidates(ctx.graph, [dict(spec[0], delay_days=[1, 3, 3.0])])[0].shape == delays.shape
+    with pytest.raises(ValueError):
+        grid_candidates(ctx.graph, [dict(spec[0], delay_days=[1, 1.5])])
+
+    log = str(tmp_path / "search.jsonl")
+    first = search(ctx, delays, amps, log_path=log, workers=1, batch_size=2)
+    assert first.evaluated == 5 and first.best["score"] >= first.baseline["score"]
+
+    again = search(ctx, delays, amps, log_path=log, workers=1)
+    assert again.evaluated == 0 and again.resumed == 5
+    assert again.best == first.best
+
+def test_forecaster_update_matches_from_scratch():
+    from adam_core.forecaster import Forecaster
+    from adam_core.simulator import forecast
+
+    ont = load_ontology("config/ontology.yaml")
+    df = _incident_frame(120)
+    fc = Forecaster(ont, df.iloc[:100], horizon_days=7)
+    for i in range(100, 110):
+        got = fc.update(df.iloc[i:i + 1])
+        want = forecast(df.iloc[:i + 1], ont, horizon_days=7)
+        assert got.summary == want.summary
+        assert [p.pressures for p in got.series] == [p.pressures for p in want.series]
+
+    # Out-of-order and duplicate-timestamp rows still match a from-scratch run.
+    late = pd.concat([df.iloc[115:120], df.iloc[110:115], df.iloc[[119]].assign(vendor_latency_ms=2000)])
+    got = fc.update(late.to_dict("records"))
+    want = forecast(pd.concat([df.iloc[:110], late]), ont, horizon_days=7)
+    assert got.summary == want.summary
+    assert fc.forecast(start_time=df["timestamp"].iloc[105]).summary == forecast(df, ont, start_time=df["timestamp"].iloc[105], horizon_days=7).summary
+
+def test_daemon_tails_csv_and_writes_snapshots(tmp_path):
+    from adam_core.daemon import DaemonConfig, ForecastDaemon
+
+    df = _incident_frame(100)
+    csv = tmp_path / "t.csv"
+    df.iloc[:90].to_csv(csv, index=False)
+    cfg = DaemonConfig(tenants=[{"id": "acme", "csv_path": str(csv), "horizon_days": 7}], snapshot_dir=str(tmp_path / "snaps"), workers=2, export_dir=str(tmp_path / "lake"))
+    daemon = ForecastDaemon(cfg)
+
+    daemon.run_once()
+    snap = daemon.store.read("acme")
+    assert snap["rows"] == 90 and snap["as_of"] == pd.to_datetime(df["timestamp"].iloc[89], utc=True).isoformat()
+
+    with open(csv, "a", encoding="utf-8") as f:
+        f.write(df.iloc[90:100].to_csv(index=False, header=False))
+    daemon.run_once()
+    snap = daemon.store.read("acme")
+    assert snap["rows"] == 100 and daemon.stats == {"runs": 2, "unchanged": 0, "skipped": 0, "failed": 0}
+
+    # Every forecast also lands in the Parquet store, published at the end of each pass.
+    import pyarrow.dataset as ds
+    lake = ds.dataset(str(tmp_path / "lake" / "forecast"), format="parquet", partitioning="hive").to_table().to_pandas()
+    assert lake["run_start"].nunique() == 2 and set(lake["tenant"]) == {"acme"}
+
+    # Polls with nothing new do not re-forecast until the snapshot is too old.
+    tenant = daemon.tenants["acme"]
+    assert tenant.refresh(max_age_seconds=3600) is None
+    assert tenant.refresh(max_age_seconds=0)["trigger"] == "max_age"
+
+def test_whatif_ranks_stacked_interventions():
+    from adam_core.simulator import forecast
+    from adam_core.whatif import Intervention, whatif
+
+    ont = load_ontology("config/ontology.yaml")
+    df = _incident_frame()
+    start = df["timestamp"].iloc[-45]
+    res = whatif(df, ont, [
+        Intervention(name="noop"),
+        Intervention(name="cap_sla", cap={"sla_compliance": 0.3}),
+        Intervention(name="cut_rt", edges=[{"src": "review_throughput", "dst": "sla_compliance", "remove": True}]),
+    ], start_time=start, horizon_days=7)
+
+    fr = forecast(df, ont, start_time=start, horizon_days=7)
+    assert res.baseline["time_to_failure_days"] == fr.summary["time_to_failure_days"]
+    by_name = {r["name"]: r for r in res.ranking}
+    assert by_name["noop"]["eri_reduction"] == 0.0
+    assert by_name["cap_sla"]["sla_avg_pressure"] <= 0.3
+    assert res.ranking[0]["name"] == "cap_sla" and res.ranking[0]["rank"] == 1
+
+def test_attribution_batches_one_variant_per_active_control():
+    import numpy as np
+    from adam_core.attribution import edge_flows
+    from adam_core.graph import compile_graph
+    from adam_core.simulator import forecast, simulate_batch, delay_steps
+
+    ont = load_ontology("config/ontology.yaml")
+    df = _incident_frame()
+    fr = forecast(df, ont, start_time=df["timestamp"].iloc[-45], horizon_days=7, explain=True)
+    attr = fr.attribution
+    assert attr["baseline"]["time_to_failure_days"] == fr.summary["time_to_failure_days"]
+    ranked = [r["control"] for r in attr["controls"]]
+    assert set(ranked) == {"vendor_network", "ops_queue", "manual_overrides", "review_throughput"}
+    vendor = next(r for r in attr["controls"] if r["control"] == "vendor_network")
+    assert vendor["paths"][0] == {"src": "vendor_network", "dst": "ops_queue", "contribution": vendor["paths"][0]["contribution"]}
+
+    graph = compile_graph(ont)
+    batch = simulate_batch(np.array([[0.7, 0.35, 0.0, 0.35, 0.0]]), graph, 28, ont.step_hours)
+    lag = delay_steps(graph.delay_days, ont.step_hours)
+    brute = [sum(batch.history[s - lag[e], 0, graph.src[e]] * graph.amplification[e] for s in range(lag[e], 28)) / 28 for e in range(len(lag))]
+    assert np.allclose(edge_flows(batch, graph)[0], brute)
+
+def test_path_index_and_output_pruning():
+    import numpy as np
+    from adam_core.graph import CompiledGraph, build_path_index, compile_graph
+    from adam_core.simulator import simulate_batch, sla_index
+
+    ont = load_ontology("config/ontology.yaml")
+    graph = compile_graph(ont)
+    assert compile_graph(ont) is graph
+    paths = graph.paths
+
+    # Brute-force min delay / max amplification over simple paths.
+    adj = {}
+    for (u, v), d, a in zip(graph.edges, graph.delay_days, graph.amplification):
+        adj.setdefault(u, []).append((v, float(d), float(a)))
+    def walk(node, seen, d, a, out):
+        for v, dd, aa in adj.get(node, []):
+            if v not in seen:
+                out.setdefault(v, []).append((d + dd, a * aa))
+                walk(v, seen | {v}, d + dd, a * aa, out)
+    for src in graph.controls:
+        found = {}
+        walk(src, {src}, 0.0, 1.0, found)
+        for dst in graph.controls:
+            hit = paths.lookup(src, dst)
+            assert hit["reachable"] == (dst in found)
+            if dst in found:
+                assert hit["min_delay_days"] == min(d for d, _ in found[dst])
+                assert abs(hit["max_amplification"] - max(a for _, a in found[dst])) < 1e-5
+
+    # A loop that amplifies makes every path through it unbounded; a damped loop changes nothing.
+    def loop_graph(gain):
+        edges = [("a", "b", 2.0), ("b", "c", 1.5), ("c", "b", gain), ("c", "d", 3.0), ("a", "d", 1.1)]
+        pos = {n: i for i, n in enumerate("abcd")}
+        return CompiledGraph(
+            controls=list("abcd"), metrics=list("abcd"), directions=["up"] * 4, edges=[(u, v) for u, v, _ in edges],
+            src=np.array([pos[u] for u, _, _ in edges]), dst=np.array([pos[v] for _, v, _ in edges]),
+            delay_days=np.ones(len(edges), dtype=int), amplification=np.array([a for _, _, a in edges]),
+        )
+    loud, damped = build_path_index(loop_graph(1.2)), build_path_index(loop_graph(0.5))
+    assert loud.lookup("a", "d") == {"src": "a", "dst": "d", "reachable": True, "min_delay_days": 1.0, "max_amplification": None, "amplifying_loop": True}
+    assert loud.lookup("b", "b")["amplifying_loop"] and not loud.lookup("d", "a")["reachable"]
+    assert damped.lookup("a", "d")["max_amplification"] == 9.0 and not damped.lookup("a", "d")["amplifying_loop"]
+    assert abs(damped.lookup("b", "b")["max_amplification"] - 0.75) < 1e-6
+
+    # Pruning to the SLA control leaves its history bit-identical.
+    rng = np.random.default_rng(3)
+    p0 = rng.uniform(0.0, 1.0, (4, len(graph.controls)))
+    sla = sla_index(graph)
+    full = simulate_batch(p0, graph, 56, ont.step_hours)
+    pruned = simulate_batch(p0, graph, 56, ont.step_hours, outputs=[sla])
+    keep = paths.upstream_mask([sla])
+    assert np.array_equal(full.history[:, :, keep], pruned.history[:, :, keep])
+    assert np.array_equal(full.first_probabilities(), pruned.first_probabilities())
+
+def test_sharded_simulation_matches_single_loop():
+    import numpy as np
+    from dataclasses import replace
+    from adam_core.config import Edge
+    from adam_core.graph import compile_graph
+    from adam_core.simulator import simulate_batch
+
+    ont = load_ontology("config/ontology.yaml")
+    # Two copies of the demo graph: two weakly connected components.
+    controls = dict(ont.controls)
+    controls.update({f"{cid}_b": replace(c, id=f"{cid}_b") for cid, c in ont.controls.items()})
+    edges = list(ont.edges) + [Edge(f"{e.src}_b", f"{e.dst}_b", e.delay_days, e.amplification) for e in ont.edges]
+    graph = compile_graph(replace(ont, controls=controls, edges=edges))
+    assert [len(c) for c in graph.components] == [len(ont.controls)] * 2
+
+    p0 = np.random.default_rng(5).uniform(0.0, 1.0, (3, len(graph.controls)))
+    single = simulate_batch(p0, graph, 56, ont.step_hours, workers=1)
+    sharded = simulate_batch(p0, graph, 56, ont.step_hours, workers=2)
+    assert np.array_equal(single.history, sharded.history)
+
+def test_sparse_and_auto_modes_match_dense():
+    import numpy as np
+    from adam_core.graph import compile_graph
+    from adam_core.simulator import simulate_batch
+
+    ont = load_ontology("config/ontology.yaml")
+    graph = compile_graph(ont)
+    c = len(graph.controls)
+    p0 = np.zeros((3, c))
+    p0[0, 0] = 0.7
+    p0[2] = np.random.default_rng(9).uniform(0.0, 1.0, c)
+    for noise in (None, np.zeros((56, c))):
+        dense = simulate_batch(p0, graph, 56, ont.step_hours, noise=noise, mode="dense")
+        for mode in ("sparse", "auto"):
+            other = simulate_batch(p0, graph, 56, ont.step_hours, noise=noise, mode=mode)
+            assert np.array_equal(dense.history, other.history)
+
+def test_resampler_buckets_streams_and_fills_gaps():
+    import numpy as np
+    from adam_core.resample import Resampler, Resampled, resample
+
+    ont = load_ontology("config/ontology.yaml")
+    df = pd.read_csv("data/arcadian_cloud_systems_timeseries.csv")
+
+    # Rows already on the grid come back unchanged.
+    res = resample(df, ont)
+    assert (res.to_frame()["timestamp"] == pd.to_datetime(df["timestamp"], utc=True)).all()
+    assert np.allclose(res.columns(res.metrics), df[res.metrics].to_numpy(dtype=float))
+
+    # Irregular rows with a gap: chunked streaming matches one pass, and p95 matches pandas.
+    rng = np.random.default_rng(0)
+    ts = pd.Timestamp("2025-01-01", tz="UTC") + pd.to_timedelta(np.sort(rng.uniform(0, 86400 * 10, 20000)), unit="s")
+    raw = pd.DataFrame({"timestamp": ts, **{m: rng.normal(100, 10, len(ts)) for m in res.metrics}})
+    raw = raw[(raw["timestamp"] < "2025-01-05") | (raw["timestamp"] > "2025-01-06T06:00Z")]
+    whole = resample(raw, ont, how="p95")
+    r = Resampler(ont, how="p95")
+    streamed = Resampled.concat([r.push(raw.iloc[i:i + 777]) for i in range(0, len(raw), 777)] + [r.flush()], r.metrics)
+    assert np.array_equal(whole.stamps, streamed.stamps) and np.allclose(whole.values, streamed.values)
+
+    ref = raw.set_index("timestamp")["vendor_latency_ms"].resample("6h", closed="right", label="right").quantile(0.95).dropna()
+    got = pd.Series(whole.columns(["vendor_latency_ms"])[:, 0], index=pd.to_datetime(whole.stamps, utc=True))
+    assert np.allclose(got.reindex(ref.index), ref)
+
+    # The gap is forward-filled for two steps, then left out.
+    filled = pd.to_datetime(whole.stamps[whole.counts == 0], utc=True)
+    assert list(filled) == [pd.Timestamp("2025-01-05T06:00Z"), pd.Timestamp("2025-01-05T12:00Z")]
+
+def test_discovery_recovers_planted_lag():
+    import numpy as np
+    import yaml
+    from adam_core.discovery import badness_matrix, discover, to_ontology_fragment
+    from adam_core.graph import compile_graph
+
+    ont = load_ontology("config/ontology.yaml")
+    rng = np.random.default_rng(1)
+    n = 600
+    df = pd.DataFrame({"timestamp": pd.date_range("2025-01-01", periods=n, freq="6h", tz="UTC")})
+    for c in ont.controls.values():
+        df[c.metric] = rng.normal(100.0, 10.0, n)
+    # vendor latency leads queue depth by 8 steps (2 days).
+    lead = np.cumsum(rng.normal(0.0, 5.0, n + 8))
+    df["vendor_latency_ms"] = 200.0 + lead[8:]
+    df["ops_queue_depth"] = 150.0 + 0.8 * lead[:n] + rng.normal(0.0, 2.0, n)
+
+    proposals = discover(df, ont, max_lag_days=5)
+    top = proposals[0]
+    assert (top["src"], top["dst"], top["lag_steps"], top["delay_days"]) == ("vendor_network", "ops_queue", 8, 2)
+    assert top["existing"]
+    assert yaml.safe_load(to_ontology_fragment(proposals))["propagation_graph"][0]["src"] == "vendor_network"
+
+    # Missing readings are not read as bad ones, even where lower is worse.
+    graph = compile_graph(ont)
+    j = graph.directions.index("lower_is_worse")
+    gappy = df.assign(**{graph.metrics[j]: df[graph.metrics[j]].where(np.arange(n) % 10 != 5)})
+    gappy.loc[:3, graph.metrics[j]] = np.nan
+    _, full = badness_matrix(df, ont)
+    _, held = badness_matrix(gappy, ont)
+    assert (held[:4, j] == 0.0).all()
+    assert np.array_equal(held[15::10, j], full[14::10, j][: len(held[15::10, j])])
+
+def test_anomaly_detector_flags_drift_and_correlates_edges():
+    from adam_core.anomaly import AnomalyDetector
+
+    ont = load_ontology("config/ontology.yaml")
+    df = pd.read_csv("data/arcadian_cloud_systems_timeseries.csv")
+    report = AnomalyDetector(ont).update(df)
+    vendor = next(a for a in report.anomalies if a["control"] == "vendor_network")
+    incident = pd.to_datetime(df.loc[df["incident_flag"] > 0, "timestamp"], utc=True).min()
+    assert pd.Timestamp(vendor["timestamp"]) < incident - pd.Timedelta(days=14)
+    assert any(c["src"] == "vendor_network" and c["dst"] == "ops_queue" for c in report.correlated)
+
+    # Row-chunked streaming gives the same onsets as one batch.
+    det = AnomalyDetector(ont)
+    streamed = [a for i in range(0, len(df), 37) for a in det.update(df.iloc[i:i + 37]).anomalies]
+    assert streamed == report.anomalies
+
+def test_dataset_store_dedupes_and_round_trips(tmp_path, monkeypatch):
+    import io
+    from adam_core.datasets import DatasetStore, parse_csv
+
+    ont = load_ontology("config/ontology.yaml")
+    path = "data/arcadian_cloud_systems_timeseries.csv"
+    raw = open(path, "rb").read()
+    store = DatasetStore(str(tmp_path))
+    meta, dup = store.put_stream(io.BytesIO(raw), filename="history.csv")
+    assert not dup and meta["rows"] == len(pd.read_csv(path))
+    again, dup = store.put_stream(io.BytesIO(raw))
+    assert dup and again["dataset_id"] == meta["dataset_id"]
+    assert len(list(tmp_path.glob("*.arrays"))) == 1
+
+    # Losing a race with an identical upload (arrays already renamed into place) is a duplicate, not an error.
+    real_meta, seen = store.meta, []
+
+    def late_meta(dataset_id):  # the other upload has not written its .json at the first check
+        seen.append(dataset_id)
+        return None if len(seen) == 1 else real_meta(dataset_id)
+
+    monkeypatch.setattr(store, "meta", late_meta)
+    raced, dup = store.put_stream(io.BytesIO(raw))
+    assert dup and raced == meta and len(seen) == 2
+
+    # Chunked parsing matches a whole-file parse, and forecasts are unchanged.
+    stamps, cols = parse_csv(path, chunk_rows=97)
+    whole = store.load(meta["dataset_id"])
+    assert (stamps == whole.stamps).all() and list(cols) == list(whole.columns)
+    a = forecast(pd.read_csv(path), ont, horizon_days=7, explain=False)
+    b = forecast(whole.to_frame(), ont, horizon_days=7, explain=False)
+    assert a.summary == b.summary
+
+def test_fast_json_matches_standard_encoding_and_negotiates():
+    import gzip
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from api.jobs import forecast_payload
+    from api.responses import dumps, negotiate
+
+    ont = load_ontology("config/ontology.yaml")
+    fr = forecast(pd.read_csv("data/arcadian_cloud_systems_timeseries.csv"), ont, horizon_days=30)
+    points = forecast_payload(fr, ont)
+    body = dumps(points)
+    assert json.loads(body) == json.loads(json.dumps(jsonable_encoder(points)))
+
+    columnar = json.loads(dumps(forecast_payload(fr, ont, "columnar")))["series"]
+    j = columnar["controls"].index("sla_compliance")
+    assert columnar["pressures"][5][j] == points["series"][5]["pressures"]["sla_compliance"]
+    assert columnar["state_names"][columnar["states"][5][j]] == points["series"][5]["predicted_states"]["sla_compliance"]
+
+    packed, enc = negotiate(body, "br;q=1.0, gzip;q=0.8")
+    assert enc == "gzip" and gzip.decompress(packed) == body
+    assert negotiate(body, "gzip;q=0") == (body, None)
+    assert negotiate(b"{}", "gzip") == (b"{}", None)
+
+def test_stdlib_json_fallback_writes_null_for_non_finite(monkeypatch):
+    import json
+    import numpy as np
+    from api import responses
+
+    monkeypatch.setattr(responses, "orjson", None)
+    body = responses.dumps({"a": [1.0, float("nan")], "b": np.float64("inf"), "c": np.array([np.nan, 2.0]), "t": pd.Timestamp("2025-01-01", tz="UTC")})
+    assert json.loads(body) == {"a": [1.0, None], "b": None, "c": [None, 2.0], "t": "2025-01-01T00:00:00+00:00"}
+
+def test_multi_horizon_forecast_matches_separate_runs(monkeypatch):
+    from adam_core import simulator
+
+    ont = load_ontology("config/ontology.yaml")
+    df = pd.read_csv("data/arcadian_cloud_systems_timeseries.csv")
+    start = "2025-11-20T00:00:00Z"
+    simulator._RUNS.clear()
+    runs = forecast(df, ont, start_time=start, horizon_days=[30, 7, 14])
+    assert list(runs) == [7, 14, 30]
+    assert len(simulator._RUNS) == 1  # one simulation, to the longest horizon
+
+    for h, fr in runs.items():
+        simulator._RUNS.clear()
+        alone = forecast(df, ont, start_time=start, horizon_days=h)
+        assert fr.summary == alone.summary
+        assert [p.pressures for p in fr.series] == [p.pressures for p in alone.series]
+
+    # A shorter horizon after a longer one is served from the cached run.
+    calls = []
+    real = simulator.simulate_batch
+    monkeypatch.setattr(simulator, "simulate_batch", lambda *a, **k: calls.append(a) or real(*a, **k))
+    simulator._RUNS.clear()
+    forecast(df, ont, start_time=start, horizon_days=60)
+    forecast(df, ont, start_time=start, horizon_days=21)
+    assert len(calls) == 1
+
+    # Attribution is one more run, for the primary (first listed) horizon only.
+    calls.clear()
+    simulator._RUNS.clear()
+    runs = forecast(df, ont, start_time=start, horizon_days=[14, 7, 30, 60], explain=True)
+    assert len(calls) == 2
+    assert [h for h, fr in runs.items() if fr.attribution is not None] == [14]
+
+def test_offloader_coalesces_identical_jobs_and_sheds_load():
+    import asyncio
+    import time
+    import pytest
+    from api.offload import Offloader, Saturated
+
+    calls = []
+
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.2)
+        return x * 2
+
+    async def scenario():
+        jobs = Offloader(workers=0, max_pending=1)
+        same = await asyncio.gather(*[jobs.run("k", slow, 21) for _ in range(10)])
+        assert same == [42] * 10 and calls == [21]
+        assert jobs.stats == {"submitted": 1, "coalesced": 9, "rejected": 0} and jobs.pending == 0
+
+        first = asyncio.ensure_future(jobs.run("a", slow, 1))
+        await asyncio.sleep(0)
+        with pytest.raises(Saturated) as e:
+            await jobs.run("b", slow, 2)
+        assert e.value.retry_after >= 1
+        assert await first == 2
+        jobs.shutdown()
+
+    asyncio.run(scenario())
+
+def test_shared_array_cache_builds_once_and_evicts_unheld(tmp_path):
+    import os
+    import numpy as np
+    from adam_core.shared_cache import SharedArrayCache
+
+    src = tmp_path / "history.csv"
+    src.write_text("v\n1\n")
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"v": np.arange(5.0) * len(builds)}
+
+    a = SharedArrayCache(str(tmp_path / "cache"))
+    b = SharedArrayCache(str(tmp_path / "cache"))  # stands in for another worker process
+    va, vb = a.get("csv", str(src), build)["v"], b.get("csv", str(src), build)["v"]
+    assert len(builds) == 1 and isinstance(vb, np.memmap) and not vb.flags.writeable
+    assert (va == vb).all()
+
+    # A changed source gets a new entry; the old one survives while b still maps it.
+    src.write_text("v\n1\n2\n")
+    os.utime(src, ns=(1, 1))
+    assert (a.get("csv", str(src), build)["v"] == np.arange(5.0) * 2).all()
+    assert len(a.entries()) == 2 and a.evict() == 0
+    b.release("csv", str(src))
+    assert a.evict() == 1 and len(a.entries()) == 1
+
+    # Over budget, only entries nobody holds are evicted.
+    tight = SharedArrayCache(str(tmp_path / "cache"), max_bytes=0)
+    assert tight.evict() == 0
+    a.release("csv", str(src))
+    assert tight.evict() == 1 and tight.entries() == []
+
+def test_engine_imports_stay_light_and_edge_order_matches_networkx():
+    import subprocess
+    import sys
+    from adam_core.graph import build_graph, edge_list, ordered_edges
+
+    # Neither the engine nor the API pays for pandas or networkx at import time.
+    probe = "import sys, {m}; print(sorted(h for h in ('pandas', 'networkx') if h in sys.modules))"
+    for module in ("adam_core.simulator", "adam_core.graph", "api.main"):
+        out = subprocess.run([sys.executable, "-c", probe.format(m=module)], capture_output=True, text=True, check=True).stdout
+        assert out.strip() == "[]", module
+
+    ont = load_ontology("config/ontology.yaml")
+    edges = list(ont.edges) + [ont.edges[0]]  # a duplicate edge keeps its first position, as in DiGraph
+    assert ordered_edges(edges) == edge_list(build_graph(edges))
+
+def test_downsampling_keeps_spikes_and_matches_reference_lttb():
+    import math
+    import numpy as np
+    import pytest
+    from adam_core.downsample import downsample, downsample_frame, lttb
+
+    def reference(x, y, n):
+        every, a, out = (len(x) - 2) / (n - 2), 0, [0]
+        for i in range(n - 2):
+            lo, hi = int(math.floor(i * every)) + 1, int(math.floor((i + 1) * every)) + 1
+            nxt = slice(hi, min(int(math.floor((i + 2) * every)) + 1, len(x)))
+            cx, cy = (x[-1], y[-1]) if i == n - 3 else (x[nxt].mean(), y[nxt].mean())
+            a = max(range(lo, hi), key=lambda j: (abs((x[j] - x[a]) * (cy - y[a]) - (cx - x[a]) * (y[j] - y[a])), -j))
+            out.append(a)
+        return out + [len(x) - 1]
+
+    rng = np.random.default_rng(3)
+    x, y = np.cumsum(rng.random(300)), rng.normal(size=300)
+    assert lttb(x, y, 40).tolist() == reference(x, y, 40)
+
+    y = rng.normal(size=200_000)
+    y[[1234, 150_000]] = [40.0, -40.0]
+    y[5000:5100] = np.nan
+    for method in ("lttb", "minmax"):
+        idx = downsample(np.arange(len(y)), y, 500, method)
+        assert len(idx) <= 500 and {1234, 150_000} <= set(idx.tolist())
+        assert not np.isnan(y[idx]).any() and (np.diff(idx) > 0).all()
+
+    df = pd.DataFrame({"a": y, "b": -y}, index=pd.date_range("2025-01-01", periods=len(y), freq="min", tz="UTC"))
+    small = downsample_frame(df, 400)
+    assert len(small) <= 400 and small.index.is_monotonic_increasing
+    assert downsample_frame(df.iloc[:10], 400).equals(df.iloc[:10])
+
+    wide = pd.DataFrame({f"m{i}": np.roll(y, 997 * i) for i in range(5)})
+    for budget in (15, 16, 29):
+        assert len(downsample_frame(wide, budget)) <= budget
+    with pytest.raises(ValueError):
+        downsample_frame(wide, 14)  # under 3 points per series
+
+def test_agent_store_pages_by_keyset_and_applies_retention(tmp_path):
+    import os
+    import subprocess
+    import sys
+    import time
+    from adam_core.agents import AgentStore
+
+    store = AgentStore(str(tmp_path / "agents.db"), batch_size=100, flush_seconds=60)
+    assert store.seed([{"name": "sla_guardian", "owner": "ops", "scopes": ["Deploy"]}])
+    assert not store.seed([{"name": "other", "owner": "ops"}])
+    store.register("triage_router", "risk_ops", ["Read Risk"])
+    store.set_status("sla_guardian", "inactive")
+    assert [a["status"] for a in store.agents(owner="ops")] == ["inactive"]
+
+    events = [{"agent": "triage_router", "action": "routed", "message": f"event {i}", "ts": f"2025-01-01T00:{i // 60:02d}:{i % 60:02d}Z"} for i in range(250)]
+    store.log_many(events[:50])
+    reader = AgentStore(str(tmp_path / "agents.db"))  # another process: sees only written batches
+    assert reader.stats()["audit_events"] == 4  # seeding, registrations and the status change are written at once
+    store.log_many(events[50:])
+    assert reader.stats()["audit_events"] == 4 + 250
+
+    seen, cursor = [], None
+    while True:
+        page = store.audit(40, before=cursor, owner="risk_ops")
+        seen += [e["message"] for e in page.events]
+        if page.next_cursor is None:
+            break
+        cursor = page.next_cursor
+    assert seen[0] == "Registered agent 'triage_router' (owner=risk_ops)"
+    assert seen[1:] == [f"event {i}" for i in reversed(range(250))]
+
+    store.delete("sla_guardian")
+    assert store.audit(1, agent="sla_guardian").events[0]["owner"] == "ops"
+    total = store.stats()["audit_events"]
+    assert store.compact(max_events=10) == total - 10
+    assert [e["message"] for e in store.audit(3).events][0] == "Deleted agent 'sla_guardian'"
+    assert store.compact(max_age_days=30) == 5 and store.stats()["audit_events"] == 5  # the 2025 events go
+
+    # A lone buffered event is written after flush_seconds, or at exit if the store is never closed.
+    quick = AgentStore(str(tmp_path / "agents.db"), flush_seconds=0.05)
+    quick.log(None, "ping", "one event")
+    deadline = time.monotonic() + 5
+    while reader.stats()["audit_events"] == 5 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert reader.stats()["audit_events"] == 6
+    code = f"from adam_core.agents import AgentStore; AgentStore({str(tmp_path / 'agents.db')!r}, flush_seconds=60).log(None, 'exit', 'last event')"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert reader.stats()["audit_events"] == 7
+
+    # Seeding happens once per database, even from racing sessions; emptying the registry does not undo it.
+    from concurrent.futures import ThreadPoolExecutor
+    demo = [{"name": "a", "owner": "ops"}, {"name": "b", "owner": "grc"}]
+    sessions = [AgentStore(str(tmp_path / "demo.db")) for _ in range(4)]
+    with ThreadPoolExecutor(4) as pool:
+        assert sorted(pool.map(lambda s: s.seed(demo), sessions)) == [False, False, False, True]
+    fresh = sessions[0]
+    assert fresh.audit(10, agent=None).events[0]["action"] == "seeded" and fresh.stats()["audit_events"] == 3
+    for a in fresh.agents():
+        fresh.delete(a["name"])
+    assert not fresh.seed(demo) and fresh.agents() == []
+    assert fresh.seed(demo, force=True) and [a["name"] for a in fresh.agents()] == ["a", "b"]
+
+def test_risk_timeline_scores_every_row_and_rolls_up():
+    import numpy as np
+    from adam_core.risk_score import BAND_NAMES, cached_risk_timeline, risk_timeline
+
+    rng = np.random.default_rng(5)
+    n = 24 * 21
+    df = pd.DataFrame({
+        "timestamp": pd.date_range("2025-03-03", periods=n, freq="h", tz="UTC").astype(str),
+        "breach_prob": rng.random(n),  # 0..1 over the whole history: scaled to 0..100
+        "queue_depth": rng.uniform(0, 140, n),
+        "label": "x",
+    })
+    df.loc[5, "queue_depth"] = np.nan
+    df.loc[7, ["breach_prob", "queue_depth"]] = np.nan
+
+    tl = risk_timeline(df)
+    assert tl.signals == ["breach_prob", "queue_depth"] and tl.scaled.tolist() == [True, False]
+    for i in (0, 5, 100, n - 1):
+        vals = [v for v in (df.breach_prob[i] * 100, df.queue_depth[i]) if not np.isnan(v)]
+        expected = max(0, min(100, round(sum(vals) / len(vals))))
+        assert tl.scores[i] == expected
+        assert BAND_NAMES[tl.bands[i]] == ("Critical" if expected >= 80 else "High" if expected >= 60 else "Moderate" if expected >= 40 else "Low")
+    assert tl.scores.dtype == np.int8 and tl.bands.dtype == np.int8 and tl.counts[7] == 0 and tl.scores[7] == 0
+
+    weekly = tl.rollup("W")
+    assert len(weekly) == 3 and weekly["rows"].tolist() == [168] * 3
+    assert weekly["score_max"].iloc[0] == tl.scores[:168].max() and weekly["score_last"].iloc[-1] == tl.scores[-1]
+    assert np.isclose(tl.rollup("D")["score_mean"].iloc[1], tl.scores[24:48].mean())
+    assert cached_risk_timeline(df) is cached_risk_timeline(df.copy())
+
+def test_parquet_export_partitions_and_appends_row_groups(tmp_path):
+    import glob
+    import os
+    import numpy as np
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    from adam_core.export import ParquetExporter
+    from adam_core.graph import compile_graph
+
+    ont = load_ontology("config/ontology.yaml")
+    df = pd.read_csv("data/arcadian_cloud_systems_timeseries.csv")
+    controls = compile_graph(ont).controls
+    runs = [forecast(df, ont, start_time=f"2025-12-0{d}T00:00:00Z", horizon_days=7, explain=False) for d in (1, 1, 2)]
+    rr = backtest_replay(df, ont, incident_time="2025-12-10T00:00:00Z", lookback_days=7, horizon_days=7)
+
+    with ParquetExporter(str(tmp_path), row_group_rows=len(controls) * 28) as ex:
+        for fr in runs:
+            ex.write_forecast("acme", fr, controls)
+        ex.write_replay("acme", rr)
+        assert glob.glob(str(tmp_path / "**" / "part-*.parquet"), recursive=True) == []  # not visible until closed
+    assert not glob.glob(str(tmp_path / "**" / ".part-*"), recursive=True)
+
+    day1 = glob.glob(str(tmp_path / "forecast" / "tenant=acme" / "date=2025-12-01" / "*.parquet"))
+    assert len(day1) == 1 and pq.ParquetFile(day1[0]).metadata.num_row_groups == 2  # two runs, one row group each
+
+    table = ds.dataset(str(tmp_path / "forecast"), format="parquet", partitioning="hive").to_table()
+    assert str(table.schema.field("control").type) == "dictionary<values=string, indices=int16, ordered=0>"
+    assert str(table.schema.field("pressure").type) == "float"
+    got = table.to_pandas().query("date == '2025-12-02'").sort_values(["step", "control"])
+    want = runs[2].arrays["pressures"].astype(np.float32)
+    assert np.array_equal(got.pivot(index="step", columns="control", values="pressure")[controls].to_numpy(), want)
+
+    replay = ds.dataset(str(tmp_path / "replay"), format="parquet", partitioning="hive").to_table().to_pandas()
+    assert len(replay) == len(rr.eri_series) and replay["date"].nunique() == len(rr.eri_series)
+    assert np.allclose(replay.sort_values("as_of")["eri"], [p["eri"] for p in rr.eri_series], atol=1e-6)
+    assert os.listdir(tmp_path / "replay") == ["tenant=acme"]
+
+def test_step_kernels_match_numpy_engine_bit_for_bit(monkeypatch):
+    import numpy as np
+    from adam_core import kernels, simulator
+    from adam_core.graph import compile_graph
+
+    graph = compile_graph(load_ontology("config/ontology.yaml"))
+    rng = np.random.default_rng(11)
+    k, c, e, steps = 6, len(graph.controls), len(graph.src), 40
+    amp = graph.amplification * rng.uniform(0.5, 1.5, (k, e))
+    lag = simulator.delay_steps(graph.delay_days, 6) + rng.integers(0, 3, (k, e))
+    cap = rng.uniform(0.5, 1.0, (k, c))
+    p0 = rng.random((k, c))
+
+    monkeypatch.setattr(kernels, "JIT", False)
+    ref = simulator.simulate_batch(p0, graph, steps, 6, amplification=amp, delays=lag, cap=cap, mode="dense", workers=1)
+
+    # The uncompiled kernels are the same code Numba compiles, so this runs with or without it.
+    history = np.empty_like(ref.history)
+    history[0] = np.minimum(p0, np.minimum(1.0, cap))
+    kernels.propagate_py(history, graph.src, graph.dst, amp, lag, simulator.step_noise(steps, c), np.minimum(1.0, cap), 1.0 - simulator.DECAY_PER_STEP, simulator.INCOMING_GAIN)
+    assert np.array_equal(history, ref.history)
+    assert np.array_equal(kernels.probabilities_py(ref.history, simulator.PROBABILITY_WINDOW), simulator._estimate_probabilities(ref.history))
+
+    if kernels.AVAILABLE:
+        monkeypatch.setattr(kernels, "JIT", True)
+        jit = simulator.simulate_batch(p0, graph, steps, 6, amplification=amp, delays=lag, cap=cap, workers=1)
+        assert np.array_equal(jit.history, ref.history) and np.array_equal(jit.probabilities, ref.probabilities)
+
+def test_refined_replay_matches_step_scan_and_stops_early():
+    from adam_core.replay import _eri_points, replay_inputs
+
+    ont = load_ontology("config/ontology.yaml")
+    df = pd.read_csv("data/arcadian_cloud_systems_timeseries.csv")
+    incident = df.loc[df["incident_flag"] == 1, "timestamp"].iloc[0]
+    daily = backtest_replay(df, ont, incident_time=incident, lookback_days=60, horizon_days=14)
+    refined = backtest_replay(df, ont, incident_time=incident, lookback_days=60, horizon_days=14, refine=True)
+    first = backtest_replay(df, ont, incident_time=incident, lookback_days=60, horizon_days=14, first_warning_only=True)
+
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+    end = pd.Timestamp(incident)
+    window = df[(df["timestamp"] >= end - pd.Timedelta(days=60)) & (df["timestamp"] <= end)]
+    every_step = _eri_points(replay_inputs(window, ont, pd.DatetimeIndex(window["timestamp"]), 14, summaries=False), ont, True)
+    expected = next(p["as_of"] for p in every_step if p["eri"] >= ont.eri_warning)
+
+    assert refined.first_warning_time == first.first_warning_time == expected
+    assert refined.lead_time_days > daily.lead_time_days
+    assert all("refined" not in p for p in daily.eri_series)
+    assert [p for p in refined.eri_series if not p["refined"]] == [dict(p, refined=False) for p in daily.eri_series]
+    assert [p["as_of"] for p in refined.eri_series] == sorted(p["as_of"] for p in refined.eri_series)
+    assert not first.eri_series
+    assert first.narrative["as_of_points_simulated"] < daily.narrative["as_of_points_simulated"] < len(every_step) / 3
+
+def test_http_endpoints_end_to_end(tmp_path, monkeypatch):
+    monkeypatch.setenv("ADAM_API_WORKERS", "0")  # jobs run on one thread in this process
+    monkeypatch.delenv("ADAM_EXPORT_DIR", raising=False)
+    from fastapi.testclient import TestClient
+    from adam_core.agents import AgentStore
+    from adam_core.daemon import SnapshotStore
+    from adam_core.datasets import DatasetStore
+    from api import jobs, main
+    from api.offload import Offloader
+
+    # api.main may already be imported with a process pool; the stores must not touch the working tree.
+    monkeypatch.setattr(main, "JOBS", Offloader(workers=0))
+    store = AgentStore(str(tmp_path / "agents.db"))
+    monkeypatch.setattr(main, "_agents", lambda: store)
+    monkeypatch.setattr(main, "_snapshots", lambda: SnapshotStore(str(tmp_path / "snapshots")))
+    monkeypatch.setattr(jobs, "DATASETS", DatasetStore(str(tmp_path / "datasets")))
+    path = "data/arcadian_cloud_systems_timeseries.csv"
+    rows = pd.read_csv(path)
+
+    with TestClient(main.app, headers={"x-api-key": main.API_KEY}) as client:
+        assert client.get("/agents", headers={"x-api-key": "wrong"}).status_code == 401
+
+        # Agents: register, list by owner, reject a bad status, delete.
+        r = client.put("/agents/router", json={"owner": "ops", "scopes": ["tickets"], "purpose": "Routes incidents"})
+        assert r.status_code == 200 and r.json()["owner"] == "ops"
+        client.put("/agents/auditor", json={"owner": "risk"})
+        assert [a["name"] for a in client.get("/agents", params={"owner": "ops"}).json()] == ["router"]
+        assert client.put("/agents/x", json={"owner": "ops", "status": "paused"}).status_code == 422
+        assert client.delete("/agents/auditor").json() == {"deleted": "auditor"}
+        assert client.delete("/agents/auditor").status_code == 404
+
+        # Audit events come back newest first, one keyset page at a time.
+        events = [{"agent": "router", "action": "routed", "message": f"event {i}", "ts": f"2025-07-01T00:00:{i:02d}+00:00"} for i in range(7)]
+        assert client.post("/agents/events", json=events).json() == {"written": 7}
+        seen, before = [], None
+        while True:
+            page = client.get("/agents/events", params={"agent": "router", "limit": 3, **({"before": before} if before else {})}).json()
+            seen += [e["message"] for e in page["events"] if e["action"] == "routed"]
+            before = page["next_cursor"]
+            if before is None:
+                break
+        assert seen == [f"event {i}" for i in reversed(range(7))]
+        assert client.get("/agents/events", params={"before": "not-a-cursor"}).status_code == 422
+
+        # Ingest: seeding errors are mapped, the first use forecasts, an unchanged repeat does not.
+        assert client.post("/ingest", json={"stream": "http-missing", "csv_path": "nope.csv"}).status_code == 404
+        bad = tmp_path / "bad.csv"
+        bad.write_text("timestamp,unrelated\n2025-07-01T00:00:00+00:00,1\n")
+        assert client.post("/ingest", json={"stream": "http-bad", "csv_path": str(bad)}).status_code == 422
+        first = client.post("/ingest", json={"stream": "http-seeded", "csv_path": path}).json()
+        assert first["reforecast"] and first["series"]
+        again = client.post("/ingest", json={"stream": "http-seeded"}).json()
+        assert not again["reforecast"] and again["summary"] == first["summary"]
+
+        # History is downsampled within its budget.
+        hist = client.get("/history", params={"csv_path": path, "max_points": 100, "metrics": ["cpu_util_pct"]}).json()
+        assert hist["rows"] == len(rows) and 0 < hist["points"] <= 100
+        assert client.get("/history", params={"csv_path": path, "max_points": 10}).status_code == 422
+
+        # An uploaded dataset forecasts exactly like the CSV it came from.
+        with open(path, "rb") as f:
+            meta = client.post("/datasets", files={"file": ("history.csv", f, "text/csv")}).json()
+        assert meta["rows"] == len(rows) and not meta["deduplicated"]
+        assert client.get(f"/datasets/{meta['dataset_id']}").json()["dataset_id"] == meta["dataset_id"]
+        by_id = client.post("/forecast", json={"dataset_id": meta["dataset_id"], "horizon_days": 7, "explain": False})
+        by_path = client.post("/forecast", json={"csv_path": path, "horizon_days": 7, "explain": False})
+        assert by_id.status_code == 200 and by_id.json()["summary"] == by_path.json()["summary"]
+        assert client.post("/forecast", json={"dataset_id": "0" * 16}).status_code == 404
+        assert client.post("/forecast", json={"csv_path": path, "dataset_id": meta["dataset_id"]}).status_code == 422
+
+        # What-if and calibration read datasets through the same loader.
+        scenarios = [{"name": "cap", "cap": {"sla_compliance": 0.5}}]
+        whatif = {k: client.post("/whatif", json={**src, "horizon_days": 7, "scenarios": scenarios}).json() for k, src in (("id", {"dataset_id": meta["dataset_id"]}), ("path", {"csv_path": path}))}
+        assert "detail" not in whatif["id"] and whatif["id"] == whatif["path"]
+        calibrated = client.post("/calibrate", json={"dataset_id": meta["dataset_id"], "thresholds": [0.6, 0.9], "horizon_days": 7})
+        assert calibrated.status_code == 200 and len(calibrated.json()["points"]) == 2
+        assert client.post("/calibrate", json={}).status_code == 422
@@ -14,12 +14,18 @@ import pandas as pd
 from adam_core.simulator import forecast
 from adam_core.eri import compute_eri
 from adam_core.replay import backtest_replay
+from adam_core.downsample import downsample_frame
+
+from adam_core.risk_score import BAND_NAMES, cached_risk_timeline
 
 from state import compute_company_risk_score, categorize_risk_severity
 
 
 st.title("Risk Vitals")
 
+# Points sent to the browser per chart: about two per pixel column of a wide chart.
+MAX_CHART_POINTS = 2000
+
 df = st.session_state.get("data")
 ont = st.session_state.get("ont")
 horizon_days = st.session_state.get("horizon_days", 14)
@@ -49,6 +55,21 @@ with c3:
 
 st.divider()
 
+# Company Risk Score over the full history, scored once per dataset and cached.
+st.subheader("Company Risk Score History")
+
+try:
+    timeline = cached_risk_timeline(df)
+    period = st.radio("Rollup", ["Daily", "Weekly"], horizontal=True, label_visibility="collapsed")
+    rollup = timeline.rollup("D" if period == "Daily" else "W")
+    st.line_chart(rollup.set_index("period_start")[["score_mean", "score_max"]], use_container_width=True)
+    high = int((rollup["worst_band"].cat.codes >= BAND_NAMES.index("High")).sum())
+    st.caption(f"{high} of {len(rollup)} {'days' if period == 'Daily' else 'weeks'} reached High or Critical.")
+except ValueError as e:
+    st.info(str(e))
+
+st.divider()
+
 # -------------------------
 # GRAPH 1: Control Metrics (Last 60 days)
 # -------------------------
@@ -69,7 +90,10 @@ else:
         if not available:
             st.info("None of the expected control metric columns are present.")
         else:
-            st.line_chart(recent.set_index("timestamp")[available], use_container_width=True)
+            chart = downsample_frame(recent.set_index("timestamp")[available], MAX_CHART_POINTS)
+            st.line_chart(chart, use_container_width=True)
+            if len(chart) < len(recent):
+                st.caption(f"Showing {len(chart):,} of {len(recent):,} rows; spikes are kept.")
     except Exception as e:
         st.warning(f"Could not plot control metrics: {e}")
 
@@ -81,7 +105,8 @@ st.divider()
 st.subheader("Escalation Forecast")
 
 try:
-    fr = forecast(df, ont, start_time=None, horizon_days=int(horizon_days))
+    # Simulate to the slider maximum once; any horizon on the slider is then a slice of that cached run.
+    fr = forecast(df, ont, start_time=None, horizon_days=[int(horizon_days), 60])[int(horizon_days)]
     probs = fr.series[0].probabilities if fr.series else {}
     ttf = fr.summary.get("time_to_failure_days")
     eri = compute_eri(probs, ont.impact_weights, ttf)
@@ -107,7 +132,8 @@ try:
         mapping = {"healthy": 0, "constrained": 1, "degraded": 2, "failed": 3}
         numeric_states = states_df.apply(lambda col: col.map(mapping))
 
-        st.line_chart(numeric_states, use_container_width=True)
+        # Min-max keeps every state a control reaches, however briefly.
+        st.line_chart(downsample_frame(numeric_states, MAX_CHART_POINTS, method="minmax"), use_container_width=True)
         st.caption("State mapping: healthy=0, constrained=1, degraded=2, failed=3")
     else:
         st.info("Forecast returned no series to plot.")
@@ -128,9 +154,10 @@ else:
 
 lookback = st.slider("Lookback window (days)", min_value=7, max_value=120, value=30, step=1)
 h2 = st.slider("Replay forecast horizon (days)", min_value=7, max_value=60, value=14, step=1)
+refine = st.checkbox(f"Refine warnings to {ont.step_hours}h steps", value=True)
 
 try:
-    rr = backtest_replay(df, ont, incident_time=incident_time, lookback_days=int(lookback), horizon_days=int(h2))
+    rr = backtest_replay(df, ont, incident_time=incident_time, lookback_days=int(lookback), horizon_days=int(h2), refine=refine)
     st.write(rr.narrative)
 
     if rr.first_warning_time:
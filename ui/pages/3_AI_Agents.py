@@ -1,73 +1,80 @@
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timezone
+
+from adam_core.agents import AgentStore
+from adam_core.anomaly import AnomalyDetector, AnomalyReport
+from adam_core.risk_score import fingerprint
 
 st.title("AI Agents")
 
-def log_event(msg: str):
-    ts = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%SZ")
-    st.session_state.agent_audit.append(f"[{ts}] {msg}")
-
-# Initialize state
-if "agent_registry" not in st.session_state:
-    st.session_state.agent_registry = []
-
-if "agent_audit" not in st.session_state:
-    st.session_state.agent_audit = []
-
-# Seed demo agents one time
-if "demo_agents_seeded" not in st.session_state:
-    st.session_state.demo_agents_seeded = True
-
-    demo_agents = [
-        {
-            "name": "triage_router",
-            "owner": "risk_ops",
-            "scopes": "Read Risk, Write Risk",
-            "status": "active",
-            "purpose": "Auto routes incidents to the right queue and owner based on severity and control mapping.",
-        },
-        {
-            "name": "evidence_collector",
-            "owner": "grc",
-            "scopes": "Read Risk",
-            "status": "active",
-            "purpose": "Pulls audit evidence from logs, tickets, and runbooks to reduce manual compliance packaging.",
-        },
-        {
-            "name": "sla_guardian",
-            "owner": "ops",
-            "scopes": "Read Risk, Deploy",
-            "status": "active",
-            "purpose": "Monitors SLA signals and triggers mitigation playbooks when degradation risk crosses threshold.",
-        },
-        {
-            "name": "vendor_anomaly_monitor",
-            "owner": "platform",
-            "scopes": "Read Risk",
-            "status": "active",
-            "purpose": "Detects vendor latency anomalies and correlates with queue depth and override spikes.",
-        },
-        {
-            "name": "churn_intervention_planner",
-            "owner": "finance_ops",
-            "scopes": "Read Finance, Write Finance",
-            "status": "active",
-            "purpose": "Recommends retention interventions and calculates expected churn savings and penalty avoidance.",
-        },
-    ]
-
-    # Only seed if registry is empty
-    if len(st.session_state.agent_registry) == 0:
-        st.session_state.agent_registry = demo_agents
-        log_event("Seeded demo enterprise agents.")
+# Registry and audit log persist in SQLite (ADAM_AGENT_DB), shared with the API's /agents endpoints.
+@st.cache_resource
+def agent_store() -> AgentStore:
+    return AgentStore()
+
+store = agent_store()
+
+# The detector walks the history row by row, so run it once per dataset and ontology, not on every rerun.
+@st.cache_data(show_spinner="Scanning history for anomalies...", max_entries=8)
+def anomaly_report(data_key: str, ont_key: str, _df: pd.DataFrame, _ont) -> AnomalyReport:
+    return AnomalyDetector(_ont).update(_df)
+AUDIT_PAGE = 50
+
+DEMO_AGENTS = [
+    {
+        "name": "triage_router",
+        "owner": "risk_ops",
+        "scopes": ["Read Risk", "Write Risk"],
+        "purpose": "Auto routes incidents to the right queue and owner based on severity and control mapping.",
+    },
+    {
+        "name": "evidence_collector",
+        "owner": "grc",
+        "scopes": ["Read Risk"],
+        "purpose": "Pulls audit evidence from logs, tickets, and runbooks to reduce manual compliance packaging.",
+    },
+    {
+        "name": "sla_guardian",
+        "owner": "ops",
+        "scopes": ["Read Risk", "Deploy"],
+        "purpose": "Monitors SLA signals and triggers mitigation playbooks when degradation risk crosses threshold.",
+    },
+    {
+        "name": "vendor_anomaly_monitor",
+        "owner": "platform",
+        "scopes": ["Read Risk"],
+        "purpose": "Detects vendor latency anomalies and correlates with queue depth and override spikes.",
+    },
+    {
+        "name": "churn_intervention_planner",
+        "owner": "finance_ops",
+        "scopes": ["Read Finance", "Write Finance"],
+        "purpose": "Recommends retention interventions and calculates expected churn savings and penalty avoidance.",
+    },
+]
+
+# Seed demo agents the first time this database is used; the store records that it did.
+store.seed(DEMO_AGENTS)
+registry = store.agents()
+
+flash = st.session_state.pop("agents_flash", None)  # a message from before the last st.rerun()
+if flash:
+    st.success(flash)
 
 st.subheader("Agent Registry")
 
-if len(st.session_state.agent_registry) == 0:
+if len(registry) == 0:
     st.info("No agents registered yet.")
 else:
-    reg_df = pd.DataFrame(st.session_state.agent_registry)
+    reg_df = pd.DataFrame(registry).drop(columns=["created", "updated"])
+    reg_df["scopes"] = reg_df["scopes"].str.join(", ")
     st.dataframe(reg_df, use_container_width=True, hide_index=True)
 
 st.divider()
@@ -94,31 +101,25 @@ with st.container(border=True):
         if not name.strip():
             st.error("Agent Name is required.")
         else:
-            st.session_state.agent_registry.append({
-                "name": name.strip(),
-                "owner": owner.strip() or "unknown",
-                "scopes": ", ".join(scopes),
-                "status": "active",
-                "purpose": purpose.strip() or "Not specified",
-            })
-            log_event(f"Registered agent '{name.strip()}' (owner={owner.strip() or 'unknown'})")
+            store.register(name.strip(), owner.strip() or "unknown", scopes, purpose.strip() or "Not specified")
             st.success("Agent registered.")
+            st.rerun()
 
     if reset_demo:
-        st.session_state.agent_registry = []
-        st.session_state.demo_agents_seeded = False
-        st.success("Demo agents cleared. Reloading will seed again.")
+        for a in registry:
+            store.delete(a["name"])
+        store.seed(DEMO_AGENTS, force=True)
+        st.session_state["agents_flash"] = "Demo agents restored."
         st.rerun()
 
 st.divider()
 
 st.subheader("Manage Agents")
 
-if len(st.session_state.agent_registry) > 0:
-    names = [a["name"] for a in st.session_state.agent_registry]
+if len(registry) > 0:
+    names = [a["name"] for a in registry]
     selected = st.selectbox("Select agent", names)
-    idx = names.index(selected)
-    agent = st.session_state.agent_registry[idx]
+    agent = registry[names.index(selected)]
 
     c1, c2, c3 = st.columns([1, 1, 2])
     with c1:
@@ -129,22 +130,61 @@ if len(st.session_state.agent_registry) > 0:
         st.caption("Status changes apply immediately.")
 
     if new_status != agent["status"]:
-        agent["status"] = new_status
-        log_event(f"Updated status for '{agent['name']}' -> {new_status}")
+        store.set_status(agent["name"], new_status)
         st.success("Status updated.")
 
     if delete:
-        log_event(f"Deleted agent '{agent['name']}'")
-        st.session_state.agent_registry.pop(idx)
+        store.delete(agent["name"])
         st.success("Deleted.")
         st.rerun()
 
 st.divider()
 
+st.subheader("vendor_anomaly_monitor")
+
+df = st.session_state.get("data")
+ont = st.session_state.get("ont")
+if df is None or ont is None:
+    st.info("Load data on the main page to run the anomaly monitor.")
+else:
+    report = anomaly_report(fingerprint(df), repr(ont), df, ont)
+    c1, c2 = st.columns(2)
+    with c1:
+        st.metric("Excursions detected", len(report.anomalies))
+    with c2:
+        st.metric("Correlated along propagation edges", len(report.correlated))
+    if report.anomalies:
+        st.dataframe(pd.DataFrame(report.anomalies).tail(20), use_container_width=True, hide_index=True)
+    if report.correlated:
+        st.caption("Anomalies on both ends of a propagation edge, within its delay.")
+        st.dataframe(pd.DataFrame(report.correlated), use_container_width=True, hide_index=True)
+
+st.divider()
+
 st.subheader("Audit Log")
 
-if len(st.session_state.agent_audit) == 0:
+# Keyset paging: each page starts below the last event shown, so depth does not slow it down.
+cursors = st.session_state.setdefault("audit_cursors", [None])
+agent_filter = st.selectbox("Agent", ["All agents"] + [a["name"] for a in registry], key="audit_agent")
+if st.session_state.get("audit_filter") != agent_filter:
+    st.session_state.audit_filter = agent_filter
+    cursors[:] = [None]
+page = store.audit(AUDIT_PAGE, before=cursors[-1], agent=None if agent_filter == "All agents" else agent_filter)
+
+if not page.events:
     st.info("No audit events yet.")
 else:
-    for line in reversed(st.session_state.agent_audit[-50:]):
-        st.write(line)
+    for e in page.events:
+        st.write(f"[{e['ts']}] {e['message']}")
+
+c1, c2, c3 = st.columns([1, 1, 2])
+with c1:
+    if st.button("Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+with c2:
+    if st.button("Older", disabled=page.next_cursor is None):
+        cursors.append(page.next_cursor)
+        st.rerun()
+with c3:
+    st.caption(f"Page {len(cursors)}, {AUDIT_PAGE} events per page. Retention: `python -m adam_core.agents --max-age-days 90`.")